@@ -0,0 +1,48 @@
+"""Actor message throughput as the spawner's global scope grows.
+
+One Counter actor (pool runtime, one worker) receives `messages` messages
+while the program defines 10, 1k or 100k globals; per-message cost should
+not depend on the number of globals.
+
+Usage: python benchmarks/bench_actor_messages.py [messages]   (default: 20000)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.nexa_interpreter import (
+    ActorDecl, AssignStmt, FnDecl, LetStmt, SpawnStmt, OutputChannel, interpret, program_env, finish_program,
+)
+
+GLOBALS = (10, 1000, 100_000)
+
+COUNTER = ActorDecl(name='Counter', state=[LetStmt(name='count', type='Int', value=0)], methods=[
+    FnDecl(name='on_message', params=[('msg', 'Int')], return_type='Unit', body=[
+        AssignStmt(name='count', op='+=', value='msg'),
+    ]),
+])
+
+def measure(globals_count, messages):
+    env = program_env(OutputChannel(capture=True), actor_runtime='pool', actor_workers=1)
+    interpret([LetStmt(name=f"g{i}", type='Int', value=i) for i in range(globals_count)], env)
+    interpret([COUNTER, SpawnStmt(actor_name='Counter', var_name='c')], env)
+    instance = env.get_value('c')
+    start = time.perf_counter()
+    for i in range(messages):
+        instance.send(1)
+    env.scheduler.join()
+    elapsed = time.perf_counter() - start
+    finish_program(env)
+    assert instance.state['count'] == messages
+    return elapsed
+
+def main(messages):
+    print(f"{'globals':>8} {'time (s)':>10} {'msgs/s':>12} {'us/msg':>8}")
+    for globals_count in GLOBALS:
+        elapsed = measure(globals_count, messages)
+        print(f"{globals_count:>8} {elapsed:>10.3f} {messages / elapsed:>12,.0f} {elapsed / messages * 1e6:>8.1f}")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,59 @@
+"""Scaling of CPU-bound actors: process runtime at 1, 2, 4 and 8 workers,
+with the thread pool (which the GIL serializes) as the reference.
+
+Eight Cruncher actors each handle `messages` messages; every message runs a
+`work`-iteration loop in on_message.
+
+Usage: python benchmarks/bench_actor_processes.py [messages] [work]   (default: 20 20000)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.nexa_interpreter import (
+    ActorDecl, AssignStmt, FnDecl, ForStmt, LetStmt, SpawnStmt, OutputChannel, interpret, program_env, finish_program,
+)
+
+ACTORS = 8
+WORKERS = (1, 2, 4, 8)
+
+def cruncher(work):
+    return ActorDecl(name='Cruncher', state=[LetStmt(name='acc', type='Int', value=0)], methods=[
+        FnDecl(name='on_message', params=[('msg', 'Int')], return_type='Unit', body=[
+            ForStmt(var='i', start=0, end=work, body=[AssignStmt(name='acc', op='+=', value='i')]),
+        ]),
+    ])
+
+def measure(runtime, workers, messages, work):
+    env = program_env(OutputChannel(capture=True), actor_runtime=runtime, actor_workers=workers)
+    env.set_actor(cruncher(work))
+    instances = []
+    for _ in range(ACTORS):
+        interpret([SpawnStmt(actor_name='Cruncher', var_name='c')], env)
+        instances.append(env.get_value('c'))
+    env.scheduler.join()
+    start = time.perf_counter()
+    for instance in instances:
+        instance.send_many([1] * messages)
+    env.scheduler.join()
+    elapsed = time.perf_counter() - start
+    finish_program(env)
+    expected = messages * sum(range(work))
+    assert all(instance.state['acc'] == expected for instance in instances)
+    return elapsed
+
+def main(messages, work):
+    print(f"{os.cpu_count()} CPUs, {ACTORS} actors x {messages} messages x {work} iterations")
+    print(f"{'runtime':>8} {'workers':>8} {'time (s)':>10} {'speedup':>8}")
+    baseline = None
+    for runtime in ('pool', 'process'):
+        for workers in WORKERS:
+            elapsed = measure(runtime, workers, messages, work)
+            baseline = baseline or elapsed
+            print(f"{runtime:>8} {workers:>8} {elapsed:>10.3f} {baseline / elapsed:>7.2f}x")
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [20, 20_000][len(args):]))
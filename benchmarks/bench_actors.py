@@ -0,0 +1,65 @@
+"""Actor runtimes: one thread per actor vs. the shared worker pool.
+
+For each actor count this reports the cost of spawning, the CPU burned while
+every actor sits idle, and message throughput (each actor receives
+`messages` messages). The thread runtime is skipped above THREAD_LIMIT actors.
+
+Usage: python benchmarks/bench_actors.py [counts...]   (default: 10 1000 100000)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.nexa_interpreter import (
+    ActorDecl, FnDecl, SayStmt, SpawnStmt, OutputChannel, interpret, program_env, finish_program,
+)
+
+THREAD_LIMIT = 2000
+IDLE_SECONDS = 1.0
+
+ECHO = ActorDecl(name='Echo', state=[], methods=[
+    FnDecl(name='on_message', params=[('msg', 'Int')], return_type='Unit', body=[SayStmt(value='{msg}')]),
+])
+
+def run(runtime, count, messages):
+    env = program_env(OutputChannel(capture=True), actor_runtime=runtime)
+    env.set_actor(ECHO)
+    start = time.perf_counter()
+    instances = []
+    for _ in range(count):
+        interpret([SpawnStmt(actor_name='Echo', var_name='a')], env)
+        instances.append(env.get_value('a'))
+    spawn = time.perf_counter() - start
+
+    cpu = time.process_time()
+    time.sleep(IDLE_SECONDS)
+    idle = time.process_time() - cpu
+
+    total = count * messages
+    start = time.perf_counter()
+    for i in range(messages):
+        for instance in instances:
+            instance.send(i)
+    if env.scheduler is not None:
+        env.scheduler.join()
+    else:
+        while len(env.output.lines) < total:
+            time.sleep(0.001)
+    throughput = total / (time.perf_counter() - start)
+    finish_program(env)
+    return spawn, idle, throughput
+
+def main(counts, messages=10):
+    print(f"{'actors':>8} {'runtime':>8} {'spawn (s)':>10} {'spawn/actor (us)':>17} {'idle cpu (s)':>13} {'msgs/s':>12}")
+    for count in counts:
+        for runtime in ('pool', 'thread'):
+            if runtime == 'thread' and count > THREAD_LIMIT:
+                print(f"{count:>8} {runtime:>8} {'skipped':>10}")
+                continue
+            spawn, idle, throughput = run(runtime, count, messages)
+            print(f"{count:>8} {runtime:>8} {spawn:>10.3f} {spawn / count * 1e6:>17.1f} {idle:>13.3f} {throughput:>12,.0f}")
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10, 1000, 100_000])
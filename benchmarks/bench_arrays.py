@@ -0,0 +1,52 @@
+"""Bulk numeric work: an interpreted for loop vs. the vectorized array.* stdlib.
+
+Both versions compute the same sums; the loop version makes one statement
+dispatch per element, the vectorized one a single stdlib call per operation.
+The array backend (NumPy or the array module) is printed first.
+
+Usage: python benchmarks/bench_arrays.py [elements]   (default: 1000000)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.nexa_interpreter import ARRAY_BACKEND, ENGINES, Environment, execute, parse, tokenize, type_check
+
+def loop_sum(n):
+    return f"let total: Int = 0;\nfor i in range({n}) {{\n    total += i;\n}}"
+
+def vector_sum(n):
+    return f"let xs: Array = array.range({n});\nlet total: Int = array.sum(xs);"
+
+def loop_scaled(n):
+    return (f"let total: Int = 0;\nfor i in range({n}) {{\n    let v: Int = math.multiply(i, 3);\n"
+            f"    total += v;\n}}")
+
+def vector_scaled(n):
+    return f"let xs: Array = array.range({n});\nlet ys: Array = array.multiply(xs, 3);\nlet total: Int = array.sum(ys);"
+
+CASES = {'sum': (loop_sum, vector_sum), 'scale+sum': (loop_scaled, vector_scaled)}
+
+def measure(code, engine):
+    ast = parse(tokenize(code))
+    env = Environment()
+    type_check(ast, env)
+    env = Environment()
+    start = time.perf_counter()
+    execute(ast, env, engine)
+    return time.perf_counter() - start, env.get_value('total')
+
+def main(n):
+    print(f"array backend: {ARRAY_BACKEND}, {n:,} elements")
+    print(f"{'case':>10} {'engine':>8} {'loop (s)':>10} {'vector (s)':>11} {'speedup':>8}")
+    for name, (loop, vector) in CASES.items():
+        for engine in ENGINES:
+            looped, expected = measure(loop(n), engine)
+            vectorized, total = measure(vector(n), engine)
+            assert total == expected, (name, engine, total, expected)
+            print(f"{name:>10} {engine:>8} {looped:>10.3f} {vectorized:>11.4f} {looped / vectorized:>7.0f}x")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
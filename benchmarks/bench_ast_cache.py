@@ -0,0 +1,56 @@
+"""Repeated run_nexa() on the same script: no cache, in-process AstCache, and
+an on-disk AstCache opened fresh for every run (as separate processes would).
+
+Usage: python benchmarks/bench_ast_cache.py [runs] [statements]   (default: 200 400)
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.nexa_interpreter import AstCache, OutputChannel, run_nexa
+
+BLOCK = """let total: Int = 0;
+fn add(a: Int, b: Int) -> Int {
+    return a + b;
+}
+if total > 5 {
+    say "big";
+} else {
+    total += 1;
+}
+"""
+
+def make_script(statements):
+    return BLOCK * max(1, statements // 5)
+
+def measure(code, runs, make_cache):
+    start = time.perf_counter()
+    cache = None
+    for _ in range(runs):
+        cache = make_cache()
+        run_nexa(code, output=OutputChannel(capture=True), ast_cache=cache)
+    return time.perf_counter() - start, cache
+
+def main(runs, statements):
+    code = make_script(statements)
+    shared = AstCache()
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            'none': measure(code, runs, lambda: None),
+            'memory': measure(code, runs, lambda: shared),
+            'disk': measure(code, runs, lambda: AstCache(directory=tmp)),
+        }
+    base = results['none'][0]
+    print(f"{runs} runs of a {len(code.splitlines())}-line script")
+    print(f"{'cache':>8} {'total (s)':>10} {'per run (ms)':>13} {'speedup':>8}")
+    for name, (elapsed, _) in results.items():
+        print(f"{name:>8} {elapsed:>10.3f} {elapsed / runs * 1e3:>13.3f} {base / elapsed:>7.1f}x")
+    stats = shared.stats()
+    print(f"memory cache: hit rate {stats['hit_rate']:.1%}, {stats['saved_seconds']:.3f}s of parsing saved")
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [200, 400][len(args):]))
@@ -0,0 +1,51 @@
+"""Call-site throughput: a loop making one user-function and two stdlib calls
+per iteration, on each execution engine.
+
+Programs are parsed and type-checked once; only execution is timed, best of
+`rounds`. Call sites are linked by type_check() or on first use, so the
+per-call cost should not include name lookups or argument parsing.
+
+Usage: python benchmarks/bench_call_sites.py [iterations] [rounds]   (default: 20000 5)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.nexa_interpreter import ENGINES, Environment, execute, parse, tokenize, type_check
+
+PROGRAM = """fn double(a: Int) -> Int {
+    return a * 2;
+}
+let total: Int = 0;
+for i in range({iterations}) {{
+    let d: Int = double(i);
+    let s: Int = math.add(d, i);
+    let t: Int = math.subtract(s, i);
+    total += t;
+}}"""
+
+CALLS_PER_ITERATION = 3
+
+def measure(engine, iterations):
+    env = Environment()
+    ast = parse(tokenize(PROGRAM.replace('{{', '{').replace('}}', '}').replace('{iterations}', str(iterations))))
+    type_check(ast, env)
+    start = time.perf_counter()
+    execute(ast, env, engine)
+    elapsed = time.perf_counter() - start
+    assert env.get_value('total') == iterations * (iterations - 1)
+    return elapsed
+
+def main(iterations, rounds):
+    calls = iterations * CALLS_PER_ITERATION
+    print(f"{iterations:,} iterations x {CALLS_PER_ITERATION} calls = {calls:,} calls, best of {rounds}")
+    print(f"{'engine':>8} {'time (s)':>10} {'calls/s':>12}")
+    for engine in ENGINES:
+        best = min(measure(engine, iterations) for _ in range(rounds))
+        print(f"{engine:>8} {best:>10.3f} {calls / best:>12,.0f}")
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [20_000, 5][len(args):]))
@@ -0,0 +1,57 @@
+"""Recursive user-function calls per second for each execution engine.
+
+Usage: python benchmarks/bench_calls.py [depth] [repeats]   (default: 150 200)
+"""
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.nexa_interpreter import (
+    CallExpr, Environment, FnDecl, ForStmt, IfStmt, LetStmt, ReturnStmt, ENGINES, execute,
+)
+
+def sum_to():
+    """fn sumto(n) { if n > 0 { return n + sumto(n - 1); } return n; }"""
+    return FnDecl(name='sumto', params=[('n', 'Int')], return_type='Int', body=[
+        IfStmt(condition='n>0', then_body=[
+            LetStmt(name='m', type='Int', value=CallExpr(fn_name='math.subtract', args=['n', '1'])),
+            LetStmt(name='r', type='Int', value=CallExpr(fn_name='sumto', args=['m'])),
+            ReturnStmt(value=CallExpr(fn_name='math.add', args=['n', 'r'])),
+        ], else_body=[]),
+        ReturnStmt(value=CallExpr(fn_name='identity', args=['n'])),
+    ])
+
+def program(depth, repeats):
+    return [
+        sum_to(),
+        LetStmt(name='depth', type='Int', value=depth),
+        ForStmt(var='i', start=0, end=repeats, body=[
+            LetStmt(name='total', type='Int', value=CallExpr(fn_name='sumto', args=['depth'])),
+        ]),
+    ]
+
+def measure(ast, engine):
+    env = Environment()
+    env.set_fn(ast[0])
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        execute(ast, env, engine)
+        elapsed = time.perf_counter() - start
+    return env.get_var('total')[0], elapsed
+
+def main(depth, repeats):
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), depth * 20))
+    calls = (depth + 1) * repeats
+    print(f"sumto({depth}) x {repeats} = {calls:,} calls")
+    print(f"{'engine':>8} {'time (s)':>10} {'calls/s':>12}")
+    for engine in ENGINES:
+        total, elapsed = measure(program(depth, repeats), engine)
+        assert total == depth * (depth + 1) // 2, (engine, total)
+        print(f"{engine:>8} {elapsed:>10.3f} {calls / elapsed:>12,.0f}")
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [150, 200][len(args):]))
@@ -0,0 +1,50 @@
+"""Per-call latency of an embedded program: run_nexa() on the source every
+time vs. an Interpreter loaded once and run() with new inputs, plus
+run_batch() throughput on each executor.
+
+Usage: python benchmarks/bench_embedding.py [calls]   (default: 2000)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.nexa_interpreter import BATCH_EXECUTORS, ENGINES, Interpreter, OutputChannel, run_nexa
+
+PROGRAM = """let total: Int = 0;
+fn add(a: Int, b: Int) -> Int {
+    return a + b;
+}
+for i in range(10) {
+    total += n;
+}
+let result: Int = add(total, n);
+say "result is {result}";
+"""
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    for n in range(calls):
+        fn(n)
+    return (time.perf_counter() - start) / calls * 1e6
+
+def main(calls):
+    print(f"{'engine':>8} {'run_nexa (us)':>14} {'run() (us)':>11} {'speedup':>8}")
+    for engine in ENGINES:
+        before = per_call(lambda n: run_nexa(f"let n: Int = {n};\n" + PROGRAM, engine=engine,
+                                             output=OutputChannel(capture=True)), calls)
+        interpreter = Interpreter(PROGRAM, inputs={'n': 'Int'}, engine=engine)
+        after = per_call(lambda n: interpreter.run({'n': n}), calls)
+        print(f"{engine:>8} {before:>14.1f} {after:>11.1f} {before / after:>7.1f}x")
+    interpreter = Interpreter(PROGRAM, inputs={'n': 'Int'})
+    batch = [{'n': n} for n in range(calls)]
+    print(f"\n{'executor':>8} {'runs/s':>12}")
+    for executor in BATCH_EXECUTORS:
+        start = time.perf_counter()
+        results = interpreter.run_batch(batch, executor=executor, workers=2)
+        assert all(result.ok for result in results)
+        print(f"{executor:>8} {calls / (time.perf_counter() - start):>12,.0f}")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
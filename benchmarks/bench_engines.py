@@ -0,0 +1,58 @@
+"""Tree walker vs. closure compiler vs. bytecode VM on ForStmt/WhileStmt-heavy programs.
+
+Usage: python benchmarks/bench_engines.py [iterations]   (default: 100000)
+"""
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.nexa_interpreter import (
+    AssignStmt, Environment, ForStmt, IfStmt, LetStmt, WhileStmt, CallExpr, ENGINES, execute,
+)
+
+def for_sum(n):
+    return [
+        LetStmt(name='total', type='Int', value=0),
+        ForStmt(var='i', start=0, end=n, body=[AssignStmt(name='total', op='+=', value='i')]),
+    ]
+
+def while_countdown(n):
+    return [
+        LetStmt(name='n', type='Int', value=n),
+        LetStmt(name='acc', type='Int', value=0),
+        WhileStmt(condition='n>0', body=[
+            IfStmt(condition='n>100', then_body=[AssignStmt(name='acc', op='+=', value=2)], else_body=[AssignStmt(name='acc', op='+=', value=1)]),
+            AssignStmt(name='n', op='+=', value=-1),
+        ]),
+    ]
+
+def nested_calls(n):
+    return [
+        LetStmt(name='acc', type='Int', value=1),
+        ForStmt(var='i', start=0, end=n, body=[
+            LetStmt(name='acc', type='Int', value=CallExpr(fn_name='math.add', args=['acc', 'i'])),
+        ]),
+    ]
+
+PROGRAMS = {'for_sum': for_sum, 'while_countdown': while_countdown, 'nested_calls': nested_calls}
+
+def measure(ast, engine):
+    env = Environment()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        execute(ast, env, engine)
+        return time.perf_counter() - start
+
+def main(iterations):
+    print(f"{'program':>16}" + ''.join(f"{engine + ' (s)':>14}" for engine in ENGINES) + "  speedup vs tree")
+    for name, build in PROGRAMS.items():
+        ast = build(iterations)
+        times = [measure(ast, engine) for engine in ENGINES]
+        speedups = ' '.join(f"{engine}={times[0] / t:.1f}x" for engine, t in zip(ENGINES[1:], times[1:]))
+        print(f"{name:>16}" + ''.join(f"{t:>14.3f}" for t in times) + f"  {speedups}")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
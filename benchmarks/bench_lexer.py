@@ -0,0 +1,60 @@
+"""Lexer throughput: legacy per-pattern loop vs. the combined-regex tokenize().
+
+Usage: python benchmarks/bench_lexer.py [lines ...]   (default: 10000 100000 1000000)
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.nexa_interpreter import _TOKEN_PATTERNS, tokenize
+
+SAMPLE = [
+    'let x: Int = 10;',
+    'let y: Int = math.add(x, 5);',
+    'x += y;',
+    'fn add(a: Int, b: Int) -> Int {',
+    '    return a + b;',
+    '}',
+    'say "Sum: {add(x, y)}";',
+    'counter.send(5);',
+]
+
+def legacy_tokenize(code):
+    """The original tokenizer: re.match() on each pattern in turn, per line."""
+    patterns = [(pattern, lambda m, h=handler: h(m.groups())) for pattern, handler in _TOKEN_PATTERNS]
+    tokens = []
+    for line_num, line in enumerate(code.split('\n'), 1):
+        line = line.strip()
+        if not line:
+            continue
+        for pattern, handler in patterns:
+            match = re.match(pattern, line)
+            if match:
+                tokens.append((handler(match), line_num))
+                break
+        else:
+            raise SyntaxError(f"Invalid syntax at line {line_num}: {line}")
+    return tokens
+
+def make_source(lines):
+    return '\n'.join(SAMPLE[i % len(SAMPLE)] for i in range(lines))
+
+def measure(fn, code, lines):
+    start = time.perf_counter()
+    fn(code)
+    return lines / (time.perf_counter() - start)
+
+def main(sizes):
+    print(f"{'lines':>10} {'before (l/s)':>15} {'after (l/s)':>15} {'speedup':>8}")
+    for lines in sizes:
+        code = make_source(lines)
+        assert legacy_tokenize(code[:2000]) == tokenize(code[:2000])
+        before = measure(legacy_tokenize, code, lines)
+        after = measure(tokenize, code, lines)
+        print(f"{lines:>10} {before:>15,.0f} {after:>15,.0f} {after / before:>7.1f}x")
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
@@ -0,0 +1,44 @@
+"""Parser throughput on flat, very wide and deeply nested programs.
+
+Tokens are produced up front so only parse() is timed. Statements per second
+should stay flat as the input grows: every token is read once.
+
+Usage: python benchmarks/bench_parser.py [lines ...]   (default: 10000 100000 1000000)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.nexa_interpreter import parse, tokenize
+
+DEPTH = 100
+
+def flat(lines):
+    return ['let x: Int = 1;', 'x += y;', 'say "x is {x}";'] * (lines // 3)
+
+def wide(lines):
+    return ['for i in range(10) {'] + ['total += i;'] * (lines - 2) + ['}']
+
+def deep(lines):
+    """Blocks nested DEPTH deep, alternating for/if/while, repeated to fill `lines`."""
+    openers = ['for i in range(2) {', 'if i > 0 {', 'while n > 0 {']
+    nest = [openers[d % 3] for d in range(DEPTH)] + ['n = 0;'] + ['}'] * DEPTH
+    return nest * max(1, lines // len(nest))
+
+SHAPES = {'flat': flat, 'wide': wide, 'deep': deep}
+
+def measure(tokens):
+    start = time.perf_counter()
+    parse(tokens)
+    return len(tokens) / (time.perf_counter() - start)
+
+def main(sizes):
+    print(f"{'lines':>10}" + ''.join(f"{shape + ' (tok/s)':>18}" for shape in SHAPES))
+    for lines in sizes:
+        rates = [measure(tokenize('\n'.join(build(lines)))) for build in SHAPES.values()]
+        print(f"{lines:>10}" + ''.join(f"{rate:>18,.0f}" for rate in rates))
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
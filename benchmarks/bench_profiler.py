@@ -0,0 +1,42 @@
+"""Profiler cost: a call-heavy loop run with no profiler installed and with one.
+
+The unprofiled column is the number to compare across revisions; it should
+not move when profiling support changes.
+
+Usage: python benchmarks/bench_profiler.py [iterations]   (default: 100000)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.nexa_interpreter import (
+    CallExpr, Environment, ForStmt, LetStmt, Profiler, ENGINES, configure_profiling, execute, parse, tokenize,
+)
+
+def program(n):
+    double = parse(tokenize("fn double(a: Int) -> Int {\n    return a * 2;\n}"))[0]
+    return [double, ForStmt(var='i', start=0, end=n, line=4, body=[
+        LetStmt(name='r', type='Int', value=CallExpr(fn_name='double', args=['i']), line=5),
+    ])]
+
+def measure(ast, engine, profiler):
+    configure_profiling(profiler)
+    try:
+        start = time.perf_counter()
+        execute(ast, Environment(), engine)
+        return time.perf_counter() - start
+    finally:
+        configure_profiling(None)
+
+def main(iterations):
+    ast = program(iterations)
+    print(f"{'engine':>8}{'off (s)':>12}{'on (s)':>12}{'overhead':>10}")
+    for engine in ENGINES:
+        off = measure(ast, engine, None)
+        on = measure(ast, engine, Profiler())
+        print(f"{engine:>8}{off:>12.3f}{on:>12.3f}{on / off:>9.1f}x")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
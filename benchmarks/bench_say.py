@@ -0,0 +1,47 @@
+"""say-heavy loops: interpolated output inside ForStmt bodies, on every engine.
+
+Output goes to a capturing OutputChannel so the numbers measure template
+rendering rather than terminal I/O.
+
+Usage: python benchmarks/bench_say.py [iterations]   (default: 100000)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.nexa_interpreter import (
+    Environment, ForStmt, LetStmt, OutputChannel, SayStmt, ENGINES, execute,
+)
+
+def literal(n):
+    return [ForStmt(var='i', start=0, end=n, body=[SayStmt(value='tick')])]
+
+def variables(n):
+    return [
+        LetStmt(name='total', type='Int', value=42),
+        ForStmt(var='i', start=0, end=n, body=[SayStmt(value='i={i} total={total}')]),
+    ]
+
+def calls(n):
+    return [ForStmt(var='i', start=0, end=n, body=[SayStmt(value='{i} + 1 = {math.add(i, 1)}')])]
+
+PROGRAMS = {'literal': literal, 'variables': variables, 'calls': calls}
+
+def measure(ast, engine):
+    env = Environment()
+    env.output = OutputChannel(capture=True)
+    start = time.perf_counter()
+    execute(ast, env, engine)
+    return time.perf_counter() - start
+
+def main(iterations):
+    print(f"{'program':>12}" + ''.join(f"{engine + ' (s)':>14}" for engine in ENGINES) + f"{'lines/s (tree)':>16}")
+    for name, build in PROGRAMS.items():
+        ast = build(iterations)
+        times = [measure(ast, engine) for engine in ENGINES]
+        print(f"{name:>12}" + ''.join(f"{t:>14.3f}" for t in times) + f"{iterations / times[0]:>16,.0f}")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
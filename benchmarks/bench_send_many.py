@@ -0,0 +1,82 @@
+"""Fan-out throughput: one send per message vs. send_many batches.
+
+Each runtime delivers `messages` messages to `actors` Counter actors, either
+one send() at a time or as one send_many() per actor per batch of `batch`.
+
+Usage: python benchmarks/bench_send_many.py [messages] [actors] [batch]   (default: 100000 10 1000)
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.nexa_interpreter import (
+    ActorDecl, AssignStmt, FnDecl, LetStmt, SpawnStmt, OutputChannel, interpret, program_env, finish_program,
+)
+
+COUNTER = ActorDecl(name='Counter', state=[LetStmt(name='count', type='Int', value=0)], methods=[
+    FnDecl(name='on_message', params=[('msg', 'Int')], return_type='Unit', body=[
+        AssignStmt(name='count', op='+=', value='msg'),
+    ]),
+])
+
+def spawn(env, actors):
+    env.set_actor(COUNTER)
+    instances = []
+    for _ in range(actors):
+        interpret([SpawnStmt(actor_name='Counter', var_name='c')], env)
+        instances.append(env.get_value('c'))
+    return instances
+
+def deliver(instances, messages, batch):
+    per_actor = messages // len(instances)
+    if batch <= 1:
+        for _ in range(per_actor):
+            for instance in instances:
+                instance.send(1)
+    else:
+        chunk = [1] * batch
+        for _ in range(per_actor // batch):
+            for instance in instances:
+                instance.send_many(chunk)
+    return per_actor * len(instances)
+
+def wait(instances, expected):
+    while sum(instance.state['count'] for instance in instances) < expected:
+        time.sleep(0.001)
+
+def measure(runtime, messages, actors, batch):
+    if runtime == 'asyncio':
+        return asyncio.run(measure_async(messages, actors, batch))
+    env = program_env(OutputChannel(capture=True), actor_runtime=runtime)
+    instances = spawn(env, actors)
+    start = time.perf_counter()
+    total = deliver(instances, messages, batch)
+    if env.scheduler is not None:
+        env.scheduler.join()
+    else:
+        wait(instances, total)
+    elapsed = time.perf_counter() - start
+    finish_program(env)
+    return total / elapsed
+
+async def measure_async(messages, actors, batch):
+    env = program_env(OutputChannel(capture=True), actor_runtime='asyncio')
+    instances = spawn(env, actors)
+    start = time.perf_counter()
+    total = deliver(instances, messages, batch)
+    await env.scheduler.drain()
+    return total / (time.perf_counter() - start)
+
+def main(messages, actors, batch):
+    print(f"{'runtime':>8} {'send msgs/s':>14} {'send_many msgs/s':>17} {'gain':>6}")
+    for runtime in ('thread', 'pool', 'asyncio'):
+        single = measure(runtime, messages, actors, 1)
+        batched = measure(runtime, messages, actors, batch)
+        print(f"{runtime:>8} {single:>14,.0f} {batched:>17,.0f} {batched / single:>5.1f}x")
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [100_000, 10, 1000][len(args):]))
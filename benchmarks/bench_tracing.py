@@ -0,0 +1,52 @@
+"""Cost of each trace level on a while-loop-heavy program (tree walker).
+
+Usage: python benchmarks/bench_tracing.py [iterations]   (default: 100000)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.nexa_interpreter import (
+    AssignStmt, Environment, LetStmt, WhileStmt, FileSink, RingBufferSink, configure_tracing, interpret,
+)
+
+def program(n):
+    return [
+        LetStmt(name='n', type='Int', value=n),
+        LetStmt(name='acc', type='Int', value=0),
+        WhileStmt(condition='n>0', body=[
+            AssignStmt(name='acc', op='+=', value='n'),
+            AssignStmt(name='n', op='+=', value=-1),
+        ]),
+    ]
+
+def measure(ast, level, sink):
+    configure_tracing(level, [sink])
+    start = time.perf_counter()
+    interpret(ast, Environment())
+    return time.perf_counter() - start
+
+def main(iterations):
+    ast = program(iterations)
+    devnull = FileSink(os.devnull)
+    cases = [
+        ('off', RingBufferSink()),
+        ('info', RingBufferSink()),
+        ('node', RingBufferSink()),
+        ('trace', RingBufferSink()),
+        ('node', devnull),
+        ('trace', devnull),
+    ]
+    baseline = None
+    print(f"{'level':>6} {'sink':>12} {'time (s)':>10} {'overhead':>9}")
+    for level, sink in cases:
+        elapsed = measure(ast, level, sink)
+        baseline = baseline or elapsed
+        print(f"{level:>6} {type(sink).__name__:>12} {elapsed:>10.3f} {elapsed / baseline:>8.1f}x")
+    devnull.close()
+    configure_tracing('off')
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
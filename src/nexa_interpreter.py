@@ -1,20 +1,58 @@
+import asyncio
+import itertools
+import json
 import re
-from dataclasses import dataclass
-from typing import Dict, List, Any, Optional, Union
-from queue import Queue, Empty
+from bisect import bisect_left
+from array import array
+from copy import deepcopy
+from dataclasses import dataclass, field, fields as dataclass_fields, replace
+from typing import Callable, Dict, Iterable, Iterator, List, Any, Optional, Tuple, Union
+from collections import OrderedDict, deque
+from queue import Queue
+import hashlib
+import marshal
+import operator
+import os
+import pickle
+import sys
 import threading
 import time
+import zlib
+
+try:
+    import numpy
+except ImportError:  # optional: array.* falls back to the array module
+    numpy = None
+
+__version__ = "0.1"
+
+# Annotations type_check() stores on nodes. A slot is a (Scope, index) pair and
+# is only trusted by an Environment running on that very Scope; a call's link
+# is an inline cache, only trusted while its function table is unchanged.
+# Copies and pickles drop them all and are re-checked where they run.
+_CHECKER_ANNOTATIONS = ('slot', 'builtin', 'arg_slots', 'value_slot', 'link')
+
+def _annotation():
+    return field(default=None, init=False, repr=False, compare=False)
 
 @dataclass(kw_only=True)
 class Node:
     line: int = 0
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in _CHECKER_ANNOTATIONS:
+            if name in state:
+                state[name] = None
+        return state
+
 @dataclass(kw_only=True)
 class LetStmt(Node):
     name: str
     value: Union[int, 'CallExpr', None]
     type: str
     line: int = 0
+    slot: Optional[tuple] = _annotation()
 
 @dataclass(kw_only=True)
 class ReturnStmt(Node):
@@ -24,8 +62,13 @@ class ReturnStmt(Node):
 @dataclass(kw_only=True)
 class SendStmt(Node):
     actor_var: str
-    msg: Union[int, 'CallExpr']
+    # A list sends every element in one batch (send_many); elements are
+    # ints or variable names.
+    msg: Union[int, 'CallExpr', List[Union[int, str]]]
     line: int = 0
+    slot: Optional[tuple] = _annotation()
+    # (Scope, one slot index or None per element of a list msg).
+    arg_slots: Optional[tuple] = _annotation()
 
 @dataclass(kw_only=True)
 class FnDecl(Node):
@@ -34,6 +77,10 @@ class FnDecl(Node):
     return_type: str
     body: List[Node]
     ai_optimized: bool = False
+    compiled: Optional[Callable] = field(default=None, init=False, repr=False, compare=False)
+    scope: Optional['Scope'] = field(default=None, init=False, repr=False, compare=False)
+    pure: Optional[bool] = field(default=None, init=False, repr=False, compare=False)
+    bytecode: Optional['CodeObject'] = field(default=None, init=False, repr=False, compare=False)
     line: int = 0
 
 @dataclass(kw_only=True)
@@ -41,6 +88,8 @@ class ActorDecl(Node):
     name: str
     state: List[Node]
     methods: List[FnDecl]
+    capacity: Optional[int] = None
+    overflow: Optional[str] = None
     line: int = 0
 
 @dataclass(kw_only=True)
@@ -49,6 +98,13 @@ class IfStmt(Node):
     then_body: List[Node]
     else_body: List[Node]
     line: int = 0
+    cond_var: str = field(init=False, repr=False, compare=False)
+    cond_bound: int = field(init=False, repr=False, compare=False)
+    slot: Optional[tuple] = _annotation()
+
+    def __post_init__(self):
+        var, bound = self.condition.split('>')
+        self.cond_var, self.cond_bound = var.strip(), int(bound)
 
 @dataclass(kw_only=True)
 class ForStmt(Node):
@@ -57,12 +113,20 @@ class ForStmt(Node):
     end: int
     body: List[Node]
     line: int = 0
+    slot: Optional[tuple] = _annotation()
 
 @dataclass(kw_only=True)
 class WhileStmt(Node):
     condition: str
     body: List[Node]
     line: int = 0
+    cond_var: str = field(init=False, repr=False, compare=False)
+    cond_bound: int = field(init=False, repr=False, compare=False)
+    slot: Optional[tuple] = _annotation()
+
+    def __post_init__(self):
+        var, bound = self.condition.split('>')
+        self.cond_var, self.cond_bound = var.strip(), int(bound)
 
 @dataclass(kw_only=True)
 class TryStmt(Node):
@@ -70,15 +134,53 @@ class TryStmt(Node):
     catch_body: List[Node]
     line: int = 0
 
+@dataclass
+class SayTemplate:
+    """A say string split into literal chunks and the `{var}` / `{fn(args)}`
+    references between them; len(chunks) == len(refs) + 1."""
+    chunks: List[str]
+    refs: List[Union[str, 'CallExpr']]
+
+def parse_template(value: str, line: int = 0) -> SayTemplate:
+    """Split an interpolation string once. Variable references are kept as
+    names, calls as CallExprs on `line` with stripped args (digits already ints)."""
+    chunks = ['']
+    refs: List[Union[str, CallExpr]] = []
+    rest = value
+    while True:
+        start = rest.find('{')
+        end = rest.find('}', start + 1)
+        if start < 0 or end < 0:
+            chunks[-1] += rest
+            return SayTemplate(chunks, refs)
+        chunks[-1] += rest[:start]
+        expr = rest[start+1:end].strip()
+        if '(' in expr:
+            args = [arg.strip() for arg in expr[expr.find('(')+1:expr.rfind(')')].split(',')]
+            refs.append(CallExpr(fn_name=expr[:expr.find('(')].strip(), args=[int(arg) if arg.isdigit() else arg for arg in args], line=line))
+        else:
+            refs.append(expr)
+        chunks.append('')
+        rest = rest[end+1:]
+
 @dataclass(kw_only=True)
 class SayStmt(Node):
     value: str
     line: int = 0
+    template: SayTemplate = field(init=False, repr=False, compare=False)
+    # (Scope, one slot index or None per template ref; None for calls).
+    arg_slots: Optional[tuple] = _annotation()
+
+    def __post_init__(self):
+        self.template = parse_template(self.value, self.line)
 
 @dataclass(kw_only=True)
 class SpawnStmt(Node):
     actor_name: str
     var_name: str = ""
+    # Mailbox settings for this instance; None falls back to the ActorDecl's.
+    capacity: Optional[int] = None
+    overflow: Optional[str] = None
     line: int = 0
 
 @dataclass(kw_only=True)
@@ -86,6 +188,25 @@ class CallExpr(Node):
     fn_name: str
     args: List[Union[str, int]]
     line: int = 0
+    # `args` classified once: (name, None) for a variable, (None, value) for a constant.
+    operands: tuple = field(init=False, repr=False, compare=False)
+    builtin: Optional[Callable] = _annotation()
+    arg_slots: Optional[tuple] = _annotation()
+    link: Optional[tuple] = _annotation()
+
+    def __post_init__(self):
+        # `f()` lexes as [''], as in send_many(): a blank arg is no argument.
+        self.args = [arg for arg in self.args if not isinstance(arg, str) or arg.strip()]
+        operands = []
+        for arg in self.args:
+            if isinstance(arg, str):
+                arg = arg.strip()
+                if not arg.isdigit():
+                    operands.append((arg, None))
+                    continue
+                arg = int(arg)
+            operands.append((None, arg))
+        self.operands = tuple(operands)
 
 @dataclass(kw_only=True)
 class AssignStmt(Node):
@@ -93,29 +214,635 @@ class AssignStmt(Node):
     op: str
     value: Union[str, int]
     line: int = 0
+    slot: Optional[tuple] = _annotation()
+    value_slot: Optional[tuple] = _annotation()
 
-class Environment:
+class _Unbound:
+    def __repr__(self):
+        return '<unbound>'
+
+# Marks a slot that has been laid out but not assigned yet.
+_UNBOUND = _Unbound()
+
+class Scope:
+    """Variable layout for one scope: each name gets a numeric slot, and
+    declared types live in a side table instead of next to every value."""
+    __slots__ = ('slots', 'names', 'types')
+
+    def __init__(self, params: Iterable[tuple[str, str]] = ()):
+        self.slots: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.types: List[str] = []
+        for name, type_ in params:
+            self.slot(name, type_)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def slot(self, name: str, type_: Optional[str] = None) -> int:
+        index = self.slots.get(name)
+        if index is None:
+            index = self.slots[name] = len(self.names)
+            self.names.append(name)
+            self.types.append(type_ or 'Int')
+        elif type_ is not None:
+            self.types[index] = type_
+        return index
+
+    def copy(self) -> 'Scope':
+        scope = Scope()
+        scope.slots = self.slots.copy()
+        scope.names = self.names.copy()
+        scope.types = self.types.copy()
+        return scope
+
+# Tracing: leveled, structured diagnostics. Hot paths read TRACER.level once
+# and compare integers, so nothing is formatted unless a sink will receive it.
+
+TRACE_OFF, TRACE_INFO, TRACE_NODE, TRACE_TRACE = range(4)
+TRACE_LEVELS = {'off': TRACE_OFF, 'info': TRACE_INFO, 'node': TRACE_NODE, 'trace': TRACE_TRACE}
+
+@dataclass
+class TraceEvent:
+    level: int
+    node_type: str
+    line: int
+    message: str = ''
+    timestamp: float = field(default_factory=time.time)
+
+    def format(self) -> str:
+        level = next(name for name, value in TRACE_LEVELS.items() if value == self.level)
+        text = f"[{level}] line {self.line} {self.node_type}"
+        return f"{text}: {self.message}" if self.message else text
+
+class StderrSink:
+    def __call__(self, event: TraceEvent):
+        print(event.format(), file=sys.stderr)
+
+class FileSink:
+    def __init__(self, path: str):
+        self.file = open(path, 'a')
+        self._lock = threading.Lock()
+
+    def __call__(self, event: TraceEvent):
+        with self._lock:
+            self.file.write(event.format() + '\n')
+
+    def close(self):
+        self.file.close()
+
+class RingBufferSink:
+    """Keeps the most recent `capacity` events in memory."""
+    def __init__(self, capacity: int = 1000):
+        self.buffer: deque = deque(maxlen=capacity)
+
+    def __call__(self, event: TraceEvent):
+        self.buffer.append(event)
+
+    def events(self) -> List[TraceEvent]:
+        return list(self.buffer)
+
+class Tracer:
+    def __init__(self, level: int = TRACE_OFF, sinks: Optional[List[Callable[[TraceEvent], None]]] = None):
+        self.level = level
+        self.sinks = sinks if sinks is not None else [StderrSink()]
+
+    def emit(self, level: int, node: Optional[Node] = None, message: str = '', line: Optional[int] = None):
+        if level > self.level:
+            return
+        event = TraceEvent(level=level, node_type=type(node).__name__ if node is not None else '-',
+                           line=line if line is not None else (node.line if node is not None else 0), message=message)
+        for sink in self.sinks:
+            sink(event)
+
+TRACER = Tracer()
+
+def configure_tracing(level: Union[int, str] = TRACE_OFF, sinks: Optional[List[Callable[[TraceEvent], None]]] = None) -> Tracer:
+    """Set the global trace level ('off', 'info', 'node', 'trace') and, optionally, its sinks."""
+    TRACER.level = TRACE_LEVELS[level] if isinstance(level, str) else level
+    if sinks is not None:
+        TRACER.sinks = sinks
+    return TRACER
+
+# Profiling: call counts and cumulative/self time per source line and per
+# function. Like tracing, the hot paths check PROFILER once per block or call
+# and the closure compiler decides at compile time whether to wrap a step, so
+# a program run without a profiler does no timing at all.
+
+PROFILE_ROOT = '<module>'
+
+@dataclass
+class ProfileStat:
+    name: str
+    line: int
+    calls: int = 0
+    primitive: int = 0  # calls not nested in another call of the same line/function
+    own: float = 0.0
+    total: float = 0.0
+
+class _ProfileStack(threading.local):
     def __init__(self):
-        self.vars: Dict[str, Any] = {}
-        self.fns: Dict[str, FnDecl] = {}
-        self.actors: Dict[str, ActorDecl] = {}
-        self.stdlib = {
-            'math.add': lambda x, y: x + y,
-            'math.subtract': lambda x, y: x - y,
-            'math.multiply': lambda x, y: x * y,
-            'math.divide': lambda x, y: x / y if y != 0 else float('inf')
-        }
+        self.lines: List[List[Any]] = []
+        self.fns: List[List[Any]] = []
+        self.line_depth: Dict[int, int] = {}
+        self.fn_depth: Dict[str, int] = {}
+
+class Profiler:
+    """Collects per-line and per-function timings while installed with
+    configure_profiling(). Each thread keeps its own stack, so actor handlers
+    are profiled alongside the main program; the 'process' runtime's actors
+    run in other processes and are not. The 'vm' engine is profiled per
+    function only."""
+    def __init__(self, filename: str = '<nexa>', clock: Callable[[], float] = time.perf_counter):
+        self.filename = filename
+        self.clock = clock
+        self.lines: Dict[int, ProfileStat] = {}
+        self.functions: Dict[str, ProfileStat] = {}
+        self.callers: Dict[Tuple[str, str], ProfileStat] = {}
+        self.stacks: Dict[Tuple[str, ...], float] = {}
+        self._stack = _ProfileStack()
+        self._lock = threading.Lock()
+        self._wrappers: Dict[Callable, Callable] = {}
+
+    def _record(self, stat: ProfileStat, own: float, elapsed: float, depth: int):
+        stat.calls += 1
+        stat.own += own
+        if not depth:
+            stat.primitive += 1
+            stat.total += elapsed
+
+    def time_line(self, line: int, run: Callable, *args) -> Any:
+        stack = self._stack
+        fn_name = stack.fns[-1][0] if stack.fns else PROFILE_ROOT
+        depth = stack.line_depth.get(line, 0)
+        stack.line_depth[line] = depth + 1
+        frame = [self.clock(), 0.0]
+        stack.lines.append(frame)
+        try:
+            return run(*args)
+        finally:
+            elapsed = self.clock() - frame[0]
+            stack.lines.pop()
+            stack.line_depth[line] = depth
+            if stack.lines:
+                stack.lines[-1][1] += elapsed
+            with self._lock:
+                stat = self.lines.get(line)
+                if stat is None:
+                    stat = self.lines[line] = ProfileStat(fn_name, line)
+                self._record(stat, elapsed - frame[1], elapsed, depth)
+
+    def time_call(self, fn: 'FnDecl', run: Callable, args: List[Any], env: 'Environment') -> Any:
+        stack = self._stack
+        name = fn.name
+        caller = stack.fns[-1][0] if stack.fns else PROFILE_ROOT
+        depth = stack.fn_depth.get(name, 0)
+        stack.fn_depth[name] = depth + 1
+        frame = [name, self.clock(), 0.0]
+        stack.fns.append(frame)
+        try:
+            return run(fn, args, env)
+        finally:
+            elapsed = self.clock() - frame[1]
+            own = elapsed - frame[2]
+            path = tuple(entry[0] for entry in stack.fns)
+            stack.fns.pop()
+            stack.fn_depth[name] = depth
+            if stack.fns:
+                stack.fns[-1][2] += elapsed
+            with self._lock:
+                stat = self.functions.get(name)
+                if stat is None:
+                    stat = self.functions[name] = ProfileStat(name, fn.line)
+                self._record(stat, own, elapsed, depth)
+                edge = self.callers.get((caller, name))
+                if edge is None:
+                    edge = self.callers[caller, name] = ProfileStat(caller, 0)
+                self._record(edge, own, elapsed, depth)
+                self.stacks[path] = self.stacks.get(path, 0.0) + own
+
+    def block(self, ast: List['Node'], env: 'Environment') -> Any:
+        """interpret() with every statement timed as its own line."""
+        for node in ast:
+            result = self.time_line(node.line, interpret, [node], env, False)
+            if result is not None:
+                return result
+
+    def step(self, step: Callable, line: int) -> Callable:
+        """Wrap a compiled closure step so each run is timed against `line`."""
+        return lambda env: self.time_line(line, step, env)
+
+    def function(self, run: Callable) -> Callable:
+        """The `run(fn, args, env)` function-body runner, timed per function."""
+        wrapped = self._wrappers.get(run)
+        if wrapped is None:
+            wrapped = self._wrappers[run] = lambda fn, args, env: self.time_call(fn, run, args, env)
+        return wrapped
+
+    def report(self, top: int = 10, source: Optional[str] = None) -> str:
+        """The `top` lines and functions by self time, as a text table. With
+        `source`, each line is shown next to its text."""
+        text = source.splitlines() if source is not None else []
+        rows = ["Hot lines (by self time):",
+                f"{'line':>6} {'calls':>9} {'self ms':>10} {'cum ms':>10}  function"]
+        for stat in sorted(self.lines.values(), key=lambda stat: stat.own, reverse=True)[:top]:
+            row = f"{stat.line:>6} {stat.calls:>9} {stat.own * 1e3:>10.3f} {stat.total * 1e3:>10.3f}  {stat.name}"
+            if 0 < stat.line <= len(text):
+                row += f"  | {text[stat.line - 1].strip()}"
+            rows.append(row)
+        rows += ["", "Hot functions (by self time):",
+                 f"{'line':>6} {'calls':>9} {'self ms':>10} {'cum ms':>10}  function"]
+        for stat in sorted(self.functions.values(), key=lambda stat: stat.own, reverse=True)[:top]:
+            rows.append(f"{stat.line:>6} {stat.calls:>9} {stat.own * 1e3:>10.3f} {stat.total * 1e3:>10.3f}  {stat.name}")
+        return '\n'.join(rows)
+
+    def collapsed(self) -> str:
+        """Self time per call stack in microseconds, in the collapsed-stack
+        format read by flamegraph.pl, speedscope and inferno."""
+        return '\n'.join(f"{';'.join((PROFILE_ROOT,) + path)} {max(1, round(own * 1e6))}"
+                         for path, own in sorted(self.stacks.items()))
+
+    def pstats(self) -> Dict[Tuple[str, int, str], tuple]:
+        """Function stats in the layout pstats.Stats loads from a marshal file."""
+        def key(name: str) -> Tuple[str, int, str]:
+            stat = self.functions.get(name)
+            return (self.filename, stat.line if stat is not None else 0, name)
+        stats = {key(name): (stat.primitive, stat.calls, stat.own, stat.total, {})
+                 for name, stat in self.functions.items()}
+        for (caller, name), edge in self.callers.items():
+            stats[key(name)][4][key(caller)] = (edge.primitive, edge.calls, edge.own, edge.total)
+        return stats
+
+    def dump_stats(self, path: str):
+        """Write pstats() so `python -m pstats PATH` or snakeviz can read it."""
+        with open(path, 'wb') as f:
+            marshal.dump(self.pstats(), f)
+
+PROFILER: Optional[Profiler] = None
+
+def configure_profiling(profiler: Optional[Profiler]) -> Optional[Profiler]:
+    """Install `profiler` (None to stop profiling); returns the previous one."""
+    global PROFILER
+    previous, PROFILER = PROFILER, profiler
+    return previous
+
+# Program output. `say` hands its text to the environment's OutputChannel
+# instead of calling print. Writers only append to a deque (atomic under the
+# GIL), so actor threads never contend on a lock per line; the lock is taken
+# once per flush, when a whole block is joined and written out.
+
+OUTPUT_PREFIX = "Output: "
+OUTPUT_BUFFER_LINES = 512
+
+class OutputChannel:
+    """Destination for `say` output.
+
+    buffer_lines=0 writes every line through immediately; a positive value
+    buffers that many lines before writing them as one block. capture=True
+    collects the messages in `lines` instead of writing them, and raw=True
+    drops the "Output: " prefix. `stream` defaults to sys.stdout at flush time.
+    """
+    def __init__(self, stream: Optional[Any] = None, buffer_lines: int = 0, capture: bool = False, raw: bool = False):
+        self.stream = stream
+        self.buffer_lines = buffer_lines
+        self.capture = capture
+        self.prefix = '' if raw else OUTPUT_PREFIX
+        self.lines: List[str] = []
+        self._pending: deque = deque()
+        self._lock = threading.Lock()
+
+    def write(self, text: str):
+        if self.capture:
+            self.lines.append(text)
+        elif self.buffer_lines <= 0:
+            (self.stream or sys.stdout).write(f"{self.prefix}{text}\n")
+        else:
+            self._pending.append(text)
+            if len(self._pending) >= self.buffer_lines:
+                self.flush()
+
+    def flush(self):
+        """Write out every buffered line as one block."""
+        with self._lock:
+            pending = self._pending
+            lines = []
+            try:
+                while True:
+                    lines.append(pending.popleft())
+            except IndexError:
+                pass
+            if lines:
+                prefix = self.prefix
+                stream = self.stream or sys.stdout
+                stream.write(''.join(f"{prefix}{line}\n" for line in lines))
+                stream.flush()
+
+STDLIB: Dict[str, Callable] = {
+    'math.add': lambda x, y: x + y,
+    'math.subtract': lambda x, y: x - y,
+    'math.multiply': lambda x, y: x * y,
+    'math.divide': lambda x, y: x / y if y != 0 else float('inf')
+}
+
+# Array values and the vectorized array.* stdlib. Arrays are NumPy ndarrays
+# when NumPy is installed and array.array('q'/'d') otherwise; either way the
+# per-element loop runs in C rather than once per element through interpret().
+
+VALUE_TYPES = ('Int', 'Array')
+
+def _empty_check(name: str, xs: Any) -> Any:
+    if len(xs) == 0:
+        raise RuntimeError(f"{name} of an empty Array")
+    return xs
+
+def _index(xs: Any, i: int) -> Any:
+    if not -len(xs) <= i < len(xs):
+        raise RuntimeError(f"Array index out of range: {i} (length {len(xs)})")
+    return xs[i]
+
+def _python_typecode(*values: Any) -> str:
+    for value in values:
+        if isinstance(value, float) or (isinstance(value, array) and value.typecode == 'd'):
+            return 'd'
+    return 'q'
+
+def _python_elementwise(name: str, op: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+    def apply(x, y):
+        code = 'd' if name == 'divide' else _python_typecode(x, y)
+        if isinstance(x, array):
+            if isinstance(y, array):
+                if len(x) != len(y):
+                    raise RuntimeError(f"array.{name}: length mismatch ({len(x)} vs {len(y)})")
+                return array(code, map(op, x, y))
+            return array(code, map(op, x, itertools.repeat(y, len(x))))
+        if isinstance(y, array):
+            return array(code, map(op, itertools.repeat(x, len(y)), y))
+        return op(x, y)
+    return apply
+
+def _python_dot(xs: array, ys: array) -> Any:
+    if len(xs) != len(ys):
+        raise RuntimeError(f"array.dot: length mismatch ({len(xs)} vs {len(ys)})")
+    return sum(map(operator.mul, xs, ys))
+
+def _python_array_stdlib() -> Dict[str, Callable]:
+    lib = {f"array.{name}": _python_elementwise(name, STDLIB[f"math.{name}"])
+           for name in ('add', 'subtract', 'multiply', 'divide')}
+    lib.update({
+        'array.range': lambda start, end=None: array('q', range(start) if end is None else range(start, end)),
+        'array.fill': lambda n, value: array(_python_typecode(value), [value]) * n,
+        'array.sum': lambda xs: sum(xs),
+        'array.min': lambda xs: min(_empty_check('array.min', xs)),
+        'array.max': lambda xs: max(_empty_check('array.max', xs)),
+        'array.mean': lambda xs: sum(_empty_check('array.mean', xs)) / len(xs),
+        'array.dot': _python_dot,
+        'array.len': len,
+        'array.get': _index,
+    })
+    return lib
+
+def _numpy_array_stdlib() -> Dict[str, Callable]:
+    def elementwise(name, ufunc):
+        scalar = STDLIB[f"math.{name}"]
+        def apply(x, y):
+            if not isinstance(x, numpy.ndarray) and not isinstance(y, numpy.ndarray):
+                return scalar(x, y)
+            if isinstance(x, numpy.ndarray) and isinstance(y, numpy.ndarray) and x.shape != y.shape:
+                raise RuntimeError(f"array.{name}: length mismatch ({len(x)} vs {len(y)})")
+            return ufunc(x, y)
+        return apply
+    def divide(x, y):
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            # Match math.divide: any division by zero gives inf.
+            return numpy.where(numpy.equal(y, 0), numpy.inf, numpy.true_divide(x, y))
+    def dot(xs, ys):
+        if xs.shape != ys.shape:
+            raise RuntimeError(f"array.dot: length mismatch ({len(xs)} vs {len(ys)})")
+        return numpy.dot(xs, ys).item()
+    return {
+        'array.add': elementwise('add', numpy.add),
+        'array.subtract': elementwise('subtract', numpy.subtract),
+        'array.multiply': elementwise('multiply', numpy.multiply),
+        'array.divide': elementwise('divide', divide),
+        'array.range': lambda start, end=None: numpy.arange(start, end, dtype=numpy.int64)
+                                               if end is not None else numpy.arange(start, dtype=numpy.int64),
+        'array.fill': lambda n, value: numpy.full(n, value, dtype=numpy.float64 if isinstance(value, float) else numpy.int64),
+        'array.sum': lambda xs: xs.sum().item(),
+        'array.min': lambda xs: _empty_check('array.min', xs).min().item(),
+        'array.max': lambda xs: _empty_check('array.max', xs).max().item(),
+        'array.mean': lambda xs: _empty_check('array.mean', xs).mean().item(),
+        'array.dot': dot,
+        'array.len': len,
+        'array.get': lambda xs, i: _index(xs, i).item(),
+    }
+
+ARRAY_BACKEND = 'numpy' if numpy is not None else 'array'
+ARRAY_STDLIB: Dict[str, Callable] = _numpy_array_stdlib() if numpy is not None else _python_array_stdlib()
+ARRAY_TYPES = (array, numpy.ndarray) if numpy is not None else (array,)
+
+def format_value(value: Any) -> str:
+    """How `say` prints a value. Arrays print as a list, e.g. [0, 1], on
+    either backend, so output does not depend on whether NumPy is installed."""
+    if isinstance(value, ARRAY_TYPES):
+        return str(value.tolist())
+    return str(value)
+
+MEMO_CACHE_SIZE = 256
+MEMO_POLICIES = ('lru', 'fifo')
+
+class MemoCache:
+    """Bounded result cache for one pure @ai.optimize function, keyed by argument tuple."""
+    def __init__(self, maxsize: Optional[int] = MEMO_CACHE_SIZE, policy: str = 'lru'):
+        if policy not in MEMO_POLICIES:
+            raise ValueError(f"Unknown memo eviction policy: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def call(self, fn: FnDecl, args: List[Any], env: 'Environment', run: Callable) -> Any:
+        key = tuple(args)
+        try:
+            with self._lock:
+                result = self.entries[key]
+                self.hits += 1
+                if self.policy == 'lru':
+                    self.entries.move_to_end(key)
+            return result
+        except KeyError:
+            pass
+        except TypeError:
+            return run(fn, args, env)
+        result = run(fn, args, env)
+        with self._lock:
+            self.misses += 1
+            self.entries[key] = result
+            if self.maxsize is not None and len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def info(self) -> Dict[str, Any]:
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self.entries), 'maxsize': self.maxsize, 'policy': self.policy}
+
+def is_pure(fn: FnDecl, fns: Dict[str, FnDecl]) -> bool:
+    """True if `fn` has no side effects: no say, send or spawn, no writes to
+    names it does not own, and only calls to the stdlib or other pure functions."""
+    if fn.pure is None:
+        fn.pure = _is_pure(fn, fns, {fn.name})
+    return fn.pure
+
+def _is_pure(fn: FnDecl, fns: Dict[str, FnDecl], visiting: set) -> bool:
+    owned = {name for name, _ in fn.params}
+    def calls_pure(call: Any) -> bool:
+        if not isinstance(call, CallExpr) or call.fn_name == 'identity' or call.fn_name in STDLIB or call.fn_name in ARRAY_STDLIB:
+            return True
+        if call.fn_name in visiting:
+            return True
+        callee = fns.get(call.fn_name)
+        if callee is None:
+            return False
+        return _is_pure(callee, fns, visiting | {call.fn_name})
+    def body_pure(body: List[Node]) -> bool:
+        for node in body:
+            if isinstance(node, (SayStmt, SendStmt, SpawnStmt)):
+                return False
+            elif isinstance(node, LetStmt):
+                owned.add(node.name)
+                if not calls_pure(node.value):
+                    return False
+            elif isinstance(node, AssignStmt):
+                if node.name not in owned:
+                    return False
+            elif isinstance(node, ReturnStmt):
+                if not calls_pure(node.value):
+                    return False
+            elif isinstance(node, ForStmt):
+                owned.add(node.var)
+                if not body_pure(node.body):
+                    return False
+            elif isinstance(node, WhileStmt):
+                if not body_pure(node.body):
+                    return False
+            elif isinstance(node, IfStmt):
+                if not (body_pure(node.then_body) and body_pure(node.else_body)):
+                    return False
+            elif isinstance(node, TryStmt):
+                if not (body_pure(node.try_body) and body_pure(node.catch_body)):
+                    return False
+        return True
+    return body_pure(fn.body)
+
+class Environment:
+    def __init__(self, scope: Optional[Scope] = None, parent: Optional['Environment'] = None):
+        self.scope = scope if scope is not None else Scope()
+        self.values: List[Any] = [_UNBOUND] * len(self.scope)
+        self.parent = parent
+        if parent is None:
+            self.fns: Dict[str, FnDecl] = {}
+            self.actors: Dict[str, ActorDecl] = {}
+            self.stdlib = {**STDLIB, **ARRAY_STDLIB}
+            self.memo: Dict[str, MemoCache] = {}
+            self.memo_options: Dict[str, Any] = {'maxsize': MEMO_CACHE_SIZE, 'policy': 'lru'}
+            self.output = OutputChannel()
+            self.scheduler: Optional[Union[ActorScheduler, AsyncActorScheduler, 'ProcessActorScheduler']] = None
+            self.actor_instances: List[ActorInstance] = []
+        else:
+            # Call frames share their caller's declarations rather than copying them.
+            self.fns = parent.fns
+            self.actors = parent.actors
+            self.stdlib = parent.stdlib
+            self.memo = parent.memo
+            self.memo_options = parent.memo_options
+            self.output = parent.output
+            self.scheduler = parent.scheduler
+            self.actor_instances = parent.actor_instances
+
+    @property
+    def vars(self) -> Dict[str, tuple[Any, str]]:
+        """Snapshot of the bound variables as name -> (value, type)."""
+        return {name: (value, type_) for name, type_, value in zip(self.scope.names, self.scope.types, self.values) if value is not _UNBOUND}
+
+    def use_scope(self, scope: Scope):
+        """Re-lay out the bound variables onto `scope` (which may gain slots) and
+        size the value list to it, so code compiled against it can index directly."""
+        if scope is not self.scope:
+            bound = [(name, type_, value) for name, type_, value in zip(self.scope.names, self.scope.types, self.values) if value is not _UNBOUND]
+            self.scope = scope
+            self.values = [_UNBOUND] * len(scope)
+            for name, type_, value in bound:
+                self.set_var(name, value, type_)
+        if len(self.values) < len(scope):
+            self.values.extend([_UNBOUND] * (len(scope) - len(self.values)))
+
+    def has_var(self, name: str) -> bool:
+        return self.lookup(name) is not _UNBOUND
+
+    def lookup(self, name: str) -> Any:
+        index = self.scope.slots.get(name)
+        if index is None or index >= len(self.values):
+            return _UNBOUND
+        return self.values[index]
+
+    def slot(self, name: str, type: Optional[str] = None) -> int:
+        """The slot index of `name`, laying it out (unbound) if it is new."""
+        index = self.scope.slot(name, type)
+        if index >= len(self.values):
+            self.values.extend([_UNBOUND] * (index + 1 - len(self.values)))
+        return index
 
     def set_var(self, name: str, value: Any, type: str):
-        self.vars[name] = (value, type)
+        self.values[self.slot(name, type)] = value
 
-    def get_var(self, name: str) -> tuple[Any, str]:
-        if name not in self.vars:
+    def get_value(self, name: str) -> Any:
+        value = self.lookup(name)
+        if value is _UNBOUND:
             raise RuntimeError(f"Undefined variable: {name}")
-        return self.vars[name]
+        return value
+
+    def get_var(self, name: str) -> tuple[Any, str]:
+        value = self.get_value(name)
+        return value, self.scope.types[self.scope.slots[name]]
 
     def set_fn(self, fn: FnDecl):
-        self.fns[fn.name] = fn
+        global _FN_GENERATION
+        previous = self.fns.get(fn.name)
+        if previous is not fn:
+            self.fns[fn.name] = fn
+            if previous is None:
+                # A first declaration makes nothing stale: calls to a missing
+                # function are never linked, and make their caller impure.
+                return
+            # A purity verdict or memoized result may depend on any function
+            # this one calls, so rebinding a name invalidates them all.
+            for declared in self.fns.values():
+                declared.pure = None
+            self.memo.clear()
+            # Bumped after the store, so a call linked in between is re-linked.
+            _FN_GENERATION += 1
+
+    def memo_cache(self, fn: FnDecl) -> Optional[MemoCache]:
+        """The result cache for `fn`, or None unless it is @ai.optimize and pure."""
+        if not fn.ai_optimized:
+            return None
+        cache = self.memo.get(fn.name)
+        if cache is None:
+            if not is_pure(fn, self.fns):
+                return None
+            cache = self.memo.setdefault(fn.name, MemoCache(**self.memo_options))
+        return cache
+
+    def memo_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hit/miss/eviction counters for every memoized function."""
+        return {name: cache.info() for name, cache in self.memo.items()}
 
     def get_fn(self, name: str) -> FnDecl:
         if name not in self.fns:
@@ -130,461 +857,2262 @@ class Environment:
             raise RuntimeError(f"Undefined actor: {name}")
         return self.actors[name]
 
+# Incremented whenever a function name is (re)bound; call-site links made
+# under an older generation are stale.
+_FN_GENERATION = 0
+
+def _identity(value: Any) -> Any:
+    return value
+
+def link_call(fn_name: str, env: Environment) -> tuple:
+    """Resolve a call site once: (env.fns, generation, builtin, fn), with exactly
+    one of builtin/fn set. Valid while `link_valid()` holds."""
+    generation = _FN_GENERATION
+    builtin = _identity if fn_name == 'identity' else env.stdlib.get(fn_name)
+    return env.fns, generation, builtin, None if builtin is not None else env.get_fn(fn_name)
+
+def link_valid(link: Optional[tuple], env: Environment) -> bool:
+    return link is not None and link[0] is env.fns and link[1] == _FN_GENERATION
+
+# Actor runtimes. 'thread' gives every ActorInstance its own daemon thread
+# sleeping on its mailbox. 'pool' makes actors plain mailboxes: an actor is put on
+# the scheduler's ready queue only when a send finds it idle, and a fixed set
+# of workers runs ready actors, so each actor still handles one message at a
+# time and idle actors cost no thread and no wakeups. 'asyncio' runs each
+# actor as a task draining an asyncio.Queue on the program's event loop.
+# 'process' hosts actors in worker processes, leaving only proxies here.
+
+ACTOR_RUNTIMES = ('thread', 'pool', 'asyncio', 'process')
+ACTOR_POOL_WORKERS = 4
+ACTOR_BATCH = 64
+MAILBOX_POLICIES = ('block', 'drop_newest', 'drop_oldest', 'raise')
+
+class MailboxFull(RuntimeError):
+    """A send found a bounded mailbox full under the 'raise' policy."""
+
+class _MailboxCounters:
+    def _init_counters(self, capacity: Optional[int], overflow: str):
+        if overflow not in MAILBOX_POLICIES:
+            raise ValueError(f"Unknown mailbox overflow policy: {overflow}")
+        if capacity is not None and capacity < 1:
+            raise ValueError(f"Mailbox capacity must be at least 1, got {capacity}")
+        self.capacity = capacity
+        self.overflow = overflow
+        self.max_depth = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.blocked = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Current and peak queue depth plus how many sends were dropped,
+        rejected (MailboxFull) or had to wait for room."""
+        return {'depth': len(self), 'max_depth': self.max_depth, 'capacity': self.capacity,
+                'overflow': self.overflow, 'dropped': self.dropped, 'rejected': self.rejected,
+                'blocked': self.blocked}
+
+class Mailbox(_MailboxCounters):
+    """Pending messages of one threaded actor. A send to a full bounded mailbox
+    waits for room ('block'), discards the new message ('drop_newest'),
+    discards the oldest queued one ('drop_oldest') or raises MailboxFull."""
+    def __init__(self, capacity: Optional[int] = None, overflow: str = 'block',
+                 on_block: Optional[Callable[[], None]] = None):
+        self._init_counters(capacity, overflow)
+        # Called before a blocked sender waits, so the consumer gets scheduled.
+        self.on_block = on_block
+        self.items: deque = deque()
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def put(self, msg: Any):
+        items = self.items
+        with self.lock:
+            if self.capacity is not None and len(items) >= self.capacity and not self._make_room():
+                return
+            items.append(msg)
+            if len(items) > self.max_depth:
+                self.max_depth = len(items)
+            self.not_empty.notify()
+
+    def put_many(self, msgs: Iterable[Any]):
+        items, capacity = self.items, self.capacity
+        with self.lock:
+            try:
+                for msg in msgs:
+                    if capacity is not None and len(items) >= capacity and not self._make_room():
+                        continue
+                    items.append(msg)
+                    if len(items) > self.max_depth:
+                        self.max_depth = len(items)
+            finally:
+                self.not_empty.notify()
+
+    def _make_room(self) -> bool:
+        """Apply the overflow policy to a full mailbox (lock held). False means
+        the new message is dropped."""
+        if self.overflow == 'drop_newest':
+            self.dropped += 1
+            return False
+        if self.overflow == 'drop_oldest':
+            self.items.popleft()
+            self.dropped += 1
+            return True
+        if self.overflow == 'raise':
+            self.rejected += 1
+            raise MailboxFull(f"Mailbox full ({self.capacity} messages)")
+        self.blocked += 1
+        self.not_empty.notify()
+        if self.on_block is not None:
+            self.on_block()
+        while len(self.items) >= self.capacity:
+            self.not_full.wait()
+        return True
+
+    def take(self, n: int, wait: bool = False) -> List[Any]:
+        """Remove up to `n` messages; with `wait`, sleep until there is one."""
+        with self.lock:
+            items = self.items
+            if wait:
+                while not items:
+                    self.not_empty.wait()
+            batch = [items.popleft() for _ in range(min(n, len(items)))]
+            if batch and self.capacity is not None:
+                self.not_full.notify_all()
+            return batch
+
+class AsyncMailbox(_MailboxCounters, asyncio.Queue):
+    """asyncio.Queue with the Mailbox overflow policies and counters. The
+    program itself runs on the loop, so a send cannot wait for room: under
+    'block' a full mailbox raises MailboxFull, as under 'raise'."""
+    def __init__(self, capacity: Optional[int] = None, overflow: str = 'block'):
+        self._init_counters(capacity, overflow)
+        asyncio.Queue.__init__(self, capacity or 0)
+
+    def __len__(self) -> int:
+        return self.qsize()
+
+    def offer(self, msg: Any):
+        if self.full():
+            if self.overflow == 'drop_newest':
+                self.dropped += 1
+                return
+            if self.overflow == 'drop_oldest':
+                self.get_nowait()
+                self.task_done()
+                self.dropped += 1
+            else:
+                self.rejected += 1
+                raise MailboxFull(f"Mailbox full ({self.capacity} messages)")
+        self.put_nowait(msg)
+        if self.qsize() > self.max_depth:
+            self.max_depth = self.qsize()
+
+# Actor metrics. Every ActorInstance keeps an ActorMetrics. The handling
+# counters are updated only by the thread currently running that actor, so
+# they need no lock; `received` is counted by senders, which can race, so it
+# is guarded by a lock.
+# actor_metrics(env) snapshots all actors of a program; MetricsDumper writes
+# that snapshot to a JSON file periodically.
+
+METRIC_BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0)
+
+class ActorMetrics:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.received = 0
+        self._received_lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+        self.last_error = ''
+        self.busy = 0.0
+        # Message handling times: one bucket per METRIC_BUCKETS bound plus one for slower.
+        self.histogram = [0] * (len(METRIC_BUCKETS) + 1)
+
+    def receive(self, count: int = 1):
+        with self._received_lock:
+            self.received += count
+
+    def record(self, elapsed: float):
+        self.processed += 1
+        self.busy += elapsed
+        self.histogram[bisect_left(METRIC_BUCKETS, elapsed)] += 1
+
+    def error(self, e: Exception):
+        self.errors += 1
+        self.last_error = str(e)
+
+    def snapshot(self) -> Dict[str, Any]:
+        lifetime = time.monotonic() - self.started
+        bounds = [f"<={bound:g}s" for bound in METRIC_BUCKETS] + [f">{METRIC_BUCKETS[-1]:g}s"]
+        return {'received': self.received, 'processed': self.processed, 'errors': self.errors,
+                'last_error': self.last_error, 'busy_seconds': self.busy,
+                'idle_seconds': max(lifetime - self.busy, 0.0),
+                'mean_seconds': self.busy / self.processed if self.processed else 0.0,
+                'histogram': dict(zip(bounds, self.histogram))}
+
+def actor_metrics(env: Environment) -> Dict[str, Any]:
+    """Metrics of every actor spawned in `env`'s program, busiest first."""
+    actors = sorted((instance.metrics() for instance in list(env.actor_instances)), key=lambda m: m['busy_seconds'], reverse=True)
+    return {'timestamp': time.time(), 'actors': actors}
+
+class MetricsDumper:
+    """Writes actor_metrics(env) as JSON to `path` every `interval` seconds, and
+    once more on stop(). The file is replaced atomically."""
+    def __init__(self, env: Environment, path: str, interval: float = 5.0):
+        self.env = env
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def dump(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(actor_metrics(self.env), f, indent=2)
+        os.replace(tmp, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def stop(self):
+        self._stop.set()
+        self.thread.join()
+        self.dump()
+
+class ActorScheduler:
+    """Fixed-size worker pool shared by every actor spawned in a program."""
+    def __init__(self, workers: int = ACTOR_POOL_WORKERS, batch: int = ACTOR_BATCH):
+        self.workers = workers
+        self.batch = batch
+        self.ready: Queue = Queue()
+        self.threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def register(self, instance: 'ActorInstance', capacity: Optional[int], overflow: str):
+        instance.mailbox = Mailbox(capacity, overflow, on_block=lambda: self._wake(instance))
+        instance.scheduled = False
+        instance.lock = threading.Lock()
+
+    def deliver(self, instance: 'ActorInstance', msg: Any):
+        instance.mailbox.put(msg)
+        self._wake(instance)
+
+    def deliver_many(self, instance: 'ActorInstance', msgs: List[Any]):
+        instance.mailbox.put_many(msgs)
+        self._wake(instance)
+
+    def _wake(self, instance: 'ActorInstance'):
+        with instance.lock:
+            if instance.scheduled or not instance.mailbox:
+                return
+            instance.scheduled = True
+        self.schedule(instance)
+
+    def schedule(self, instance: 'ActorInstance'):
+        if len(self.threads) < self.workers:
+            self._start_workers()
+        self.ready.put(instance)
+
+    def _start_workers(self):
+        with self._lock:
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self._work, daemon=True)
+                self.threads.append(thread)
+                thread.start()
+
+    def _work(self):
+        while True:
+            instance = self.ready.get()
+            if instance is None:
+                self.ready.task_done()
+                return
+            try:
+                self._run(instance)
+            finally:
+                self.ready.task_done()
+
+    def _run(self, instance: 'ActorInstance'):
+        """Handle up to `batch` queued messages, then either requeue the actor
+        (more mail is waiting) or mark it idle."""
+        mailbox = instance.mailbox
+        instance.handle_batch(mailbox.take(self.batch))
+        with instance.lock:
+            pending = bool(mailbox)
+            if not pending:
+                instance.scheduled = False
+        if pending:
+            self.schedule(instance)
+        else:
+            instance.env.output.flush()
+
+    def join(self):
+        """Block until every mailbox has been drained."""
+        self.ready.join()
+
+    def shutdown(self):
+        for _ in self.threads:
+            self.ready.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+class AsyncActorScheduler:
+    """Runs each actor as a task on the running event loop. Sends never block;
+    drain() waits for every mailbox to empty and then cancels the tasks."""
+    def __init__(self):
+        self.tasks: Dict['ActorInstance', asyncio.Task] = {}
+
+    def register(self, instance: 'ActorInstance', capacity: Optional[int], overflow: str):
+        instance.mailbox = AsyncMailbox(capacity, overflow)
+        self.tasks[instance] = asyncio.get_running_loop().create_task(self._consume(instance))
+
+    def deliver(self, instance: 'ActorInstance', msg: Any):
+        instance.mailbox.offer(msg)
+
+    def deliver_many(self, instance: 'ActorInstance', msgs: List[Any]):
+        for msg in msgs:
+            instance.mailbox.offer(msg)
+
+    async def _consume(self, instance: 'ActorInstance'):
+        mailbox = instance.mailbox
+        while True:
+            batch = [await mailbox.get()]
+            while len(batch) < ACTOR_BATCH and not mailbox.empty():
+                batch.append(mailbox.get_nowait())
+            try:
+                instance.handle_batch(batch)
+            finally:
+                for _ in batch:
+                    mailbox.task_done()
+            if mailbox.empty():
+                instance.env.output.flush()
+
+    async def drain(self):
+        drained = 0
+        while drained < len(self.tasks):
+            drained = len(self.tasks)
+            await asyncio.gather(*(instance.mailbox.join() for instance in list(self.tasks)))
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tasks.clear()
+
+ACTOR_PLACEMENTS = ('round_robin', 'hash')
+_actor_ids = itertools.count()
+
+def _encode_messages(msgs: List[Any]) -> tuple:
+    """Compact wire form for a batch of messages: packed int64s when every
+    message is a plain int, otherwise the list itself (pickled by the queue)."""
+    if all(type(msg) is int and -2**63 <= msg < 2**63 for msg in msgs):
+        return ('q', array('q', msgs).tobytes())
+    return ('p', list(msgs))
+
+def _decode_messages(encoded: tuple) -> List[Any]:
+    kind, payload = encoded
+    if kind == 'q':
+        packed = array('q')
+        packed.frombytes(payload)
+        return packed.tolist()
+    return payload
+
+def _portable(fn: FnDecl) -> FnDecl:
+    """A copy of `fn` without its compiled caches, which cannot be pickled."""
+    return replace(fn, body=fn.body)
+
+class _InlineScheduler:
+    """Scheduler for actors hosted in a process worker, which feeds them directly."""
+    def register(self, instance: 'ActorInstance', capacity: Optional[int], overflow: str):
+        pass
+
+def _process_worker(inbox, outbox):
+    """Main loop of a worker process: hosts the actors placed on it."""
+    decls: Dict[str, ActorDecl] = {}
+    fns: Dict[str, FnDecl] = {}
+    actors: Dict[str, ActorInstance] = {}
+    output = OutputChannel(capture=True)
+    while True:
+        command = inbox.get()
+        kind = command[0]
+        if kind == 'msg':
+            actors[command[1]].handle_batch(_decode_messages(command[2]))
+        elif kind == 'decl':
+            decls[command[1].name] = command[1]
+        elif kind == 'fns':
+            fns.update(command[1])
+        elif kind == 'spawn':
+            _, actor_id, actor_name, variables = command
+            env = Environment()
+            env.fns.update(fns)
+            env.output = output
+            env.scheduler = _InlineScheduler()
+            for name, (value, type_) in variables.items():
+                env.set_var(name, value, type_)
+            actors[actor_id] = ActorInstance(decls[actor_name], env)
+            actors[actor_id].id = actor_id
+        elif kind == 'sync':
+            outbox.put(('sync', command[1], output.lines,
+                        {actor_id: (instance.state, instance.metrics()) for actor_id, instance in actors.items()}))
+            output.lines = []
+        elif kind == 'stop':
+            return
+
+class ProcessActorScheduler:
+    """Places actors on a pool of worker processes, so CPU-bound handlers run
+    in parallel. Each worker receives an ActorDecl (and the functions it may
+    call) once; messages cross the process boundary in batches encoded by
+    _encode_messages(). `placement` is 'round_robin' or 'hash' (of the actor id).
+    join() waits until every worker has handled everything sent so far, then
+    forwards their output and refreshes each proxy's `state`."""
+    def __init__(self, workers: int = ACTOR_POOL_WORKERS, placement: str = 'round_robin'):
+        if placement not in ACTOR_PLACEMENTS:
+            raise ValueError(f"Unknown actor placement: {placement} (expected one of {', '.join(ACTOR_PLACEMENTS)})")
+        self.workers = workers
+        self.placement = placement
+        self.processes: List[Any] = []
+        self.inboxes: List[Any] = []
+        self.outbox: Any = None
+        self.shipped: List[Dict[str, Any]] = []
+        self.instances: Dict[str, 'ActorInstance'] = {}
+        self.output: Optional[OutputChannel] = None
+        self._spawned = 0
+        self._syncs = 0
+
+    def _start_workers(self):
+        import multiprocessing
+        self.outbox = multiprocessing.Queue()
+        for _ in range(self.workers):
+            inbox = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_process_worker, args=(inbox, self.outbox), daemon=True)
+            process.start()
+            self.processes.append(process)
+            self.inboxes.append(inbox)
+            self.shipped.append({})
+
+    def place(self, actor_id: str, index: int) -> int:
+        if self.placement == 'hash':
+            return zlib.crc32(actor_id.encode()) % self.workers
+        return index % self.workers
+
+    def register(self, instance: 'ActorInstance', capacity: Optional[int], overflow: str):
+        if capacity is not None:
+            raise ValueError("Bounded mailboxes are not supported by the process actor runtime")
+        if not self.processes:
+            self._start_workers()
+        self.output = instance.env.output
+        actor_id = instance.id
+        worker = self.place(actor_id, self._spawned)
+        self._spawned += 1
+        inbox, shipped = self.inboxes[worker], self.shipped[worker]
+        if shipped.get(instance.actor.name) is not instance.actor:
+            inbox.put(('decl', replace(instance.actor, methods=[_portable(fn) for fn in instance.actor.methods])))
+            shipped[instance.actor.name] = instance.actor
+        fns = {name: fn for name, fn in instance.env.fns.items() if shipped.get('fn:' + name) is not fn}
+        if fns:
+            inbox.put(('fns', {name: _portable(fn) for name, fn in fns.items()}))
+            shipped.update(('fn:' + name, fn) for name, fn in fns.items())
+        variables = {}
+        for name, (value, type_) in instance.context.vars.items():
+            if isinstance(value, ActorInstance):
+                continue  # actor handles belong to this process
+            try:
+                pickle.dumps(value)
+            except Exception as e:
+                raise ValueError(f"Variable {name} cannot be sent to a process actor: {e}") from e
+            variables[name] = (value, type_)
+        inbox.put(('spawn', actor_id, instance.actor.name, variables))
+        instance.inbox = inbox
+        instance.remote_state = instance.state
+        self.instances[actor_id] = instance
+
+    def deliver(self, instance: 'ActorInstance', msg: Any):
+        instance.inbox.put(('msg', instance.id, _encode_messages([msg])))
+
+    def deliver_many(self, instance: 'ActorInstance', msgs: List[Any]):
+        instance.inbox.put(('msg', instance.id, _encode_messages(msgs)))
+
+    def join(self):
+        if not self.processes:
+            return
+        self._syncs += 1
+        for inbox in self.inboxes:
+            inbox.put(('sync', self._syncs))
+        for _ in self.inboxes:
+            _, _, lines, states = self.outbox.get()
+            for line in lines:
+                self.output.write(line)
+            for actor_id, (state, metrics) in states.items():
+                self.instances[actor_id].remote_state = state
+                self.instances[actor_id].remote_metrics = metrics
+
+    def shutdown(self):
+        for inbox in self.inboxes:
+            inbox.put(('stop',))
+        for process in self.processes:
+            process.join()
+        self.processes, self.inboxes, self.shipped = [], [], []
+
 class ActorInstance:
-    def __init__(self, actor: ActorDecl, env: Environment):
+    def __init__(self, actor: ActorDecl, env: Environment, capacity: Optional[int] = None,
+                 overflow: Optional[str] = None):
         self.actor = actor
         self.env = env
-        self.state = {}
-        self.msg_queue = Queue()
-        self.thread = threading.Thread(target=self._process_messages)
-        self.thread.daemon = True
-        self.thread.start()
+        self.id = f"{actor.name}-{next(_actor_ids)}"
+        self.counters = ActorMetrics()
+        self.remote_metrics: Optional[Dict[str, Any]] = None
+        env.actor_instances.append(self)
+        # The actor's execution context, built once: a snapshot of the
+        # spawner's variables (so later writes on either side stay private),
+        # the declared state, and a slot for the message being handled.
+        # Declarations, stdlib and output are shared with the spawner.
+        self.context = Environment(env.scope.copy(), parent=env)
+        self.context.values[:len(env.values)] = env.values
+        for decl in actor.state:
+            self.context.set_var(decl.name, decl.value, decl.type)
+        self.msg_slot = self.context.slot('msg', 'Any')
+        self.handler = next((method for method in actor.methods if method.name == 'on_message'), None)
+        self.remote_state: Optional[Dict[str, Any]] = None
+        # Mailbox settings given at spawn override those declared on the actor.
+        capacity = capacity if capacity is not None else actor.capacity
+        overflow = overflow or actor.overflow or 'block'
+        self.overflow = overflow
+        self.scheduler = env.scheduler
+        if self.scheduler is None:
+            self.mailbox = Mailbox(capacity, overflow)
+            self.thread = threading.Thread(target=self._process_messages)
+            self.thread.daemon = True
+            self.thread.start()
+        else:
+            self.scheduler.register(self, capacity, overflow)
 
     def send(self, msg: Any):
-        self.msg_queue.put(msg)
+        self.counters.receive()
+        if self.scheduler is None:
+            self.mailbox.put(msg)
+        else:
+            self.scheduler.deliver(self, msg)
 
-    def _process_messages(self):
-        while True:
+    def send_many(self, msgs: Iterable[Any]):
+        """Deliver `msgs` in order with a single wakeup of the actor."""
+        msgs = list(msgs)
+        if not msgs:
+            return
+        self.counters.receive(len(msgs))
+        if self.scheduler is None:
+            self.mailbox.put_many(msgs)
+        else:
+            self.scheduler.deliver_many(self, msgs)
+
+    def mailbox_stats(self) -> Dict[str, Any]:
+        """See Mailbox.stats(). Under the process runtime the (always unbounded)
+        mailbox lives in a worker, so its depths are reported as None."""
+        mailbox = getattr(self, 'mailbox', None)
+        if mailbox is None:
+            return {'depth': None, 'max_depth': None, 'capacity': None, 'overflow': self.overflow,
+                    'dropped': 0, 'rejected': 0, 'blocked': 0}
+        return mailbox.stats()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Counters for this actor: messages received and processed, errors,
+        busy and idle time, a handling-time histogram and queue depth."""
+        snapshot = {'id': self.id, 'actor': self.actor.name}
+        if self.remote_metrics is not None:
+            snapshot.update(self.remote_metrics, id=self.id, received=self.counters.received, depth=None, max_depth=None)
+            return snapshot
+        snapshot.update(self.counters.snapshot())
+        mailbox = getattr(self, 'mailbox', None)
+        snapshot['depth'] = len(mailbox) if mailbox is not None else 0
+        snapshot['max_depth'] = mailbox.max_depth if mailbox is not None else 0
+        return snapshot
+
+    @property
+    def state(self) -> Dict[str, Any]:
+        """Current values of the actor's declared state (as of the last join()
+        for actors hosted in another process)."""
+        if self.remote_state is not None:
+            return self.remote_state
+        return {decl.name: self.context.lookup(decl.name) for decl in self.actor.state}
+
+    def handle(self, msg: Any):
+        if self.handler is not None:
+            self.context.values[self.msg_slot] = msg
+            interpret(self.handler.body, self.context)
+
+    def handle_batch(self, msgs: List[Any]):
+        counters = self.counters
+        if self.handler is None:
+            counters.processed += len(msgs)
+            return
+        body, context, slot, clock = self.handler.body, self.context, self.msg_slot, time.perf_counter
+        for msg in msgs:
+            context.values[slot] = msg
+            start = clock()
             try:
-                msg = self.msg_queue.get(timeout=1)
-                for method in self.actor.methods:
-                    if method.name == 'on_message':
-                        local_env = Environment()
-                        local_env.vars = self.env.vars.copy()
-                        local_env.fns = self.env.fns.copy()
-                        local_env.stdlib = self.env.stdlib
-                        local_env.set_var('msg', msg, 'Any')
-                        interpret(method.body, local_env)
-                        self.state.update(local_env.vars)
-            except Empty:
-                continue
+                interpret(body, context)
             except Exception as e:
+                counters.error(e)
+                if TRACER.level >= TRACE_INFO:
+                    TRACER.emit(TRACE_INFO, self.handler, f"Actor {self.id} failed on message {msg!r}: {e}")
                 print(f"Error processing message: {e}")
-                continue
+            counters.record(clock() - start)
+
+    def _process_messages(self):
+        mailbox = self.mailbox
+        while True:
+            self.handle_batch(mailbox.take(ACTOR_BATCH, wait=True))
+            if not mailbox:
+                self.env.output.flush()
+
+_TOKEN_PATTERNS = [
+    (r'@ai\.optimize$', lambda g: ['AI_OPTIMIZE']),
+    (r'let\s+([a-zA-Z0-9]+)\s*=\s*([a-zA-Z]+)\.spawn\s*\(\s*\)\s*;', lambda g: ['LET_SPAWN', g[0], g[1]]),
+    (r'([a-zA-Z]+)\s*=\s*([a-zA-Z]+)\.spawn\s*\(\s*\)\s*;', lambda g: ['SPAWN', g[0], g[1]]),
+    (r'let\s+([a-zA-Z0-9]+)\s*=\s*([a-zA-Z]+)\.spawn\s*\(\s*(\d+)\s*(?:,\s*(block|drop_newest|drop_oldest|raise)\s*)?\)\s*;',
+     lambda g: ['LET_SPAWN', g[0], g[1], int(g[2]), g[3]]),
+    (r'([a-zA-Z]+)\s*=\s*([a-zA-Z]+)\.spawn\s*\(\s*(\d+)\s*(?:,\s*(block|drop_newest|drop_oldest|raise)\s*)?\)\s*;',
+     lambda g: ['SPAWN', g[0], g[1], int(g[2]), g[3]]),
+    (r'let\s+([a-zA-Z]+)\s*:\s*Int\s*=\s*(\d+)\s*;', lambda g: ['LET', g[0], 'Int', int(g[1])]),
+    (r'let\s+([a-zA-Z]+)\s*:\s*Int\s*=\s*([a-zA-Z0-9_\.]+)\s*\(([^)]*)\)\s*;', lambda g: ['LET_CALL', g[0], g[1], g[2].split(',')]),
+    (r'let\s+([a-zA-Z]+)\s*:\s*Array\s*=\s*([a-zA-Z0-9_\.]+)\s*\(([^)]*)\)\s*;', lambda g: ['LET_CALL', g[0], g[1], g[2].split(','), 'Array']),
+    (r'([a-zA-Z]+)\s*\+=\s*([a-zA-Z0-9_]+)\s*;', lambda g: ['ASSIGN', g[0], '+=', g[1]]),
+    (r'([a-zA-Z]+)\s*=\s*(\d+)\s*;', lambda g: ['ASSIGN', g[0], '=', int(g[1])]),
+    (r'([a-zA-Z]+)\s*=\s*([a-zA-Z0-9_]+)\s*;', lambda g: ['ASSIGN', g[0], '=', g[1]]),
+    (r'let\s+([a-zA-Z]+)\s*:\s*Int\s*=\s*([a-zA-Z]+)\s*/\s*([a-zA-Z]+)\s*;', lambda g: ['LET_CALL', g[0], 'math.divide', [g[1], g[2]]]),
+
+    (r'fn\s+([a-zA-Z]+)\s*\(([^)]*)\)\s*->\s*(Int|Array)\s*\{', lambda g: ['FN_START', g[0], g[1], False, g[2]]),
+    (r'fn\s+([a-zA-Z]+)\s*\(([^)]*)\)\s*\{', lambda g: ['FN_START', g[0], g[1], False, 'Unit']),
+    (r'if\s+([a-zA-Z]+)\s*>\s*(\d+)\s*\{', lambda g: ['IF_START', g[0], int(g[1])]),
+    (r'\}\s*else\s*\{', lambda g: ['ELSE_START']),
+    (r'else\s*\{', lambda g: ['ELSE_START']),
+    (r'for\s+([a-zA-Z]+)\s+in\s+range\s*\(\s*(\d+)\s*\)\s*\{', lambda g: ['FOR_START', g[0], int(g[1])]),
+    (r'while\s+([a-zA-Z]+)\s*>\s*(\d+)\s*\{', lambda g: ['WHILE_START', g[0], int(g[1])]),
+    (r'try\s*\{', lambda g: ['TRY_START']),
+    (r'\}\s*catch\s*\{', lambda g: ['CATCH_START']),
+    (r'catch\s*\{', lambda g: ['CATCH_START']),
+    (r'\}\s*', lambda g: ['BLOCK_END']),
+    (r'return\s+([a-zA-Z]+)\s*\+\s*([a-zA-Z]+)\s*;', lambda g: ['RETURN_ADD', g[0], g[1]]),
+    (r'return\s+([a-zA-Z]+)\s*\*\s*(\d+)\s*;', lambda g: ['RETURN_MUL', g[0], int(g[1])]),
+    (r'return\s+([a-zA-Z]+)\s*;', lambda g: ['RETURN_VAR', g[0]]),
+    (r'say\s+"([^"]*)\{([a-zA-Z]+)\(([^)]*)\)\}\s*"\s*;', lambda g: ['SAY', g[0], g[1], g[2].split(',')]),
+    (r'say\s+"([^"]*)"\s*;', lambda g: ['SAY_SIMPLE', g[0]]),
+    (r'actor\s+([a-zA-Z]+)\s*\{', lambda g: ['ACTOR_START', g[0]]),
+    (r'actor\s+([a-zA-Z]+)\s*\(\s*(\d+)\s*(?:,\s*(block|drop_newest|drop_oldest|raise)\s*)?\)\s*\{',
+     lambda g: ['ACTOR_START', g[0], int(g[1]), g[2]]),
+    (r'state\s+([a-zA-Z]+)\s*:\s*Int\s*=\s*(\d+)\s*;', lambda g: ['STATE', g[0], int(g[1])]),
+    (r'([a-zA-Z]+)\.send\s*\(\s*(\d+)\s*\)\s*;', lambda g: ['SEND', g[0], int(g[1])]),
+    (r'([a-zA-Z]+)\.send_many\s*\(([^)]*)\)\s*;', lambda g: ['SEND_MANY', g[0], g[1].split(',')]),
+    (r'([a-zA-Z]+)\.send\s*\(\s*([a-zA-Z]+)\(([^)]*)\)\s*\)\s*;', lambda g: ['SEND', g[0], g[1], g[2].split(',')]),
+]
 
-def tokenize(code: str) -> List[tuple[List[Any], int]]:
-    tokens = []
-    patterns = [
-        (r'@ai\.optimize$', lambda m: ['AI_OPTIMIZE']),
-        (r'let\s+([a-zA-Z0-9]+)\s*=\s*([a-zA-Z]+)\.spawn\s*\(\s*\)\s*;', lambda m: ['LET_SPAWN', m.group(1), m.group(2)]),
-        (r'([a-zA-Z]+)\s*=\s*([a-zA-Z]+)\.spawn\s*\(\s*\)\s*;', lambda m: ['SPAWN', m.group(1), m.group(2)]),
-        (r'let\s+([a-zA-Z]+)\s*:\s*Int\s*=\s*(\d+)\s*;', lambda m: ['LET', m.group(1), 'Int', int(m.group(2))]),
-        (r'let\s+([a-zA-Z]+)\s*:\s*Int\s*=\s*([a-zA-Z0-9_\.]+)\s*\(([^)]*)\)\s*;', lambda m: ['LET_CALL', m.group(1), m.group(2), m.group(3).split(',')]),
-        (r'([a-zA-Z]+)\s*\+=\s*([a-zA-Z0-9_]+)\s*;', lambda m: ['ASSIGN', m.group(1), '+=', m.group(2)]),
-        (r'([a-zA-Z]+)\s*=\s*(\d+)\s*;', lambda m: ['ASSIGN', m.group(1), '=', int(m.group(2))]),
-        (r'([a-zA-Z]+)\s*=\s*([a-zA-Z0-9_]+)\s*;', lambda m: ['ASSIGN', m.group(1), '=', m.group(2)]),
-        (r'let\s+([a-zA-Z]+)\s*:\s*Int\s*=\s*([a-zA-Z]+)\s*/\s*([a-zA-Z]+)\s*;', lambda m: ['LET_CALL', m.group(1), 'math.divide', [m.group(2), m.group(3)]]),
-
-        (r'fn\s+([a-zA-Z]+)\s*\(([^)]*)\)\s*->\s*Int\s*\{', lambda m: ['FN_START', m.group(1), m.group(2), False, 'Int']),
-        (r'fn\s+([a-zA-Z]+)\s*\(([^)]*)\)\s*\{', lambda m: ['FN_START', m.group(1), m.group(2), False, 'Unit']),
-        (r'if\s+([a-zA-Z]+)\s*>\s*(\d+)\s*\{', lambda m: ['IF_START', m.group(1), int(m.group(2))]),
-        (r'else\s*\{', lambda m: ['ELSE_START']),
-        (r'for\s+([a-zA-Z]+)\s+in\s+range\s*\(\s*(\d+)\s*\)\s*\{', lambda m: ['FOR_START', m.group(1), int(m.group(2))]),
-        (r'while\s+([a-zA-Z]+)\s*>\s*(\d+)\s*\{', lambda m: ['WHILE_START', m.group(1), int(m.group(2))]),
-        (r'try\s*\{', lambda m: ['TRY_START']),
-        (r'\}\s*catch\s*\{', lambda m: ['CATCH_START']),
-        (r'catch\s*\{', lambda m: ['CATCH_START']),
-        (r'\}\s*', lambda m: ['BLOCK_END']),
-        (r'return\s+([a-zA-Z]+)\s*\+\s*([a-zA-Z]+)\s*;', lambda m: ['RETURN_ADD', m.group(1), m.group(2)]),
-        (r'return\s+([a-zA-Z]+)\s*\*\s*(\d+)\s*;', lambda m: ['RETURN_MUL', m.group(1), int(m.group(2))]),
-        (r'return\s+([a-zA-Z]+)\s*;', lambda m: ['RETURN_VAR', m.group(1)]),
-        (r'say\s+"([^"]*)\{([a-zA-Z]+)\(([^)]*)\)\}\s*"\s*;', lambda m: ['SAY', m.group(1), m.group(2), m.group(3).split(',')]),
-        (r'say\s+"([^"]*)"\s*;', lambda m: ['SAY_SIMPLE', m.group(1)]),
-        (r'actor\s+([a-zA-Z]+)\s*\{', lambda m: ['ACTOR_START', m.group(1)]),
-        (r'state\s+([a-zA-Z]+)\s*:\s*Int\s*=\s*(\d+)\s*;', lambda m: ['STATE', m.group(1), int(m.group(2))]),
-        (r'([a-zA-Z]+)\.send\s*\(\s*(\d+)\s*\)\s*;', lambda m: ['SEND', m.group(1), int(m.group(2))]),
-        (r'([a-zA-Z]+)\.send\s*\(\s*([a-zA-Z]+)\(([^)]*)\)\s*\)\s*;', lambda m: ['SEND', m.group(1), m.group(2), m.group(3).split(',')]),
-    ]
-    
-    lines = code.split('\n')
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        line_num = i + 1
-        
+def _compile_token_patterns(patterns):
+    alternatives = []
+    handlers = {}
+    group = 0
+    for index, (pattern, handler) in enumerate(patterns):
+        name = f"T{index}"
+        width = re.compile(pattern).groups
+        alternatives.append(f"(?P<{name}>{pattern})")
+        handlers[name] = (slice(group + 1, group + 1 + width), handler)
+        group += 1 + width
+    return re.compile('|'.join(alternatives)), handlers
+
+# Every rule is folded into one alternation so a line costs a single match
+# attempt; alternatives are tried left to right, preserving rule priority.
+_TOKEN_RE, _TOKEN_HANDLERS = _compile_token_patterns(_TOKEN_PATTERNS)
+
+Token = tuple[List[Any], int]
+Source = Union[str, Iterable[str]]
+
+def iter_tokens(source: Source) -> Iterator[Token]:
+    """Lazily yield (token, line_num) pairs from source text, a text stream or any iterable of lines."""
+    lines = source.split('\n') if isinstance(source, str) else source
+    match_line = _TOKEN_RE.match
+    handlers = _TOKEN_HANDLERS
+    for line_num, line in enumerate(lines, 1):
+        line = line.strip()
         if not line:
-            i += 1
-            continue
-            
-        if line == '@ai.optimize' and i + 1 < len(lines):
-            tokens.append((['AI_OPTIMIZE'], line_num))
-            i += 1
             continue
-            
-        matched = False
-        for pattern, handler in patterns:
-            match = re.match(pattern, line)
-            if match:
-                token = handler(match)
-                tokens.append((token, line_num))
-                matched = True
-                break
-                
-        if not matched:
+        match = match_line(line)
+        if match is None:
             raise SyntaxError(f"Invalid syntax at line {line_num}: {line}")
-            
-        i += 1
-        
-    return tokens
-
-def parse(tokens: List[tuple[List[Any], int]]) -> List[Node]:
-    ast = []
-    i = 0
-    ai_optimized_next = False
-    while i < len(tokens):
-        token, line = tokens[i]
-        if token[0] == 'AI_OPTIMIZE':
-            ai_optimized_next = True
-            i += 1
-        elif token[0] == 'LET_SPAWN':
-            ast.append(SpawnStmt(actor_name=token[2], var_name=token[1], line=line))
-            i += 1
-        elif token[0] == 'SPAWN':
-            ast.append(SpawnStmt(actor_name=token[2], var_name=token[1], line=line))
-            i += 1
-        elif token[0] == 'LET':
-            ast.append(LetStmt(name=token[1], type=token[2], value=token[3], line=line))
-            i += 1
-        elif token[0] == 'LET_CALL':
-            ast.append(LetStmt(name=token[1], type='Int', value=CallExpr(fn_name=token[2], args=token[3], line=line), line=line))
-            i += 1
-        elif token[0] == 'ASSIGN':
-            ast.append(AssignStmt(name=token[1], op=token[2], value=token[3], line=line))
-            i += 1
-        elif token[0] == 'SAY':
-            ast.append(SayStmt(value=f"{token[1]}{token[2]}({','.join(map(str, token[3]))})", line=line))
-            i += 1
-        elif token[0] == 'SAY_SIMPLE':
-            ast.append(SayStmt(value=token[1], line=line))
-            i += 1
-        elif token[0] == 'TRY_START':
-            try_body = []
-            i += 1
-            while i < len(tokens) and tokens[i][0][0] != 'CATCH_START':
-                inner_token, inner_line = tokens[i]
-                if inner_token[0] == 'SAY':
-                    try_body.append(SayStmt(value=f"{inner_token[1]}{inner_token[2]}({','.join(map(str, inner_token[3]))})", line=inner_line))
-                elif inner_token[0] == 'SAY_SIMPLE':
-                    try_body.append(SayStmt(value=inner_token[1], line=inner_line))
-                elif inner_token[0] == 'LET':
-                    try_body.append(LetStmt(name=inner_token[1], type=inner_token[2], value=inner_token[3], line=inner_line))
-                elif inner_token[0] == 'LET_CALL':
-                    try_body.append(LetStmt(name=inner_token[1], type='Int', value=CallExpr(fn_name=inner_token[2], args=inner_token[3], line=inner_line), line=inner_line))
-                elif inner_token[0] == 'ASSIGN':
-                    try_body.append(AssignStmt(name=inner_token[1], op=inner_token[2], value=inner_token[3], line=inner_line))
-                i += 1
-            catch_body = []
-            i += 1
-            while i < len(tokens) and tokens[i][0][0] != 'BLOCK_END':
-                inner_token, inner_line = tokens[i]
-                if inner_token[0] == 'SAY':
-                    catch_body.append(SayStmt(value=f"{inner_token[1]}{inner_token[2]}({','.join(map(str, inner_token[3]))})", line=inner_line))
-                elif inner_token[0] == 'SAY_SIMPLE':
-                    catch_body.append(SayStmt(value=inner_token[1], line=inner_line))
-                i += 1
-            ast.append(TryStmt(try_body=try_body, catch_body=catch_body, line=line))
-            i += 1
-        elif token[0] == 'FN_START':
-            params = []
-            if token[2]:
-                for param in token[2].split(','):
-                    name, type_ = param.strip().split(':')
-                    params.append((name.strip(), type_.strip()))
-            body = []
-            i += 1
-            while i < len(tokens) and tokens[i][0][0] != 'BLOCK_END':
-                inner_token, inner_line = tokens[i]
-                if inner_token[0] == 'RETURN_ADD':
-                    body.append(ReturnStmt(value=CallExpr(fn_name='math.add', args=[inner_token[1], inner_token[2]], line=inner_line), line=inner_line))
-                elif inner_token[0] == 'RETURN_MUL':
-                    body.append(ReturnStmt(value=CallExpr(fn_name='math.multiply', args=[inner_token[1], inner_token[2]], line=inner_line), line=inner_line))
-                elif inner_token[0] == 'RETURN_VAR':
-                    body.append(ReturnStmt(value=CallExpr(fn_name='identity', args=[inner_token[1]], line=inner_line), line=inner_line))
-                i += 1
-            ast.append(FnDecl(name=token[1], params=params, return_type=token[4], body=body, ai_optimized=ai_optimized_next or token[3], line=line))
-            ai_optimized_next = False
-            i += 1
-        elif token[0] == 'ACTOR_START':
-            state = []
-            methods = []
-            i += 1
-            while i < len(tokens) and tokens[i][0][0] != 'BLOCK_END':
-                inner_token, inner_line = tokens[i]
-                if inner_token[0] == 'STATE':
-                    state.append(LetStmt(name=inner_token[1], type='Int', value=inner_token[2], line=inner_line))
-                    i += 1
-                elif inner_token[0] == 'FN_START':
-                    fn_name = inner_token[1]
-                    params = []
-                    if inner_token[2]:
-                        for param in inner_token[2].split(','):
-                            name, type_ = param.strip().split(':')
-                            params.append((name.strip(), type_.strip()))
-                    body = []
-                    i += 1
-                    while i < len(tokens) and tokens[i][0][0] != 'BLOCK_END':
-                        body_token, body_line = tokens[i]
-                        if body_token[0] == 'ASSIGN':
-                            body.append(AssignStmt(name=body_token[1], op=body_token[2], value=body_token[3], line=body_line))
-                        elif body_token[0] == 'SAY':
-                            body.append(SayStmt(value=f"{body_token[1]}{body_token[2]}({','.join(map(str, body_token[3]))})", line=body_line))
-                        elif body_token[0] == 'SAY_SIMPLE':
-                            body.append(SayStmt(value=body_token[1], line=body_line))
-                        i += 1
-                    methods.append(FnDecl(name=fn_name, params=params, return_type=inner_token[4], body=body, ai_optimized=inner_token[3], line=inner_line))
-                    i += 1
-                else:
-                    i += 1
-            ast.append(ActorDecl(name=token[1], state=state, methods=methods, line=line))
-            i += 1
-        elif token[0] == 'SEND':
+        groups, handler = handlers[match.lastgroup]
+        yield handler(match.groups()[groups]), line_num
+
+def tokenize(code: Source) -> Union[List[Token], Iterator[Token]]:
+    """Tokenize a whole program string, or stream tokens from a file handle / line iterator."""
+    if isinstance(code, str):
+        return list(iter_tokens(code))
+    return iter_tokens(code)
+
+def _parse_params(spec: str) -> List[tuple[str, str]]:
+    params = []
+    if spec:
+        for param in spec.split(','):
+            name, type_ = param.strip().split(':')
+            params.append((name.strip(), type_.strip()))
+    return params
+
+def _parse_simple_stmt(token: List[Any], line: int) -> Optional[Node]:
+    kind = token[0]
+    if kind == 'LET':
+        return LetStmt(name=token[1], type=token[2], value=token[3], line=line)
+    elif kind == 'LET_CALL':
+        type_ = token[4] if len(token) > 4 else 'Int'
+        return LetStmt(name=token[1], type=type_, value=CallExpr(fn_name=token[2], args=token[3], line=line), line=line)
+    elif kind == 'ASSIGN':
+        value = token[3]
+        if isinstance(value, str) and value.isdigit():
+            value = int(value)
+        return AssignStmt(name=token[1], op=token[2], value=value, line=line)
+    elif kind == 'SAY':
+        return SayStmt(value=f"{token[1]}{{{token[2]}({','.join(map(str, token[3]))})}}", line=line)
+    elif kind == 'SAY_SIMPLE':
+        return SayStmt(value=token[1], line=line)
+    elif kind == 'RETURN_ADD':
+        return ReturnStmt(value=CallExpr(fn_name='math.add', args=[token[1], token[2]], line=line), line=line)
+    elif kind == 'RETURN_MUL':
+        return ReturnStmt(value=CallExpr(fn_name='math.multiply', args=[token[1], token[2]], line=line), line=line)
+    elif kind == 'RETURN_VAR':
+        return ReturnStmt(value=CallExpr(fn_name='identity', args=[token[1]], line=line), line=line)
+    return None
+
+_BLOCK_END = frozenset({'BLOCK_END'})
+_THEN_END = frozenset({'BLOCK_END', 'ELSE_START'})
+_TRY_END = frozenset({'BLOCK_END', 'CATCH_START'})
+_TOKEN_NAMES = {'BLOCK_END': "'}'", 'ELSE_START': "'else'", 'CATCH_START': "'catch'", 'STATE': "'state' outside an actor"}
+
+class Parser:
+    """Recursive-descent parser over line tokens, one method per rule of
+    docs/nexa_grammar.ebnf. Every token is read exactly once (with at most one
+    token of lookahead, for `else`), so nested blocks parse in a single
+    linear pass; tokens that do not fit the grammar raise SyntaxError."""
+    def __init__(self, tokens: Iterable[Token]):
+        self.tokens = iter(tokens)
+        self.lookahead: Optional[Token] = None
+
+    def next(self) -> Optional[Token]:
+        if self.lookahead is not None:
+            token, self.lookahead = self.lookahead, None
+            return token
+        return next(self.tokens, None)
+
+    def peek(self) -> Optional[Token]:
+        if self.lookahead is None:
+            self.lookahead = next(self.tokens, None)
+        return self.lookahead
+
+    def program(self) -> Iterator[Node]:
+        while True:
+            item = self.next()
+            if item is None:
+                return
+            yield self.statement(*item)
+
+    def block(self, opened: int, ends: frozenset = _BLOCK_END) -> tuple[List[Node], str]:
+        """statement* up to one of the `ends` tokens; returns the body and the end token's kind."""
+        body = []
+        while True:
+            item = self.next()
+            if item is None:
+                raise SyntaxError(f"Unclosed block opened at line {opened}")
+            token, line = item
+            if token[0] in ends:
+                return body, token[0]
+            body.append(self.statement(token, line))
+
+    def statement(self, token: List[Any], line: int) -> Node:
+        kind = token[0]
+        node = _parse_simple_stmt(token, line)
+        if node is not None:
+            return node
+        if kind in ('LET_SPAWN', 'SPAWN'):
+            if len(token) > 3:
+                return SpawnStmt(actor_name=token[2], var_name=token[1], capacity=token[3], overflow=token[4], line=line)
+            return SpawnStmt(actor_name=token[2], var_name=token[1], line=line)
+        elif kind == 'SEND':
             if len(token) == 3:
-                ast.append(SendStmt(actor_var=token[1], msg=token[2], line=line))
+                return SendStmt(actor_var=token[1], msg=token[2], line=line)
+            return SendStmt(actor_var=token[1], msg=CallExpr(fn_name=token[2], args=token[3], line=line), line=line)
+        elif kind == 'SEND_MANY':
+            msgs = [arg.strip() for arg in token[2] if arg.strip()]
+            return SendStmt(actor_var=token[1], msg=[int(arg) if arg.isdigit() else arg for arg in msgs], line=line)
+        elif kind == 'AI_OPTIMIZE':
+            return self.annotated_fn(line)
+        elif kind == 'FN_START':
+            return self.fn_decl(token, line)
+        elif kind == 'ACTOR_START':
+            return self.actor_decl(token, line)
+        elif kind == 'IF_START':
+            return self.if_stmt(token, line)
+        elif kind == 'FOR_START':
+            body, _ = self.block(line)
+            return ForStmt(var=token[1], start=0, end=token[2], body=body, line=line)
+        elif kind == 'WHILE_START':
+            body, _ = self.block(line)
+            return WhileStmt(condition=f"{token[1]}>{token[2]}", body=body, line=line)
+        elif kind == 'TRY_START':
+            return self.try_stmt(line)
+        raise SyntaxError(f"Unexpected {_TOKEN_NAMES.get(kind, kind)} at line {line}")
+
+    def annotated_fn(self, line: int) -> FnDecl:
+        item = self.next()
+        if item is None or item[0][0] != 'FN_START':
+            raise SyntaxError(f"@ai.optimize must be followed by a function at line {line}")
+        return self.fn_decl(item[0], item[1], ai_optimized=True)
+
+    def fn_decl(self, token: List[Any], line: int, ai_optimized: bool = False) -> FnDecl:
+        body, _ = self.block(line)
+        return FnDecl(name=token[1], params=_parse_params(token[2]), return_type=token[4], body=body,
+                      ai_optimized=ai_optimized or token[3], line=line)
+
+    def actor_decl(self, token: List[Any], line: int) -> ActorDecl:
+        state = []
+        methods = []
+        while True:
+            item = self.next()
+            if item is None:
+                raise SyntaxError(f"Unclosed actor opened at line {line}")
+            inner, inner_line = item
+            kind = inner[0]
+            if kind == 'BLOCK_END':
+                break
+            elif kind == 'STATE':
+                state.append(LetStmt(name=inner[1], type='Int', value=inner[2], line=inner_line))
+            elif kind == 'FN_START':
+                methods.append(self.fn_decl(inner, inner_line))
+            elif kind == 'AI_OPTIMIZE':
+                methods.append(self.annotated_fn(inner_line))
             else:
-                ast.append(SendStmt(actor_var=token[1], msg=CallExpr(fn_name=token[2], args=token[3], line=line), line=line))
-            i += 1
+                raise SyntaxError(f"Unexpected {_TOKEN_NAMES.get(kind, kind)} in actor at line {inner_line}")
+        if len(token) > 2:
+            return ActorDecl(name=token[1], state=state, methods=methods, capacity=token[2], overflow=token[3], line=line)
+        return ActorDecl(name=token[1], state=state, methods=methods, line=line)
+
+    def if_stmt(self, token: List[Any], line: int) -> IfStmt:
+        then_body, end = self.block(line, _THEN_END)
+        else_body = []
+        if end == 'BLOCK_END':
+            following = self.peek()
+            if following is not None and following[0][0] == 'ELSE_START':
+                self.next()
+                end = 'ELSE_START'
+        if end == 'ELSE_START':
+            else_body, _ = self.block(line)
+        return IfStmt(condition=f"{token[1]}>{token[2]}", then_body=then_body, else_body=else_body, line=line)
+
+    def try_stmt(self, line: int) -> TryStmt:
+        try_body, end = self.block(line, _TRY_END)
+        if end == 'BLOCK_END':
+            item = self.next()
+            if item is None or item[0][0] != 'CATCH_START':
+                raise SyntaxError(f"Expected catch after try block opened at line {line}")
+        catch_body, _ = self.block(line)
+        return TryStmt(try_body=try_body, catch_body=catch_body, line=line)
+
+def iter_parse(tokens: Iterable[Token]) -> Iterator[Node]:
+    """Yield top-level nodes as soon as they are complete; only the open block is held in memory."""
+    return Parser(tokens).program()
+
+def parse(tokens: Iterable[Token]) -> List[Node]:
+    return list(iter_parse(tokens))
+
+FN_RETURN_TYPES = VALUE_TYPES + ('Unit',)
+
+class _Names:
+    """The variables visible to one body being checked. `scope` is the Scope
+    the body will run on, when that is known statically; nodes are annotated
+    with slots of it. Top-level names are laid out (unbound) in the checked
+    Environment itself, so streamed chunks and REPL lines see earlier ones."""
+    def __init__(self, names: Any, scope: Optional[Scope], env: Optional[Environment] = None):
+        self.names = names
+        self.scope = scope
+        self.env = env
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names
+
+    def declare(self, name: str, type_: Optional[str] = None) -> Optional[tuple]:
+        if self.env is not None:
+            self.env.slot(name, type_)
         else:
-            i += 1
-    return ast
+            self.names.add(name)
+        return self.resolve(name)
 
-def type_check(ast: List[Node], env: Environment):
-    for node in ast:
+    def resolve(self, name: str) -> Optional[tuple]:
+        if self.scope is None:
+            return None
+        return self.scope, self.scope.slots[name]
+
+    def resolve_all(self, names: List[Optional[str]]) -> Optional[tuple]:
+        """(scope, slot index per name), with None kept for non-variables."""
+        if self.scope is None:
+            return None
+        return self.scope, tuple(None if name is None else self.scope.slots[name] for name in names)
+
+class TypeChecker:
+    """Static checks over every body of a program: declared types, variables
+    defined before use, calls to known functions with the right arity, and
+    actors that exist. Top-level function and actor declarations are
+    registered in the Environment before anything else is checked; nested
+    ones only in the checker's own tables, since they are bound when (and
+    if) they run. Variables only get unbound slots, never values. Checked
+    nodes are annotated with their variable's slot and, for stdlib calls,
+    the callable itself."""
+    def __init__(self, env: Environment, partial: bool = False):
+        self.env = env
+        self.partial = partial
+        self.unresolved: List[CallExpr] = []
+        self.fns: Dict[str, FnDecl] = {}
+        self.actors: Dict[str, ActorDecl] = {}
+        # (id(actor), _Names) pairs whose methods have been checked; see spawn().
+        self.spawned: set = set()
+
+    def check(self, ast: List[Node]):
+        env = self.env
+        for node in ast:
+            if isinstance(node, FnDecl):
+                env.set_fn(node)
+            elif isinstance(node, ActorDecl):
+                env.set_actor(node)
+        self.block(ast, _Names(env.scope.slots, env.scope, env))
+        for call in self.unresolved:
+            self.link(call)
+
+    def block(self, body: List[Node], names: _Names):
+        for node in body:
+            self.statement(node, names)
+
+    def statement(self, node: Node, names: _Names):
+        if isinstance(node, LetStmt):
+            self.check_type(node.type, node.line)
+            if isinstance(node.value, CallExpr):
+                self.call(node.value, names)
+            node.slot = names.declare(node.name, node.type)
+        elif isinstance(node, AssignStmt):
+            if isinstance(node.value, str):
+                node.value_slot = self.read(node.value, names, node.line)
+            if node.op == '+=':
+                self.read(node.name, names, node.line)
+                node.slot = names.resolve(node.name)
+            else:
+                node.slot = names.declare(node.name)
+        elif isinstance(node, FnDecl):
+            self.fns[node.name] = node
+            self.function(node)
+        elif isinstance(node, ActorDecl):
+            self.actors[node.name] = node
+            self.actor(node)
+        elif isinstance(node, (IfStmt, WhileStmt)):
+            node.slot = self.read(node.cond_var, names, node.line)
+            if isinstance(node, IfStmt):
+                self.block(node.then_body, names)
+                self.block(node.else_body, names)
+            else:
+                self.block(node.body, names)
+        elif isinstance(node, ForStmt):
+            node.slot = names.declare(node.var, 'Int')
+            self.block(node.body, names)
+        elif isinstance(node, TryStmt):
+            self.block(node.try_body, names)
+            self.block(node.catch_body, names)
+        elif isinstance(node, SayStmt):
+            refs = []
+            for ref in node.template.refs:
+                if isinstance(ref, CallExpr):
+                    self.call(ref, names)
+                    refs.append(None)
+                else:
+                    self.read(ref, names, node.line)
+                    refs.append(ref)
+            node.arg_slots = names.resolve_all(refs)
+        elif isinstance(node, SpawnStmt):
+            actor = self.env.actors.get(node.actor_name) or self.actors.get(node.actor_name)
+            if actor is None:
+                raise TypeError(f"Undefined actor at line {node.line}: {node.actor_name}")
+            self.spawn(actor, names)
+            if node.var_name:
+                names.declare(node.var_name, node.actor_name)
+        elif isinstance(node, SendStmt):
+            node.slot = self.read(node.actor_var, names, node.line)
+            if isinstance(node.msg, CallExpr):
+                self.call(node.msg, names)
+            elif isinstance(node.msg, list):
+                node.arg_slots = names.resolve_all([self.operand(msg, names, node.line) for msg in node.msg])
+        elif isinstance(node, ReturnStmt):
+            if isinstance(node.value, CallExpr):
+                self.call(node.value, names)
+            elif not isinstance(node.value, int):
+                raise TypeError(f"Invalid return at line {node.line}")
+
+    def check_type(self, type_: str, line: int):
+        if type_ not in VALUE_TYPES and type_ not in self.env.actors and type_ not in self.actors:
+            raise TypeError(f"Unsupported type at line {line}: {type_}")
+
+    def read(self, name: str, names: _Names, line: int) -> Optional[tuple]:
+        if name not in names:
+            raise TypeError(f"Undefined variable at line {line}: {name}")
+        return names.resolve(name)
+
+    def operand(self, arg: Union[str, int], names: _Names, line: int) -> Optional[str]:
+        """Check `arg`; the variable name it reads, or None for a constant."""
+        if isinstance(arg, str):
+            arg = arg.strip()
+            if not arg.isdigit():
+                self.read(arg, names, line)
+                return arg
+        return None
+
+    def call(self, call: CallExpr, names: _Names):
+        """Check a call site and link it: argument slots, then the stdlib
+        callable or (through the inline cache) the user function it names."""
+        for name, _ in call.operands:
+            if name is not None:
+                self.read(name, names, call.line)
+        call.arg_slots = names.resolve_all([name for name, _ in call.operands])
+        if call.fn_name == 'identity':
+            call.builtin = _identity
+            return
+        builtin = self.env.stdlib.get(call.fn_name)
+        if builtin is not None:
+            call.builtin = builtin
+            return
+        if self.fn(call.fn_name) is None and (self.partial or names.env is None):
+            # The callee may be declared later: further down the program, for a
+            # call inside a body (checked at the end of check()), or, for
+            # partial input, in a later chunk (looked up when the call runs).
+            if not self.partial:
+                self.unresolved.append(call)
+            return
+        self.link(call)
+
+    def fn(self, name: str) -> Optional[FnDecl]:
+        return self.env.fns.get(name) or self.fns.get(name)
+
+    def link(self, call: CallExpr):
+        fn = self.fn(call.fn_name)
+        if fn is None:
+            raise TypeError(f"Undefined function call at line {call.line}: {call.fn_name}")
+        if len(call.args) != len(fn.params):
+            raise TypeError(f"{call.fn_name} takes {len(fn.params)} arguments, got {len(call.args)} at line {call.line}")
+        if call.fn_name in self.env.fns:
+            # Calls to nested functions are linked when they first run.
+            call.link = link_call(call.fn_name, self.env)
+
+    def params(self, fn: FnDecl, where: str = ''):
+        for _, type_ in fn.params:
+            if type_ not in VALUE_TYPES:
+                raise TypeError(f"Unsupported param type{where} at line {fn.line}: {type_}")
+        if fn.return_type not in FN_RETURN_TYPES:
+            raise TypeError(f"Unsupported return type{where} at line {fn.line}: {fn.return_type}")
+
+    def function(self, fn: FnDecl):
+        self.params(fn)
+        scope = function_scope(fn)
+        self.block(fn.body, _Names({name for name, _ in fn.params}, scope))
+
+    def actor(self, actor: ActorDecl):
+        for stmt in actor.state:
+            if isinstance(stmt, LetStmt):
+                self.check_type(stmt.type, stmt.line)
+        for method in actor.methods:
+            self.params(method, ' in actor')
+
+    def spawn(self, actor: ActorDecl, names: _Names):
+        """Check the actor's methods against the context this spawn builds:
+        the spawner's variables, the actor's state and `msg`. Names only grow
+        as a body is walked, so the first spawn in each body decides. The
+        context copies the spawner's scope, so method bodies get no slots."""
+        key = (id(actor), names)
+        if key in self.spawned:
+            return
+        self.spawned.add(key)
+        visible = set(names.names) | {'msg'} | {stmt.name for stmt in actor.state if isinstance(stmt, LetStmt)}
+        for method in actor.methods:
+            self.block(method.body, _Names(visible | {name for name, _ in method.params}, None))
+
+def type_check(ast: List[Node], env: Environment, partial: bool = False):
+    """Check `ast` against `env`; see TypeChecker. Raises TypeError. With
+    `partial`, `ast` is one chunk of a program (a streamed statement or a REPL
+    line), so calls to functions not declared yet are left to run time."""
+    TypeChecker(env, partial).check(ast)
+
+# Optimizer: constant propagation and folding, dead-branch elimination and
+# small-loop unrolling over the parsed AST. Nodes are never mutated; changed
+# nodes are rebuilt with dataclasses.replace().
+
+UNROLL_LIMIT = 8
+
+def _assigned_names(body: List[Node]) -> set:
+    names = set()
+    for node in body:
+        if isinstance(node, (LetStmt, AssignStmt)):
+            names.add(node.name)
+        elif isinstance(node, SpawnStmt):
+            names.add(node.var_name)
+        elif isinstance(node, ForStmt):
+            names.add(node.var)
+            names |= _assigned_names(node.body)
+        elif isinstance(node, WhileStmt):
+            names |= _assigned_names(node.body)
+        elif isinstance(node, IfStmt):
+            names |= _assigned_names(node.then_body) | _assigned_names(node.else_body)
+        elif isinstance(node, TryStmt):
+            names |= _assigned_names(node.try_body) | _assigned_names(node.catch_body)
+    return names
+
+class ConstantFolder:
+    """Tracks variables whose value is known at each point of a straight-line
+    scope. Reuse one instance to fold a program fed statement by statement."""
+    def __init__(self, unroll_limit: int = UNROLL_LIMIT):
+        self.unroll_limit = unroll_limit
+        self.known: Dict[str, int] = {}
+
+    def constant(self, arg: Any) -> Optional[int]:
+        if isinstance(arg, bool):
+            return None
+        if isinstance(arg, int):
+            return arg
+        if isinstance(arg, str):
+            arg = arg.strip()
+            if arg.isdigit():
+                return int(arg)
+            return self.known.get(arg)
+        return None
+
+    def call(self, call: CallExpr) -> Union[int, CallExpr]:
+        """Fold a stdlib call whose arguments are all known; otherwise substitute known arguments."""
+        args = [arg if (value := self.constant(arg)) is None else value for arg in call.args]
+        if call.fn_name == 'identity':
+            if isinstance(args[0], int):
+                return args[0]
+        elif call.fn_name in STDLIB and all(isinstance(arg, int) for arg in args):
+            try:
+                result = STDLIB[call.fn_name](*args)
+            except Exception:
+                result = None
+            if isinstance(result, int) and not isinstance(result, bool):
+                return result
+        if args == call.args:
+            return call
+        return replace(call, args=args)
+
+    def condition(self, condition: str) -> Optional[bool]:
+        var, bound = condition.split('>')
+        value = self.constant(var)
+        return None if value is None else value > int(bound)
+
+    def forget(self, names: set):
+        for name in names:
+            self.known.pop(name, None)
+
+    def block(self, body: List[Node]) -> List[Node]:
+        result = []
+        for node in body:
+            result.extend(self.node(node))
+            if result and isinstance(result[-1], ReturnStmt):
+                break
+        return result
+
+    def branch(self, body: List[Node], known: Dict[str, int]) -> tuple[List[Node], Dict[str, int]]:
+        saved, self.known = self.known, dict(known)
+        try:
+            return self.block(body), self.known
+        finally:
+            self.known = saved
+
+    def node(self, node: Node) -> List[Node]:
+        known = self.known
         if isinstance(node, LetStmt):
-            if node.type != 'Int' and node.type not in env.actors:
-                raise TypeError(f"Unsupported type at line {node.line}: {node.type}")
-            env.set_var(node.name, node.value, node.type)
+            value = node.value
+            if isinstance(value, CallExpr):
+                value = self.call(value)
+            if isinstance(value, int) and node.type == 'Int':
+                known[node.name] = value
+            else:
+                known.pop(node.name, None)
+            return [node if value is node.value else replace(node, value=value)]
+        elif isinstance(node, AssignStmt):
+            operand = self.constant(node.value)
+            if node.op == '+=':
+                current = known.get(node.name)
+                if current is None or operand is None:
+                    known.pop(node.name, None)
+                    return [node if operand is None else replace(node, value=operand)]
+                operand += current
+            if operand is None:
+                known.pop(node.name, None)
+                return [node]
+            known[node.name] = operand
+            return [replace(node, op='=', value=operand)]
         elif isinstance(node, FnDecl):
-            env.set_fn(node)
-            for param in node.params:
-                if param[1] != 'Int':
-                    raise TypeError(f"Unsupported param type at line {node.line}: {param[1]}")
-            for stmt in node.body:
-                if isinstance(stmt, IfStmt):
-                    var, _ = stmt.condition.split('>')
-                    if var not in env.vars:
-                        raise TypeError(f"Undefined variable in if at line {stmt.line}: {var}")
-                elif isinstance(stmt, ForStmt):
-                    if stmt.var not in env.vars:
-                        raise TypeError(f"Undefined loop variable at line {stmt.line}: {stmt.var}")
-                elif isinstance(stmt, WhileStmt):
-                    var, _ = stmt.condition.split('>')
-                    if var not in env.vars:
-                        raise TypeError(f"Undefined variable in while at line {stmt.line}: {var}")
-                elif isinstance(stmt, TryStmt):
-                    for try_stmt in stmt.try_body:
-                        if isinstance(try_stmt, SayStmt):
-                            pass
-                    for catch_stmt in stmt.catch_body:
-                        if isinstance(catch_stmt, SayStmt):
-                            pass
-                elif isinstance(stmt, ReturnStmt):
-                    if not isinstance(stmt.value, CallExpr):
-                        raise TypeError(f"Invalid return at line {stmt.line}")
-                elif isinstance(stmt, CallExpr):
-                    if stmt.fn_name not in env.fns and stmt.fn_name not in env.stdlib:
-                        raise TypeError(f"Undefined function call at line {stmt.line}: {stmt.fn_name}")
+            return [replace(node, body=ConstantFolder(self.unroll_limit).block(node.body))]
         elif isinstance(node, ActorDecl):
-            env.set_actor(node)
-            local_env = Environment()
-            for stmt in node.state:
-                if isinstance(stmt, LetStmt):
-                    local_env.set_var(stmt.name, stmt.value, stmt.type)
-            for method in node.methods:
-                if isinstance(method, FnDecl):
-                    for param in method.params:
-                        if param[1] != 'Int':
-                            raise TypeError(f"Unsupported param type in actor at line {method.line}: {param[1]}")
+            methods = [replace(method, body=ConstantFolder(self.unroll_limit).block(method.body)) for method in node.methods]
+            return [replace(node, methods=methods)]
+        elif isinstance(node, IfStmt):
+            taken = self.condition(node.condition)
+            if taken is not None:
+                return self.block(node.then_body if taken else node.else_body)
+            then_body, then_known = self.branch(node.then_body, known)
+            else_body, else_known = self.branch(node.else_body, known)
+            self.known = {name: value for name, value in then_known.items() if else_known.get(name) == value}
+            return [replace(node, then_body=then_body, else_body=else_body)]
+        elif isinstance(node, ForStmt):
+            iterations = node.end - node.start
+            if 0 <= iterations <= self.unroll_limit:
+                unrolled = []
+                for i in range(node.start, node.end):
+                    unrolled.append(AssignStmt(name=node.var, op='=', value=i, line=node.line))
+                    unrolled.extend(deepcopy(node.body))
+                return self.block(unrolled)
+            self.forget(_assigned_names([node]))
+            body, _ = self.branch(node.body, self.known)
+            return [replace(node, body=body)]
+        elif isinstance(node, WhileStmt):
+            if self.condition(node.condition) is False:
+                return []
+            self.forget(_assigned_names(node.body))
+            body, _ = self.branch(node.body, self.known)
+            return [replace(node, body=body)]
+        elif isinstance(node, TryStmt):
+            try_body, _ = self.branch(node.try_body, known)
+            self.forget(_assigned_names(node.try_body))
+            catch_body, _ = self.branch(node.catch_body, self.known)
+            self.forget(_assigned_names(node.catch_body))
+            return [replace(node, try_body=try_body, catch_body=catch_body)]
         elif isinstance(node, SpawnStmt):
-            env.get_actor(node.actor_name)
+            known.pop(node.var_name, None)
         elif isinstance(node, SendStmt):
-            if node.actor_var not in env.vars:
-                raise TypeError(f"Undefined actor variable at line {node.line}: {node.actor_var}")
+            if isinstance(node.msg, CallExpr):
+                msg = self.call(node.msg)
+                if msg is not node.msg:
+                    return [replace(node, msg=msg)]
+            elif isinstance(node.msg, list):
+                msgs = [msg if (value := self.constant(msg)) is None else value for msg in node.msg]
+                if msgs != node.msg:
+                    return [replace(node, msg=msgs)]
+        elif isinstance(node, ReturnStmt):
+            if isinstance(node.value, CallExpr):
+                value = self.call(node.value)
+                if value is not node.value:
+                    return [replace(node, value=value)]
+        return [node]
+
+def optimize_ast(ast: List[Node], unroll_limit: int = UNROLL_LIMIT) -> List[Node]:
+    """Return an optimized copy of `ast`: constants are propagated through let and
+    assignment, stdlib calls with constant arguments are folded, statically
+    decided if/while branches are dropped and small for ranges are unrolled."""
+    return ConstantFolder(unroll_limit).block(ast)
 
-def interpret(ast: List[Node], env: Environment):
-    print("Interpreting AST...")
+def format_ast(ast: List[Node], indent: int = 0) -> str:
+    """Render nodes one per line, with nested bodies indented, for inspecting optimizer output."""
+    lines = []
+    pad = '  ' * indent
     for node in ast:
-        print(f"Processing node: {type(node).__name__}")
+        nested = {}
+        fields = []
+        for f in dataclass_fields(node):
+            if f.name == 'line' or not f.repr:
+                continue
+            value = getattr(node, f.name)
+            if isinstance(value, list) and value and all(isinstance(item, Node) for item in value):
+                nested[f.name] = value
+            else:
+                fields.append(f"{f.name}={value!r}")
+        lines.append(f"{pad}{type(node).__name__}({', '.join(fields)})  # line {node.line}")
+        for name, body in nested.items():
+            lines.append(f"{pad}  {name}:")
+            lines.append(format_ast(body, indent + 2))
+    return '\n'.join(lines)
+
+def _eval_operand(arg: Union[str, int], env: Environment) -> Any:
+    if isinstance(arg, str):
+        arg = arg.strip()
+        if arg.isdigit():
+            return int(arg)
+        return env.get_value(arg)
+    return arg
+
+def function_scope(fn: FnDecl) -> Scope:
+    """The frame layout of `fn`: parameters in the first slots, then its locals."""
+    if fn.scope is None:
+        fn.scope = resolve_slots(fn.body, Scope(fn.params))
+    return fn.scope
+
+def enter_frame(fn: FnDecl, args: List[Any], env: Environment) -> Environment:
+    """Build the call frame for `fn`, shared by every engine that runs AST bodies.
+
+    The frame is sized from the function's pre-bound layout and looks up
+    functions, actors and the stdlib through `env` instead of copying them.
+    """
+    frame = Environment(function_scope(fn), parent=env)
+    frame.values[:len(args)] = args
+    return frame
+
+def _run_interpreted(fn: FnDecl, args: List[Any], env: Environment) -> Any:
+    result = interpret(fn.body, enter_frame(fn, args, env))
+    return 0 if result is None else result
+
+BodyRunner = Callable[[FnDecl, List[Any], Environment], Any]
+
+def call_function(fn: FnDecl, args: List[Any], env: Environment, run_body: BodyRunner = _run_interpreted) -> Any:
+    """The call path shared by every engine: profiling and memoization wrap
+    `run_body`, the engine's way of setting up a frame and running `fn`."""
+    run = run_body if PROFILER is None else PROFILER.function(run_body)
+    cache = env.memo_cache(fn)
+    if cache is not None:
+        return cache.call(fn, args, env, run)
+    return run(fn, args, env)
+
+def _call_args(call: CallExpr, env: Environment) -> List[Any]:
+    """The argument values of `call`, read through its checked slots when `env`
+    runs on their scope."""
+    arg_slots = call.arg_slots
+    if arg_slots is None or arg_slots[0] is not env.scope:
+        return [value if name is None else env.get_value(name) for name, value in call.operands]
+    values = env.values
+    args = []
+    for index, (name, value) in zip(arg_slots[1], call.operands):
+        if index is not None:
+            value = values[index]
+            if value is _UNBOUND:
+                raise RuntimeError(f"Undefined variable: {name}")
+        args.append(value)
+    return args
+
+def call_expr(call: CallExpr, env: Environment) -> Any:
+    """Evaluate `call` through the stdlib callable type_check() bound to it, or
+    its inline cache of the user function it names."""
+    args = _call_args(call, env)
+    builtin = call.builtin
+    if builtin is None:
+        link = call.link
+        if not link_valid(link, env):
+            link = call.link = link_call(call.fn_name, env)
+        builtin = link[2]
+        if builtin is None:
+            return call_function(link[3], args, env)
+    return builtin(*args)
+
+def _slot_value(env: Environment, index: int, name: str) -> Any:
+    value = env.values[index]
+    if value is _UNBOUND:
+        raise RuntimeError(f"Undefined variable: {name}")
+    return value
+
+def _checked_indices(arg_slots: Optional[tuple], env: Environment) -> Optional[tuple]:
+    """The slot indices type_check() recorded, if `env` runs on their scope."""
+    if arg_slots is not None and arg_slots[0] is env.scope:
+        return arg_slots[1]
+    return None
+
+def _load(slot: Optional[tuple], name: str, env: Environment) -> Any:
+    """Read a variable through its checked slot when `env` runs on that scope."""
+    if slot is not None and slot[0] is env.scope:
+        return _slot_value(env, slot[1], name)
+    return env.get_value(name)
+
+def _store(slot: Optional[tuple], name: str, value: Any, type_: str, env: Environment):
+    # The checker recorded the slot's type in the scope; scopes can be shared
+    # between threads (Interpreter.run_batch), so only the value is written.
+    if slot is not None and slot[0] is env.scope:
+        env.values[slot[1]] = value
+    else:
+        env.set_var(name, value, type_)
+
+def render_template(template: SayTemplate, env: Environment, arg_slots: Optional[tuple] = None) -> str:
+    chunks = template.chunks
+    pieces = [chunks[0]]
+    indices = _checked_indices(arg_slots, env)
+    for i, (ref, chunk) in enumerate(zip(template.refs, chunks[1:])):
+        if isinstance(ref, CallExpr):
+            value = call_expr(ref, env)
+        elif indices is not None:
+            value = _slot_value(env, indices[i], ref)
+        else:
+            value = env.get_value(ref)
+        pieces.append(format_value(value))
+        pieces.append(chunk)
+    return ''.join(pieces)
+
+def interpret(ast: List[Node], env: Environment, profile: bool = True):
+    if profile and PROFILER is not None:
+        return PROFILER.block(ast, env)
+    level = TRACER.level
+    for node in ast:
+        if level >= TRACE_NODE:
+            TRACER.emit(TRACE_NODE, node)
         if isinstance(node, LetStmt):
-            print(f"Setting variable {node.name} = {node.value}")
+            if level >= TRACE_TRACE:
+                TRACER.emit(TRACE_TRACE, node, f"Setting variable {node.name} = {node.value}")
             if node.value is None:
                 continue
             elif isinstance(node.value, CallExpr):
-                if node.value.fn_name == 'identity':
-                    value, _ = env.get_var(str(node.value.args[0]))
-                else:
-                    args = []
-                    for arg in node.value.args:
-                        if isinstance(arg, str):
-                            arg_stripped = arg.strip()
-                            if arg_stripped.isdigit():
-                                args.append(int(arg_stripped))
-                            else:
-                                arg_value, _ = env.get_var(arg_stripped)
-                                args.append(arg_value)
-                        else:
-                            args.append(arg)
-                    if node.value.fn_name in env.stdlib:
-                        value = env.stdlib[node.value.fn_name](*args)
-                    else:
-                        fn = env.get_fn(node.value.fn_name)
-                        local_env = Environment()
-                        local_env.stdlib = env.stdlib
-                        for (param_name, param_type), arg_value in zip(fn.params, args):
-                            local_env.set_var(param_name, arg_value, param_type)
-                        result = None
-                        for stmt in fn.body:
-                            result = interpret([stmt], local_env)
-                            if result is not None:
-                                value = result
-                                break
-                        else:
-                            value = 0
-                env.set_var(node.name, value, node.type)
+                _store(node.slot, node.name, call_expr(node.value, env), node.type, env)
             else:
-                env.set_var(node.name, node.value, node.type)
+                _store(node.slot, node.name, node.value, node.type, env)
         elif isinstance(node, FnDecl):
-            print(f"Defining function: {node.name}")
+            if level >= TRACE_INFO:
+                TRACER.emit(TRACE_INFO, node, f"Defining function: {node.name}")
             env.set_fn(node)
         elif isinstance(node, AssignStmt):
-            print(f"Assigning: {node.name} {node.op} {node.value}")
+            if level >= TRACE_TRACE:
+                TRACER.emit(TRACE_TRACE, node, f"Assigning: {node.name} {node.op} {node.value}")
+            value = _load(node.value_slot, node.value, env) if isinstance(node.value, str) else node.value
             if node.op == '+=':
-                current_value, _ = env.get_var(str(node.name))
-                if isinstance(node.value, str):
-                    add_value, _ = env.get_var(str(node.value))
-                    env.set_var(node.name, current_value + add_value, 'Int')
-                else:
-                    env.set_var(node.name, current_value + node.value, 'Int')
-            else:
-                if isinstance(node.value, str):
-                    assign_val, _ = env.get_var(str(node.value))
-                    env.set_var(node.name, assign_val, 'Int')
-                else:
-                    env.set_var(node.name, node.value, 'Int')
+                value = _load(node.slot, node.name, env) + value
+            _store(node.slot, node.name, value, 'Int', env)
         elif isinstance(node, IfStmt):
-            print(f"Evaluating if condition: {node.condition}")
-            cond_var, cond_value = node.condition.split('>')
-            var_value, _ = env.get_var(str(cond_var))
-            if var_value > int(cond_value):
-                interpret(node.then_body, env)
-            else:
-                interpret(node.else_body, env)
+            if level >= TRACE_TRACE:
+                TRACER.emit(TRACE_TRACE, node, f"Evaluating if condition: {node.condition}")
+            var_value = _load(node.slot, node.cond_var, env)
+            result = interpret(node.then_body if var_value > node.cond_bound else node.else_body, env)
+            if result is not None:
+                return result
         elif isinstance(node, ForStmt):
-            print(f"Starting for loop: {node.var} in range({node.end})")
+            if level >= TRACE_TRACE:
+                TRACER.emit(TRACE_TRACE, node, f"Starting for loop: {node.var} in range({node.end})")
+            slot = node.slot[1] if node.slot is not None and node.slot[0] is env.scope else env.slot(node.var, 'Int')
             for i in range(node.start, node.end):
-                env.set_var(node.var, i, 'Int')
-                interpret(node.body, env)
+                env.values[slot] = i
+                result = interpret(node.body, env)
+                if result is not None:
+                    return result
         elif isinstance(node, WhileStmt):
-            print(f"Starting while loop: {node.condition}")
-            cond_var, cond_value = node.condition.split('>')
+            if level >= TRACE_TRACE:
+                TRACER.emit(TRACE_TRACE, node, f"Starting while loop: {node.condition}")
             while True:
-                var_value, _ = env.get_var(str(cond_var))
-                if var_value > int(cond_value):
-                    interpret(node.body, env)
+                var_value = _load(node.slot, node.cond_var, env)
+                if var_value > node.cond_bound:
+                    result = interpret(node.body, env)
+                    if result is not None:
+                        return result
                 else:
                     break
         elif isinstance(node, TryStmt):
-            print("Starting try block")
+            if level >= TRACE_TRACE:
+                TRACER.emit(TRACE_TRACE, node, "Starting try block")
             try:
-                interpret(node.try_body, env)
+                result = interpret(node.try_body, env)
             except (RuntimeError, ZeroDivisionError) as e:
-                print(f"Caught exception: {e}")
-                interpret(node.catch_body, env)
+                if TRACER.level >= TRACE_INFO:
+                    TRACER.emit(TRACE_INFO, node, f"Caught exception: {e}")
+                result = interpret(node.catch_body, env)
+            if result is not None:
+                return result
         elif isinstance(node, SayStmt):
-            if '{' in node.value:
-                parts = node.value.split('{')
-                output = parts[0]
-                for part in parts[1:]:
-                    expr_end = part.find('}')
-                    expr = part[:expr_end]
-                    if '(' in expr:
-                        fn_name = expr[:expr.find('(')]
-                        args_str = expr[expr.find('(')+1:expr.find(')')]
-                        args = []
-                        for arg in args_str.split(','):
-                            arg = arg.strip()
-                            if arg.isdigit():
-                                args.append(int(arg))
-                            else:
-                                arg_value, _ = env.get_var(arg)
-                                args.append(arg_value)
-                        if fn_name in env.stdlib:
-                            result = env.stdlib[fn_name](*args)
-                        else:
-                            fn = env.get_fn(fn_name)
-                            local_env = Environment()
-                            local_env.stdlib = env.stdlib
-                            for (param_name, param_type), arg_value in zip(fn.params, args):
-                                local_env.set_var(param_name, arg_value, param_type)
-                            result = 0
-                            for stmt in fn.body:
-                                res = interpret([stmt], local_env)
-                                if res is not None:
-                                    result = res
-                                    break
-                        output += str(result)
-                    else:
-                        value, _ = env.get_var(expr)
-                        output += str(value)
-                    output += part[expr_end+1:]
-                print(f"Output: {output}")
+            template = node.template
+            if template.refs:
+                env.output.write(render_template(template, env, node.arg_slots))
             else:
-                print(f"Output: {node.value}")
+                env.output.write(node.value)
         elif isinstance(node, ActorDecl):
-            print(f"Defining actor: {node.name}")
+            if level >= TRACE_INFO:
+                TRACER.emit(TRACE_INFO, node, f"Defining actor: {node.name}")
             env.set_actor(node)
         elif isinstance(node, SpawnStmt):
-            print(f"Spawning actor: {node.actor_name}")
+            if level >= TRACE_INFO:
+                TRACER.emit(TRACE_INFO, node, f"Spawning actor: {node.actor_name}")
             actor = env.get_actor(node.actor_name)
-            instance = ActorInstance(actor, env)
+            instance = ActorInstance(actor, env, node.capacity, node.overflow)
             if node.var_name:
                 env.set_var(node.var_name, instance, node.actor_name)
         elif isinstance(node, SendStmt):
-            print(f"Sending message to actor: {node.actor_var}")
-            instance, _ = env.get_var(node.actor_var)
+            if level >= TRACE_TRACE:
+                TRACER.emit(TRACE_TRACE, node, f"Sending message to actor: {node.actor_var}")
+            instance = _load(node.slot, node.actor_var, env)
             if isinstance(node.msg, CallExpr):
-                args = []
-                for arg in node.msg.args:
-                    if isinstance(arg, str):
-                        arg_value, _ = env.get_var(arg)
-                        args.append(arg_value)
-                    else:
-                        args.append(arg)
-                result = env.stdlib[node.msg.fn_name](*args)
-                instance.send(result)
+                instance.send(call_expr(node.msg, env))
+            elif isinstance(node.msg, list):
+                indices = _checked_indices(node.arg_slots, env)
+                if indices is None:
+                    instance.send_many([_eval_operand(msg, env) for msg in node.msg])
+                else:
+                    instance.send_many([_eval_operand(msg, env) if index is None else _slot_value(env, index, msg)
+                                        for index, msg in zip(indices, node.msg)])
             else:
                 instance.send(node.msg)
         elif isinstance(node, ReturnStmt):
             if isinstance(node.value, CallExpr):
-                if node.value.fn_name == 'identity':
-                    value, _ = env.get_var(str(node.value.args[0]))
-                    return value
-                else:
-                    args = []
-                    for arg in node.value.args:
-                        if isinstance(arg, str):
-                            arg_value, _ = env.get_var(arg)
-                            args.append(arg_value)
-                        else:
-                            args.append(arg)
-                    if node.value.fn_name in env.stdlib:
-                        return env.stdlib[node.value.fn_name](*args)
-                    else:
-                        fn = env.get_fn(node.value.fn_name)
-                        local_env = Environment()
-                        local_env.stdlib = env.stdlib
-                        for (param_name, param_type), arg_value in zip(fn.params, args):
-                            local_env.set_var(param_name, arg_value, param_type)
-                        for stmt in fn.body:
-                            result = interpret([stmt], local_env)
-                            if result is not None:
-                                return result
-                        return 0
+                return call_expr(node.value, env)
             else:
                 return node.value
 
+# Closure compilation backend: each node is translated once into a Python
+# callable taking the Environment, so loop bodies skip isinstance dispatch and
+# re-parsing of conditions, literals and interpolation strings. Variables are
+# resolved to slots of the scope being compiled and read straight from
+# env.values.
+
+Compiled = Callable[[Environment], Any]
+
+def resolve_slots(body: List[Node], scope: Scope) -> Scope:
+    """Assign a slot in `scope` to every variable bound by `body`, recording its
+    declared type. Function bodies are left alone; they get their own scope."""
+    for node in body:
+        if isinstance(node, LetStmt):
+            scope.slot(node.name, node.type)
+        elif isinstance(node, AssignStmt):
+            scope.slot(node.name)
+        elif isinstance(node, SpawnStmt):
+            if node.var_name:
+                scope.slot(node.var_name, node.actor_name)
+        elif isinstance(node, ForStmt):
+            scope.slot(node.var, 'Int')
+            resolve_slots(node.body, scope)
+        elif isinstance(node, WhileStmt):
+            resolve_slots(node.body, scope)
+        elif isinstance(node, IfStmt):
+            resolve_slots(node.then_body, scope)
+            resolve_slots(node.else_body, scope)
+        elif isinstance(node, TryStmt):
+            resolve_slots(node.try_body, scope)
+            resolve_slots(node.catch_body, scope)
+    return scope
+
+def _compile_load(name: str, scope: Scope) -> Compiled:
+    slot = scope.slot(name)
+    def load(env):
+        value = env.values[slot]
+        if value is _UNBOUND:
+            raise RuntimeError(f"Undefined variable: {name}")
+        return value
+    return load
+
+def _compile_operand(arg: Union[str, int], scope: Scope) -> Compiled:
+    if isinstance(arg, str):
+        arg = arg.strip()
+        if not arg.isdigit():
+            return _compile_load(arg, scope)
+        arg = int(arg)
+    return lambda env, value=arg: value
+
+def _compile_call(call: CallExpr, scope: Scope) -> Compiled:
+    operands = [_compile_load(name, scope) if name is not None else (lambda env, value=value: value)
+                for name, value in call.operands]
+    fn_name = call.fn_name
+    if fn_name == 'identity':
+        return operands[0]
+    builtin = call.builtin
+    if builtin is not None:
+        return lambda env: builtin(*[operand(env) for operand in operands])
+    link = None
+    def call_linked(env):
+        nonlocal link
+        values = [operand(env) for operand in operands]
+        if not link_valid(link, env):
+            link = link_call(fn_name, env)
+        if link[2] is not None:
+            return link[2](*values)
+        return call_function(link[3], values, env, _run_compiled)
+    return call_linked
+
+def _run_compiled(fn: FnDecl, args: List[Any], env: Environment) -> Any:
+    if fn.compiled is None:
+        fn.compiled = _compile_block(fn.body, function_scope(fn))
+    result = fn.compiled(enter_frame(fn, args, env))
+    return 0 if result is None else result
+
+def _compile_condition(condition: str, scope: Scope) -> Compiled:
+    var, bound = condition.split('>')
+    load = _compile_operand(var, scope)
+    bound = int(bound)
+    return lambda env: load(env) > bound
+
+def _compile_say(node: SayStmt, scope: Scope) -> Compiled:
+    template = node.template
+    if not template.refs:
+        value = node.value
+        return lambda env: env.output.write(value)
+    pieces: List[Union[str, Compiled]] = [template.chunks[0]]
+    for ref, chunk in zip(template.refs, template.chunks[1:]):
+        pieces.append(_compile_load(ref, scope) if isinstance(ref, str) else _compile_call(ref, scope))
+        pieces.append(chunk)
+    def say(env):
+        env.output.write(''.join(piece if isinstance(piece, str) else format_value(piece(env)) for piece in pieces))
+    return say
+
+def _compile_node(node: Node, scope: Scope) -> Compiled:
+    if isinstance(node, LetStmt):
+        if node.value is None:
+            return lambda env: None
+        slot = scope.slot(node.name, node.type)
+        if isinstance(node.value, CallExpr):
+            call = _compile_call(node.value, scope)
+            def let(env):
+                env.values[slot] = call(env)
+        else:
+            value = node.value
+            def let(env):
+                env.values[slot] = value
+        return let
+    elif isinstance(node, AssignStmt):
+        slot = scope.slot(node.name)
+        operand = _compile_operand(node.value, scope)
+        if node.op == '+=':
+            load = _compile_load(node.name, scope)
+            def assign(env):
+                env.values[slot] = load(env) + operand(env)
+        else:
+            def assign(env):
+                env.values[slot] = operand(env)
+        return assign
+    elif isinstance(node, FnDecl):
+        return lambda env: env.set_fn(node)
+    elif isinstance(node, IfStmt):
+        test = _compile_condition(node.condition, scope)
+        then_body = _compile_block(node.then_body, scope)
+        else_body = _compile_block(node.else_body, scope)
+        return lambda env: then_body(env) if test(env) else else_body(env)
+    elif isinstance(node, ForStmt):
+        slot, start, end = scope.slot(node.var, 'Int'), node.start, node.end
+        body = _compile_block(node.body, scope)
+        def for_loop(env):
+            values = env.values
+            for i in range(start, end):
+                values[slot] = i
+                result = body(env)
+                if result is not None:
+                    return result
+        return for_loop
+    elif isinstance(node, WhileStmt):
+        test = _compile_condition(node.condition, scope)
+        body = _compile_block(node.body, scope)
+        def while_loop(env):
+            while test(env):
+                result = body(env)
+                if result is not None:
+                    return result
+        return while_loop
+    elif isinstance(node, TryStmt):
+        try_body = _compile_block(node.try_body, scope)
+        catch_body = _compile_block(node.catch_body, scope)
+        def try_catch(env):
+            try:
+                return try_body(env)
+            except (RuntimeError, ZeroDivisionError) as e:
+                if TRACER.level >= TRACE_INFO:
+                    TRACER.emit(TRACE_INFO, node, f"Caught exception: {e}")
+                return catch_body(env)
+        return try_catch
+    elif isinstance(node, SayStmt):
+        return _compile_say(node, scope)
+    elif isinstance(node, ActorDecl):
+        return lambda env: env.set_actor(node)
+    elif isinstance(node, SpawnStmt):
+        slot = scope.slot(node.var_name, node.actor_name) if node.var_name else None
+        def spawn(env):
+            instance = ActorInstance(env.get_actor(node.actor_name), env, node.capacity, node.overflow)
+            if slot is not None:
+                env.values[slot] = instance
+        return spawn
+    elif isinstance(node, SendStmt):
+        load = _compile_load(node.actor_var, scope)
+        if isinstance(node.msg, list):
+            messages = [_compile_operand(msg, scope) for msg in node.msg]
+            def send_many(env):
+                load(env).send_many([message(env) for message in messages])
+            return send_many
+        if isinstance(node.msg, CallExpr):
+            message = _compile_call(node.msg, scope)
+        else:
+            message = lambda env, msg=node.msg: msg
+        def send(env):
+            load(env).send(message(env))
+        return send
+    elif isinstance(node, ReturnStmt):
+        if isinstance(node.value, CallExpr):
+            return _compile_call(node.value, scope)
+        return lambda env, value=node.value: value
+    raise TypeError(f"Cannot compile node at line {node.line}: {type(node).__name__}")
+
+def _traced_step(step: Compiled, node: Node) -> Compiled:
+    def traced(env):
+        TRACER.emit(TRACE_NODE, node)
+        return step(env)
+    return traced
+
+def _compile_block(body: List[Node], scope: Scope) -> Compiled:
+    """Compile statements into one callable; a non-None result is a `return` value.
+
+    Node-level tracing and profiling are decided here, at compile time, so
+    untraced, unprofiled code carries no per-node check at all.
+    """
+    steps = tuple(_compile_node(node, scope) for node in body)
+    if TRACER.level >= TRACE_NODE:
+        steps = tuple(_traced_step(step, node) for step, node in zip(steps, body))
+    if PROFILER is not None:
+        steps = tuple(PROFILER.step(step, node.line) for step, node in zip(steps, body))
+    if len(steps) == 1:
+        return steps[0]
+    def block(env):
+        for step in steps:
+            result = step(env)
+            if result is not None:
+                return result
+    return block
+
+def compile_ast(ast: List[Node], scope: Optional[Scope] = None) -> Compiled:
+    """Compile a parsed program into a callable that executes it against an Environment.
+
+    Variables are resolved to slots of `scope` (a fresh one by default); the
+    Environment is switched onto that scope before the program runs.
+    """
+    scope = resolve_slots(ast, scope if scope is not None else Scope())
+    block = _compile_block(ast, scope)
+    def program(env):
+        env.use_scope(scope)
+        return block(env)
+    return program
+
+# Bytecode backend: a stack machine whose instructions are (opcode, arg) pairs
+# packed into an array('l'). Variables live in per-frame slot lists; names and
+# declared types are kept in side tables on the CodeObject.
+
+BYTECODE_VERSION = 5
+BYTECODE_MAGIC = b'NEXC'
+
+OPNAMES = [
+    'LOAD_CONST', 'LOAD_VAR', 'STORE_VAR', 'POP_TOP', 'BINARY_ADD', 'COMPARE_GT',
+    'JUMP', 'POP_JUMP_IF_FALSE', 'GET_RANGE', 'FOR_ITER', 'CALL', 'RETURN_VALUE',
+    'BUILD_STRING', 'SAY', 'SET_FN', 'SET_ACTOR', 'SPAWN', 'SEND', 'SETUP_TRY', 'POP_TRY',
+    'SEND_MANY',
+]
+(LOAD_CONST, LOAD_VAR, STORE_VAR, POP_TOP, BINARY_ADD, COMPARE_GT,
+ JUMP, POP_JUMP_IF_FALSE, GET_RANGE, FOR_ITER, CALL, RETURN_VALUE,
+ BUILD_STRING, SAY, SET_FN, SET_ACTOR, SPAWN, SEND, SETUP_TRY, POP_TRY,
+ SEND_MANY) = range(len(OPNAMES))
+
+# CALL packs the callee's constant index and the argument count into one arg.
+_ARGC_BITS = 8
+
+@dataclass
+class CodeObject:
+    name: str
+    code: array = field(default_factory=lambda: array('l'))
+    lines: array = field(default_factory=lambda: array('l'))
+    consts: List[Any] = field(default_factory=list)
+    names: List[str] = field(default_factory=list)
+    types: List[str] = field(default_factory=list)
+    nparams: int = 0
+    # Inline caches of CALL targets, by instruction argument (see link_call()).
+    links: Dict[int, tuple] = field(default_factory=dict, repr=False, compare=False)
+
+    def __getstate__(self):
+        return {**self.__dict__, 'links': {}}
+
+class _BytecodeCompiler:
+    def __init__(self, name: str, params: List[tuple[str, str]] = ()):
+        self.co = CodeObject(name=name, nparams=len(params))
+        self.slots: Dict[str, int] = {}
+        # Constant pool index: (type, value) for hashable constants, so 1 and
+        # True stay apart, and (type, id) for nodes, which only compare deeply.
+        self.const_index: Dict[tuple, int] = {}
+        for param_name, param_type in params:
+            self.slot(param_name, param_type)
+
+    def emit(self, op: int, arg: int = 0, line: int = 0) -> int:
+        self.co.code.extend((op, arg))
+        self.co.lines.append(line)
+        return len(self.co.code) - 2
+
+    def patch(self, offset: int, target: Optional[int] = None):
+        self.co.code[offset + 1] = len(self.co.code) if target is None else target
+
+    def const(self, value: Any) -> int:
+        try:
+            key = (type(value), value)
+            index = self.const_index.get(key)
+        except TypeError:
+            key = (type(value), id(value))
+            index = self.const_index.get(key)
+        if index is None:
+            index = self.const_index[key] = len(self.co.consts)
+            self.co.consts.append(value)
+        return index
+
+    def slot(self, name: str, type_: Optional[str] = None) -> int:
+        if name not in self.slots:
+            self.slots[name] = len(self.co.names)
+            self.co.names.append(name)
+            self.co.types.append(type_ or 'Int')
+        elif type_ is not None:
+            self.co.types[self.slots[name]] = type_
+        return self.slots[name]
+
+    def operand(self, arg: Union[str, int], line: int):
+        if isinstance(arg, str):
+            arg = arg.strip()
+            if not arg.isdigit():
+                self.emit(LOAD_VAR, self.slot(arg), line)
+                return
+            arg = int(arg)
+        self.emit(LOAD_CONST, self.const(arg), line)
+
+    def call(self, fn_name: str, args: List[Union[str, int]], line: int):
+        if fn_name == 'identity':
+            self.operand(str(args[0]), line)
+            return
+        for arg in args:
+            self.operand(arg, line)
+        self.emit(CALL, (self.const(fn_name) << _ARGC_BITS) | len(args), line)
+
+    def condition(self, condition: str, line: int) -> int:
+        var, bound = condition.split('>')
+        self.operand(var, line)
+        self.emit(LOAD_CONST, self.const(int(bound)), line)
+        self.emit(COMPARE_GT, 0, line)
+        return self.emit(POP_JUMP_IF_FALSE, 0, line)
+
+    def say(self, template: SayTemplate, line: int):
+        self.emit(LOAD_CONST, self.const(template.chunks[0]), line)
+        if not template.refs:
+            self.emit(SAY, 0, line)
+            return
+        for ref, chunk in zip(template.refs, template.chunks[1:]):
+            if isinstance(ref, str):
+                self.operand(ref, line)
+            else:
+                self.call(ref.fn_name, ref.args, line)
+            self.emit(LOAD_CONST, self.const(chunk), line)
+        self.emit(BUILD_STRING, 2 * len(template.refs) + 1, line)
+        self.emit(SAY, 0, line)
+
+    def block(self, body: List[Node]):
+        for node in body:
+            self.node(node)
+
+    def node(self, node: Node):
+        line = node.line
+        if isinstance(node, LetStmt):
+            if node.value is None:
+                return
+            if isinstance(node.value, CallExpr):
+                self.call(node.value.fn_name, node.value.args, line)
+            else:
+                self.emit(LOAD_CONST, self.const(node.value), line)
+            self.emit(STORE_VAR, self.slot(node.name, node.type), line)
+        elif isinstance(node, AssignStmt):
+            if node.op == '+=':
+                self.operand(node.name, line)
+                self.operand(node.value, line)
+                self.emit(BINARY_ADD, 0, line)
+            else:
+                self.operand(node.value, line)
+            self.emit(STORE_VAR, self.slot(node.name), line)
+        elif isinstance(node, FnDecl):
+            # Declarations inside a block take effect where they run, as in the
+            # tree walker; top-level ones are hoisted by compile_bytecode().
+            _compile_fn_bytecode(node)
+            self.emit(SET_FN, self.const(node), line)
+        elif isinstance(node, ActorDecl):
+            self.emit(SET_ACTOR, self.const(node), line)
+        elif isinstance(node, IfStmt):
+            skip_then = self.condition(node.condition, line)
+            self.block(node.then_body)
+            if node.else_body:
+                skip_else = self.emit(JUMP, 0, line)
+                self.patch(skip_then)
+                self.block(node.else_body)
+                self.patch(skip_else)
+            else:
+                self.patch(skip_then)
+        elif isinstance(node, ForStmt):
+            self.emit(GET_RANGE, self.const((node.start, node.end)), line)
+            loop = self.emit(FOR_ITER, 0, line)
+            self.emit(STORE_VAR, self.slot(node.var), line)
+            self.block(node.body)
+            self.emit(JUMP, loop, line)
+            self.patch(loop)
+        elif isinstance(node, WhileStmt):
+            loop = len(self.co.code)
+            exit_jump = self.condition(node.condition, line)
+            self.block(node.body)
+            self.emit(JUMP, loop, line)
+            self.patch(exit_jump)
+        elif isinstance(node, TryStmt):
+            setup = self.emit(SETUP_TRY, 0, line)
+            self.block(node.try_body)
+            self.emit(POP_TRY, 0, line)
+            skip_catch = self.emit(JUMP, 0, line)
+            self.patch(setup)
+            self.block(node.catch_body)
+            self.patch(skip_catch)
+        elif isinstance(node, SayStmt):
+            self.say(node.template, line)
+        elif isinstance(node, SpawnStmt):
+            self.emit(SPAWN, self.const((node.actor_name, node.capacity, node.overflow)), line)
+            if node.var_name:
+                self.emit(STORE_VAR, self.slot(node.var_name, node.actor_name), line)
+            else:
+                self.emit(POP_TOP, 0, line)
+        elif isinstance(node, SendStmt):
+            self.operand(node.actor_var, line)
+            if isinstance(node.msg, list):
+                for msg in node.msg:
+                    self.operand(msg, line)
+                self.emit(SEND_MANY, len(node.msg), line)
+                return
+            if isinstance(node.msg, CallExpr):
+                self.call(node.msg.fn_name, node.msg.args, line)
+            else:
+                self.emit(LOAD_CONST, self.const(node.msg), line)
+            self.emit(SEND, 0, line)
+        elif isinstance(node, ReturnStmt):
+            if isinstance(node.value, CallExpr):
+                self.call(node.value.fn_name, node.value.args, line)
+            else:
+                self.emit(LOAD_CONST, self.const(node.value), line)
+            self.emit(RETURN_VALUE, 0, line)
+        else:
+            raise TypeError(f"Cannot compile node at line {line}: {type(node).__name__}")
+
+    def finish(self) -> CodeObject:
+        self.emit(LOAD_CONST, self.const(None))
+        self.emit(RETURN_VALUE)
+        return self.co
+
+def _compile_fn_bytecode(fn: FnDecl) -> CodeObject:
+    compiler = _BytecodeCompiler(fn.name, fn.params)
+    compiler.block(fn.body)
+    fn.bytecode = compiler.finish()
+    return fn.bytecode
+
+def compile_bytecode(ast: List[Node], name: str = '<module>') -> CodeObject:
+    """Compile a program to bytecode. Function and actor declarations are hoisted
+    to the start, the same way type_check() registers them before execution."""
+    compiler = _BytecodeCompiler(name)
+    for node in ast:
+        if isinstance(node, FnDecl):
+            _compile_fn_bytecode(node)
+            compiler.emit(SET_FN, compiler.const(node), node.line)
+        elif isinstance(node, ActorDecl):
+            compiler.emit(SET_ACTOR, compiler.const(node), node.line)
+    compiler.block([node for node in ast if not isinstance(node, (FnDecl, ActorDecl))])
+    return compiler.finish()
+
+def _sync_vars(co: CodeObject, slots: List[Any], env: Environment):
+    for name, type_, value in zip(co.names, co.types, slots):
+        if value is not _UNBOUND:
+            env.set_var(name, value, type_)
+
+def _run_bytecode_fn(fn: FnDecl, args: List[Any], env: Environment) -> Any:
+    co = fn.bytecode or _compile_fn_bytecode(fn)
+    slots = args + [_UNBOUND] * (len(co.names) - len(args))
+    result = _run_frame(co, slots, env, False)
+    return 0 if result is None else result
+
+def _run_frame(co: CodeObject, slots: List[Any], env: Environment, module: bool) -> Any:
+    code, consts, names, links = co.code, co.consts, co.names, co.links
+    stack: List[Any] = []
+    push, pop = stack.append, stack.pop
+    handlers: List[tuple[int, int]] = []
+    pc = 0
+    while True:
+        try:
+            while True:
+                op = code[pc]
+                arg = code[pc + 1]
+                pc += 2
+                if op == LOAD_VAR:
+                    value = slots[arg]
+                    if value is _UNBOUND:
+                        raise RuntimeError(f"Undefined variable: {names[arg]}")
+                    push(value)
+                elif op == LOAD_CONST:
+                    push(consts[arg])
+                elif op == STORE_VAR:
+                    slots[arg] = pop()
+                elif op == BINARY_ADD:
+                    right = pop()
+                    stack[-1] = stack[-1] + right
+                elif op == COMPARE_GT:
+                    right = pop()
+                    stack[-1] = stack[-1] > right
+                elif op == POP_JUMP_IF_FALSE:
+                    if not pop():
+                        pc = arg
+                elif op == JUMP:
+                    pc = arg
+                elif op == FOR_ITER:
+                    value = next(stack[-1], _UNBOUND)
+                    if value is _UNBOUND:
+                        pop()
+                        pc = arg
+                    else:
+                        push(value)
+                elif op == GET_RANGE:
+                    push(iter(range(*consts[arg])))
+                elif op == CALL:
+                    argc = arg & ((1 << _ARGC_BITS) - 1)
+                    args = stack[len(stack) - argc:]
+                    del stack[len(stack) - argc:]
+                    link = links.get(arg)
+                    if not link_valid(link, env):
+                        link = links[arg] = link_call(consts[arg >> _ARGC_BITS], env)
+                    if link[2] is not None:
+                        push(link[2](*args))
+                    else:
+                        push(call_function(link[3], args, env, _run_bytecode_fn))
+                elif op == RETURN_VALUE:
+                    if module:
+                        _sync_vars(co, slots, env)
+                    return pop()
+                elif op == BUILD_STRING:
+                    parts = stack[len(stack) - arg:]
+                    del stack[len(stack) - arg:]
+                    push(''.join(map(format_value, parts)))
+                elif op == SAY:
+                    env.output.write(str(pop()))
+                elif op == POP_TOP:
+                    pop()
+                elif op == SETUP_TRY:
+                    handlers.append((arg, len(stack)))
+                elif op == POP_TRY:
+                    handlers.pop()
+                elif op == SET_FN:
+                    env.set_fn(consts[arg])
+                elif op == SET_ACTOR:
+                    env.set_actor(consts[arg])
+                elif op == SPAWN:
+                    if module:
+                        _sync_vars(co, slots, env)
+                    actor_name, capacity, overflow = consts[arg]
+                    push(ActorInstance(env.get_actor(actor_name), env, capacity, overflow))
+                elif op == SEND:
+                    if module:
+                        _sync_vars(co, slots, env)
+                    message = pop()
+                    pop().send(message)
+                elif op == SEND_MANY:
+                    if module:
+                        _sync_vars(co, slots, env)
+                    messages = stack[len(stack) - arg:]
+                    del stack[len(stack) - arg:]
+                    pop().send_many(messages)
+                else:
+                    raise RuntimeError(f"Bad opcode {op} at offset {pc - 2}")
+        except (RuntimeError, ZeroDivisionError) as e:
+            if not handlers:
+                if module:
+                    _sync_vars(co, slots, env)
+                raise
+            if TRACER.level >= TRACE_INFO:
+                TRACER.emit(TRACE_INFO, None, f"Caught exception: {e}", line=co.lines[(pc - 2) // 2])
+            pc, depth = handlers.pop()
+            del stack[depth:]
+
+def run_bytecode(co: CodeObject, env: Environment) -> Any:
+    """Execute a module CodeObject; variables already in env are visible to it and
+    its variables are written back to env when it finishes."""
+    slots = [env.lookup(name) for name in co.names]
+    return _run_frame(co, slots, env, True)
+
+def disassemble(co: CodeObject) -> str:
+    """Render a CodeObject (and the bytecode of any functions it declares) as text."""
+    lines = [f"Disassembly of {co.name} ({len(co.names)} slots, {len(co.code) // 2} instructions):"]
+    nested = []
+    for index in range(0, len(co.code), 2):
+        op, arg = co.code[index], co.code[index + 1]
+        detail = ''
+        if op in (LOAD_CONST, GET_RANGE, SPAWN):
+            detail = repr(co.consts[arg])
+        elif op in (SET_FN, SET_ACTOR):
+            detail = co.consts[arg].name
+            if op == SET_FN:
+                nested.append(co.consts[arg].bytecode)
+        elif op in (LOAD_VAR, STORE_VAR):
+            detail = f"{co.names[arg]}: {co.types[arg]}"
+        elif op == CALL:
+            detail = f"{co.consts[arg >> _ARGC_BITS]}/{arg & ((1 << _ARGC_BITS) - 1)}"
+        elif op in (JUMP, POP_JUMP_IF_FALSE, FOR_ITER, SETUP_TRY):
+            detail = f"to {arg}"
+        lines.append(f"{co.lines[index // 2]:>5} {index:>6} {OPNAMES[op]:<18} {arg:>5}  {detail}".rstrip())
+    for fn_co in nested:
+        if fn_co is not None:
+            lines.append('')
+            lines.append(disassemble(fn_co))
+    return '\n'.join(lines)
+
+def _source_digest(source: bytes, optimize: bool = False) -> str:
+    return hashlib.sha256(source + f"\0{__version__}\0{BYTECODE_VERSION}\0{int(optimize)}".encode()).hexdigest()
+
+def load_bytecode(path: str, use_cache: bool = True, optimize: bool = False) -> CodeObject:
+    """Compile a source file, reusing `<path>c` (e.g. foo.nexac) when it was written
+    for the same source hash, interpreter version, bytecode format and optimizer setting."""
+    with open(path, 'rb') as f:
+        source = f.read()
+    digest = _source_digest(source, optimize)
+    cache_path = path + 'c'
+    if use_cache:
+        try:
+            with open(cache_path, 'rb') as f:
+                if f.read(len(BYTECODE_MAGIC)) == BYTECODE_MAGIC:
+                    cached_digest, co = pickle.load(f)
+                    if cached_digest == digest:
+                        return co
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError, AttributeError):
+            pass
+    ast = parse(tokenize(source.decode('utf-8')))
+    type_check(ast, Environment())
+    if optimize:
+        ast = optimize_ast(ast)
+    co = compile_bytecode(ast, name=os.path.basename(path))
+    if use_cache:
+        try:
+            with open(cache_path, 'wb') as f:
+                f.write(BYTECODE_MAGIC)
+                pickle.dump((digest, co), f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            pass
+    return co
+
+# AST cache: parsed (and optionally optimized) programs keyed by a hash of the
+# source text, so running the same script again skips tokenize() and parse().
+# Entries live in an in-process LRU and, optionally, in a directory of
+# zlib-compressed pickles shared between processes. The key covers the
+# interpreter and AST_CACHE_VERSION, so a format change never reads stale trees.
+
+AST_CACHE_VERSION = 1
+AST_CACHE_MAGIC = b'NEXA'
+AST_CACHE_SIZE = 128
+AST_CACHE_DISK_BYTES = 64 * 1024 * 1024
+
+class AstCache:
+    """Cached syntax trees for run_nexa(). Trees are shared between runs, so
+    per-function compile caches (closures, bytecode) are reused too; while
+    a profiler or node tracing is active the cache is bypassed, since code
+    compiled then is instrumented."""
+    def __init__(self, maxsize: int = AST_CACHE_SIZE, directory: Optional[str] = None,
+                 max_disk_bytes: int = AST_CACHE_DISK_BYTES):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.saved = 0.0
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(code: str, optimize: bool) -> str:
+        return hashlib.sha256(f"{__version__}\0{AST_CACHE_VERSION}\0{int(optimize)}\0{code}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.nexaast')
+
+    def get(self, code: str, optimize: bool) -> Optional[tuple[List[Node], List[Node]]]:
+        """(checked, runnable) trees for `code`, or None on a miss."""
+        if PROFILER is not None or TRACER.level >= TRACE_NODE:
+            return None
+        start = time.perf_counter()
+        key = self.key(code, optimize)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        if entry is None and self.directory is not None:
+            entry = self._read(key)
+            if entry is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, entry)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.saved += max(entry[2] - (time.perf_counter() - start), 0.0)
+        return entry[0], entry[1]
+
+    def put(self, code: str, optimize: bool, checked: List[Node], ast: List[Node], cost: float):
+        """Store trees that parsed and type-checked in `cost` seconds."""
+        if PROFILER is not None or TRACER.level >= TRACE_NODE:
+            return
+        key = self.key(code, optimize)
+        entry = (checked, ast, cost)
+        if self.directory is not None:
+            self._write(key, entry)
+        with self._lock:
+            self._remember(key, entry)
+
+    def _remember(self, key: str, entry: tuple):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def _read(self, key: str) -> Optional[tuple]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                if f.read(len(AST_CACHE_MAGIC)) != AST_CACHE_MAGIC:
+                    return None
+                entry = pickle.loads(zlib.decompress(f.read()))
+            os.utime(path)
+            return entry
+        except (OSError, EOFError, zlib.error, pickle.UnpicklingError, ValueError, TypeError, AttributeError):
+            return None
+
+    def _write(self, key: str, entry: tuple):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(AST_CACHE_MAGIC)
+                f.write(zlib.compress(pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)))
+            os.replace(tmp, path)
+        except (OSError, pickle.PicklingError):
+            return
+        self._trim_disk()
+
+    def _trim_disk(self):
+        """Delete the least recently used files until the directory fits max_disk_bytes."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.nexaast'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.disk_evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'saved_seconds': self.saved, 'size': len(self.entries), 'maxsize': self.maxsize,
+                'evictions': self.evictions, 'disk_evictions': self.disk_evictions}
+
 def repl():
     env = Environment()
-    print("NexaLang REPL v0.1")
+    print(f"NexaLang REPL v{__version__}")
     print("Type 'exit' to quit")
     while True:
         try:
@@ -593,28 +3121,326 @@ def repl():
                 break
             tokens = tokenize(code)
             ast = parse(tokens)
-            type_check(ast, env)
+            type_check(ast, env, partial=True)
             interpret(ast, env)
         except Exception as e:
             print(f"Error: {e}")
 
-def run_nexa(code: str):
+ENGINES = ('tree', 'closure', 'vm')
+
+def execute(ast: List[Node], env: Environment, engine: str = 'tree'):
+    """Run already type-checked nodes with the selected execution engine."""
+    if engine == 'tree':
+        return interpret(ast, env)
+    elif engine == 'closure':
+        return compile_ast(ast, env.scope)(env)
+    elif engine == 'vm':
+        return run_bytecode(compile_bytecode(ast), env)
+    raise ValueError(f"Unknown engine: {engine} (expected one of {', '.join(ENGINES)})")
+
+def program_env(output: Optional[OutputChannel] = None, actor_runtime: str = 'thread',
+                actor_workers: int = ACTOR_POOL_WORKERS, actor_placement: str = 'round_robin') -> Environment:
+    """A fresh root environment writing to `output` (block-buffered stdout by
+    default) and spawning actors with the given runtime."""
+    if actor_runtime not in ACTOR_RUNTIMES:
+        raise ValueError(f"Unknown actor runtime: {actor_runtime} (expected one of {', '.join(ACTOR_RUNTIMES)})")
+    env = Environment()
+    env.output = output if output is not None else OutputChannel(buffer_lines=OUTPUT_BUFFER_LINES)
+    if actor_runtime == 'pool':
+        env.scheduler = ActorScheduler(actor_workers)
+    elif actor_runtime == 'asyncio':
+        env.scheduler = AsyncActorScheduler()
+    elif actor_runtime == 'process':
+        env.scheduler = ProcessActorScheduler(actor_workers, actor_placement)
+    return env
+
+def finish_program(env: Environment):
+    """Let pooled or process-hosted actors drain their mailboxes, stop the
+    workers and flush output."""
+    if env.scheduler is not None:
+        env.scheduler.join()
+        env.scheduler.shutdown()
+    env.output.flush()
+
+def _source_steps(code: Source, engine: str, optimize: bool,
+                  ast_cache: Optional[AstCache] = None) -> Callable[[Environment], Iterator[None]]:
+    """Check and execute `code`, yielding after each streamed top-level statement."""
+    def steps(env: Environment) -> Iterator[None]:
+        if isinstance(code, str):
+            cached = ast_cache.get(code, optimize) if ast_cache is not None else None
+            if cached is not None:
+                # type_check() still runs: it declares the program's functions and actors in env.
+                checked, ast = cached
+                type_check(checked, env)
+            else:
+                start = time.perf_counter()
+                checked = parse(tokenize(code))
+                cost = time.perf_counter() - start
+                type_check(checked, env)
+                start = time.perf_counter()
+                ast = optimize_ast(checked) if optimize else checked
+                if ast_cache is not None:
+                    ast_cache.put(code, optimize, checked, ast, cost + time.perf_counter() - start)
+            execute(ast, env, engine)
+        else:
+            folder = ConstantFolder() if optimize else None
+            for node in iter_parse(iter_tokens(code)):
+                type_check([node], env, partial=True)
+                execute(folder.block([node]) if folder else [node], env, engine)
+                yield
+    return steps
+
+def _run_program(steps: Callable[[Environment], Iterator[None]], output: Optional[OutputChannel],
+                 actor_runtime: str, actor_workers: int, actor_placement: str,
+                 metrics_file: Optional[str] = None, metrics_interval: float = 5.0,
+                 profiler: Optional[Profiler] = None):
+    env = program_env(output, actor_runtime, actor_workers, actor_placement)
+    dumper = MetricsDumper(env, metrics_file, metrics_interval) if metrics_file else None
+    previous = configure_profiling(profiler) if profiler is not None else None
+    try:
+        if actor_runtime == 'asyncio':
+            asyncio.run(_run_program_async(steps, env))
+            return
+        try:
+            try:
+                for _ in steps(env):
+                    pass
+            finally:
+                finish_program(env)
+        except Exception as e:
+            print(f"Error: {e}")
+    finally:
+        if profiler is not None:
+            configure_profiling(previous)
+        if dumper is not None:
+            dumper.stop()
+
+async def _run_program_async(steps: Callable[[Environment], Iterator[None]], env: Environment):
     try:
-        tokens = tokenize(code)
-        ast = parse(tokens)
-        env = Environment()
-        type_check(ast, env)
-        interpret(ast, env)
+        try:
+            for _ in steps(env):
+                await asyncio.sleep(0)
+        finally:
+            await env.scheduler.drain()
+            env.output.flush()
     except Exception as e:
         print(f"Error: {e}")
 
+def run_nexa(code: Source, engine: str = 'tree', optimize: bool = False, output: Optional[OutputChannel] = None,
+             actor_runtime: str = 'thread', actor_workers: int = ACTOR_POOL_WORKERS,
+             actor_placement: str = 'round_robin', metrics_file: Optional[str] = None,
+             metrics_interval: float = 5.0, profiler: Optional[Profiler] = None,
+             ast_cache: Optional[AstCache] = None):
+    """Run a program given as a string, or stream it from a file handle / line iterator.
+
+    Streamed programs are checked and executed one top-level statement at a
+    time, so functions and actors must be declared before they are used.
+    `engine` selects the tree walker ('tree'), the closure compiler ('closure')
+    or the bytecode VM ('vm'); `optimize` runs optimize_ast() before execution.
+    `say` output goes to `output`, which is flushed when the program ends.
+    `actor_runtime` is 'thread' (one thread per actor), 'pool' (actors
+    multiplexed onto `actor_workers` threads), 'asyncio' (actors as tasks on
+    a new event loop) or 'process' (actors spread over `actor_workers`
+    processes by `actor_placement`); all but 'thread' drain every mailbox
+    before returning. With `metrics_file`, actor_metrics() is written there as
+    JSON every `metrics_interval` seconds and when the program ends. With
+    `profiler`, the run's line and function timings are collected into it.
+    With `ast_cache`, a program string seen before skips tokenize() and parse().
+    """
+    _run_program(_source_steps(code, engine, optimize, ast_cache), output, actor_runtime, actor_workers, actor_placement,
+                 metrics_file, metrics_interval, profiler)
+
+async def run_nexa_async(code: Source, engine: str = 'tree', optimize: bool = False,
+                         output: Optional[OutputChannel] = None):
+    """run_nexa() with the 'asyncio' actor runtime, on the caller's running
+    event loop. Streamed programs yield to the loop between statements."""
+    await _run_program_async(_source_steps(code, engine, optimize), program_env(output, 'asyncio'))
+
+def run_nexa_file(path: str, engine: str = 'tree', use_cache: bool = True, optimize: bool = False,
+                  output: Optional[OutputChannel] = None, actor_runtime: str = 'thread',
+                  actor_workers: int = ACTOR_POOL_WORKERS, actor_placement: str = 'round_robin',
+                  metrics_file: Optional[str] = None, metrics_interval: float = 5.0,
+                  profiler: Optional[Profiler] = None, ast_cache: Optional[AstCache] = None,
+                  stream: bool = False):
+    """Run a source file. The 'vm' engine goes through the .nexac bytecode cache;
+    the other engines read the file whole, like run_nexa() on a string. With
+    `stream` (and no `ast_cache`), they check and execute it one top-level
+    statement at a time instead, so declarations must come before their uses."""
+    if engine != 'vm':
+        with open(path, 'r') as f:
+            run_nexa(f if stream and ast_cache is None else f.read(), engine=engine, optimize=optimize, output=output,
+                     actor_runtime=actor_runtime, actor_workers=actor_workers, actor_placement=actor_placement,
+                     metrics_file=metrics_file, metrics_interval=metrics_interval, profiler=profiler,
+                     ast_cache=ast_cache)
+        return
+    def steps(env: Environment) -> Iterator[None]:
+        run_bytecode(load_bytecode(path, use_cache, optimize), env)
+        yield
+    _run_program(steps, output, actor_runtime, actor_workers, actor_placement, metrics_file, metrics_interval, profiler)
+
+@dataclass
+class RunResult:
+    """What one Interpreter.run() produced: the top-level `return` value (if
+    any), the program's plain variables, its say lines, and the error that
+    stopped it, as text."""
+    value: Any = None
+    variables: Dict[str, Any] = field(default_factory=dict)
+    output: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+BATCH_EXECUTORS = ('serial', 'thread', 'process')
+
+class Interpreter:
+    """A program loaded once and run many times.
+
+    Parsing, type checking, slot layout and compilation (closures for the
+    'closure' engine, bytecode for 'vm') happen in the constructor, so run()
+    only builds a fresh environment, binds `inputs` and executes. Each input
+    is declared up front with its type (`{'n': 'Int'}`), which lets the
+    checker accept the program before any values exist. Functions, actors and
+    memo caches are shared by every run; variables and output are not.
+    """
+    def __init__(self, code: str, inputs: Optional[Dict[str, str]] = None, engine: str = 'closure',
+                 optimize: bool = False, actor_runtime: str = 'thread', actor_workers: int = ACTOR_POOL_WORKERS):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine} (expected one of {', '.join(ENGINES)})")
+        if actor_runtime == 'asyncio':
+            raise ValueError("Interpreter runs programs synchronously; use run_nexa_async() for the asyncio runtime")
+        self.code = code
+        self.inputs = dict(inputs or {})
+        self.engine = engine
+        self.optimize = optimize
+        self.actor_runtime = actor_runtime
+        self.actor_workers = actor_workers
+        self.scope = Scope(self.inputs.items())
+        self.env = Environment(self.scope)
+        ast = parse(tokenize(code))
+        type_check(ast, self.env)
+        self.ast = optimize_ast(ast) if optimize else ast
+        if self.ast is not ast:
+            # Runs declare the optimized copies; bind them now, so the first
+            # run (maybe several at once) does not rebind every function.
+            for node in self.ast:
+                if isinstance(node, FnDecl):
+                    self.env.set_fn(node)
+                elif isinstance(node, ActorDecl):
+                    self.env.set_actor(node)
+        resolve_slots(self.ast, self.scope)
+        if engine == 'closure':
+            self._program = compile_ast(self.ast, self.scope)
+            for fn in self.env.fns.values():
+                if fn.compiled is None:
+                    fn.compiled = _compile_block(fn.body, function_scope(fn))
+        elif engine == 'vm':
+            self._program = compile_bytecode(self.ast)
+
+    def run(self, bindings: Optional[Dict[str, Any]] = None) -> RunResult:
+        """Execute the program with `bindings` for its declared inputs."""
+        start = time.perf_counter()
+        output = OutputChannel(capture=True)
+        env = program_env(output, self.actor_runtime, self.actor_workers)
+        env.use_scope(self.scope)
+        base = self.env
+        env.fns, env.actors, env.stdlib = base.fns, base.actors, base.stdlib
+        env.memo, env.memo_options = base.memo, base.memo_options
+        if bindings:
+            for name, value in bindings.items():
+                if name not in self.inputs:
+                    raise ValueError(f"Unknown input: {name} (declared: {', '.join(self.inputs) or 'none'})")
+                env.values[self.scope.slots[name]] = value
+        result = RunResult(output=output.lines)
+        try:
+            try:
+                if self.engine == 'tree':
+                    result.value = interpret(self.ast, env)
+                elif self.engine == 'closure':
+                    result.value = self._program(env)
+                else:
+                    result.value = run_bytecode(self._program, env)
+            finally:
+                finish_program(env)
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+        result.variables = {name: value for name, value in zip(env.scope.names, env.values)
+                            if value is not _UNBOUND and not isinstance(value, ActorInstance)}
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def run_batch(self, inputs: Iterable[Optional[Dict[str, Any]]], executor: str = 'serial',
+                  workers: Optional[int] = None) -> List[RunResult]:
+        """run() once per set of bindings, results in input order. 'thread'
+        shares this interpreter across a thread pool; 'process' loads the
+        program once in each of `workers` processes and suits CPU-bound
+        programs, whose results must then be picklable."""
+        if executor not in BATCH_EXECUTORS:
+            raise ValueError(f"Unknown batch executor: {executor} (expected one of {', '.join(BATCH_EXECUTORS)})")
+        inputs = list(inputs)
+        if executor == 'serial' or len(inputs) <= 1:
+            return [self.run(bindings) for bindings in inputs]
+        import concurrent.futures
+        if executor == 'thread':
+            with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+                return list(pool.map(self.run, inputs))
+        workers = workers or os.cpu_count() or 1
+        spec = (self.code, self.inputs, self.engine, self.optimize, self.actor_runtime, self.actor_workers)
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=_load_batch_worker, initargs=spec) as pool:
+            return list(pool.map(_run_batch_input, inputs, chunksize=max(1, len(inputs) // (workers * 4))))
+
+_batch_interpreter: Optional[Interpreter] = None
+
+def _load_batch_worker(*spec):
+    global _batch_interpreter
+    _batch_interpreter = Interpreter(*spec)
+
+def _run_batch_input(bindings: Optional[Dict[str, Any]]) -> RunResult:
+    return _batch_interpreter.run(bindings)
+
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) > 1:
-        with open(sys.argv[1], 'r') as f:
-            code = f.read()
-        print(f"Executing file: {sys.argv[1]}")
-        run_nexa(code)
+    import argparse
+    cli = argparse.ArgumentParser(prog='nexa', description='Run a NexaLang program.')
+    cli.add_argument('file', nargs='?', help='source file to execute')
+    cli.add_argument('--engine', choices=ENGINES, default='tree', help='execution engine')
+    cli.add_argument('--no-cache', action='store_true', help='do not read or write .nexac bytecode caches')
+    cli.add_argument('--dis', action='store_true', help='print the bytecode for FILE instead of running it')
+    cli.add_argument('-O', '--optimize', action='store_true', help='fold constants, drop dead branches and unroll small loops')
+    cli.add_argument('--dump-ast', action='store_true', help='print the (optimized, with -O) AST for FILE instead of running it')
+    cli.add_argument('--trace', choices=TRACE_LEVELS, default='off', help='diagnostic trace level')
+    cli.add_argument('--trace-file', help='append trace events to this file instead of stderr')
+    cli.add_argument('--raw-output', action='store_true', help='print say output without the "Output: " prefix')
+    cli.add_argument('--actors', choices=ACTOR_RUNTIMES, default='thread', help='actor runtime: a thread per actor, a shared worker pool, asyncio tasks, or worker processes')
+    cli.add_argument('--actor-workers', type=int, default=ACTOR_POOL_WORKERS, help='worker threads or processes for --actors pool/process')
+    cli.add_argument('--metrics-file', help='write actor metrics as JSON to this file while the program runs')
+    cli.add_argument('--metrics-interval', type=float, default=5.0, help='seconds between --metrics-file dumps')
+    cli.add_argument('--placement', choices=ACTOR_PLACEMENTS, default='round_robin', help='how --actors process assigns actors to workers')
+    cli.add_argument('--unbuffered', action='store_true', help='write each say line immediately instead of in blocks')
+    cli.add_argument('--stream', action='store_true', help='execute FILE statement by statement as it is read (not with --engine vm)')
+    cli.add_argument('--ast-cache', metavar='DIR', help='reuse parsed programs from this directory (not with --engine vm, which uses .nexac)')
+    cli.add_argument('--profile', action='store_true', help='print the hottest lines and functions to stderr after the run')
+    cli.add_argument('--profile-top', type=int, default=10, help='how many lines and functions --profile reports')
+    cli.add_argument('--profile-out', help='write function timings to this file in pstats format')
+    cli.add_argument('--profile-collapsed', help='write collapsed stacks (flame graph input) to this file')
+    args = cli.parse_args()
+    configure_tracing(args.trace, [FileSink(args.trace_file)] if args.trace_file else None)
+    output = OutputChannel(buffer_lines=0 if args.unbuffered else OUTPUT_BUFFER_LINES, raw=args.raw_output)
+    profiling = args.profile or args.profile_out or args.profile_collapsed
+    profiler = Profiler(args.file or '<nexa>') if profiling else None
+    if args.dis and args.file:
+        print(disassemble(load_bytecode(args.file, use_cache=not args.no_cache, optimize=args.optimize)))
+    elif args.dump_ast and args.file:
+        with open(args.file, 'r') as f:
+            ast = parse(tokenize(f.read()))
+        print(format_ast(optimize_ast(ast) if args.optimize else ast))
+    elif args.file:
+        print(f"Executing file: {args.file}")
+        run_nexa_file(args.file, engine=args.engine, use_cache=not args.no_cache, optimize=args.optimize, output=output,
+                      actor_runtime=args.actors, actor_workers=args.actor_workers, actor_placement=args.placement,
+                      metrics_file=args.metrics_file, metrics_interval=args.metrics_interval, profiler=profiler,
+                      ast_cache=AstCache(directory=args.ast_cache) if args.ast_cache else None, stream=args.stream)
     else:
         test_code = """
 let x: Int = 10;
@@ -628,4 +3454,18 @@ fn add(a: Int, b: Int) -> Int {
 say "Sum: {add(x, y)}";
 """
         print("Running test code...")
-        run_nexa(test_code)
\ No newline at end of file
+        run_nexa(test_code, engine=args.engine, output=output, actor_runtime=args.actors, actor_workers=args.actor_workers,
+                 actor_placement=args.placement, metrics_file=args.metrics_file, metrics_interval=args.metrics_interval,
+                 profiler=profiler)
+    if profiler is not None:
+        if args.profile:
+            source = None
+            if args.file:
+                with open(args.file, 'r') as f:
+                    source = f.read()
+            print(profiler.report(args.profile_top, source), file=sys.stderr)
+        if args.profile_out:
+            profiler.dump_stats(args.profile_out)
+        if args.profile_collapsed:
+            with open(args.profile_collapsed, 'w') as f:
+                f.write(profiler.collapsed() + '\n')
\ No newline at end of file
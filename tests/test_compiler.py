@@ -0,0 +1,65 @@
+from src.nexa_interpreter import (
+    tokenize, parse, type_check, interpret, compile_ast, Environment,
+    AssignStmt, ForStmt, IfStmt, LetStmt, SayStmt, TryStmt, WhileStmt,
+)
+import contextlib
+import io
+import unittest
+
+class TestClosureCompiler(unittest.TestCase):
+    def setUp(self):
+        self.env = Environment()
+
+    def run_compiled(self, ast):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            compile_ast(ast)(self.env)
+        return out.getvalue()
+
+    def test_matches_tree_walker(self):
+        code = """
+        let x: Int = 5;
+        let y: Int = 3;
+        fn add(a: Int, b: Int) -> Int {
+            return a + b;
+        }
+        let sum: Int = add(x, y);
+        let prod: Int = math.multiply(x, 4);
+        x += y;
+        """
+        ast = parse(tokenize(code))
+        tree_env = Environment()
+        type_check(ast, tree_env)
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpret(ast, tree_env)
+        type_check(ast, self.env)
+        self.run_compiled(ast)
+        for name in ('x', 'sum', 'prod'):
+            self.assertEqual(self.env.get_var(name), tree_env.get_var(name))
+
+    def test_for_loop(self):
+        ast = [
+            LetStmt(name='total', type='Int', value=0),
+            ForStmt(var='i', start=0, end=10, body=[AssignStmt(name='total', op='+=', value='i')]),
+        ]
+        self.run_compiled(ast)
+        self.assertEqual(self.env.get_var('total')[0], 45)
+
+    def test_while_loop_and_if(self):
+        ast = [
+            LetStmt(name='n', type='Int', value=3),
+            WhileStmt(condition='n>0', body=[
+                IfStmt(condition='n>1', then_body=[SayStmt(value='big {n}')], else_body=[SayStmt(value='small {n}')]),
+                AssignStmt(name='n', op='+=', value=-1),
+            ]),
+        ]
+        output = self.run_compiled(ast)
+        self.assertEqual(output.splitlines(), ['Output: big 3', 'Output: big 2', 'Output: small 1'])
+
+    def test_try_catches_runtime_error(self):
+        ast = [TryStmt(try_body=[AssignStmt(name='x', op='=', value='missing')], catch_body=[SayStmt(value='caught')])]
+        output = self.run_compiled(ast)
+        self.assertIn('Output: caught', output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,21 @@
-from src.nexa_interpreter import tokenize, parse, interpret, Environment
+from src.nexa_interpreter import (
+    tokenize, parse, interpret, execute, Environment, Scope, resolve_slots, ENGINES,
+    CallExpr, FnDecl, ForStmt, IfStmt, LetStmt, ReturnStmt, SayStmt, AssignStmt, MemoCache, is_pure,
+    OutputChannel, run_nexa, run_nexa_async, ActorDecl, SpawnStmt, SendStmt, program_env, finish_program,
+    Mailbox, AsyncMailbox, MailboxFull, ACTOR_PLACEMENTS, actor_metrics, MetricsDumper,
+    Profiler, configure_profiling, ARRAY_STDLIB, ARRAY_BACKEND, _python_array_stdlib, _numpy_array_stdlib, AstCache,
+    Interpreter, TryStmt, type_check,
+)
+import asyncio
+import contextlib
+import io
+import json
+import os
+import pickle
+import pstats
+import tempfile
+import threading
+import time
 import unittest
 
 class TestInterpreter(unittest.TestCase):
@@ -67,5 +84,623 @@ class TestInterpreter(unittest.TestCase):
         self.assertEqual(self.env.get_var('diff')[0], 5)
         self.assertEqual(self.env.get_var('prod')[0], 50)
 
+    def test_variables_are_slot_indexed(self):
+        self.env.set_var('x', 1, 'Int')
+        self.env.set_var('y', 2, 'Int')
+        self.env.set_var('x', 3, 'Int')
+        self.assertEqual(self.env.scope.names, ['x', 'y'])
+        self.assertEqual(self.env.values, [3, 2])
+        self.assertEqual(self.env.get_var('x'), (3, 'Int'))
+
+    def test_resolved_but_unassigned_slot_is_undefined(self):
+        scope = resolve_slots(parse(tokenize("let x: Int = 1;\ny = x;")), Scope())
+        env = Environment(scope)
+        self.assertEqual(len(env.values), 2)
+        self.assertFalse(env.has_var('y'))
+        with self.assertRaises(RuntimeError):
+            env.get_var('y')
+
+    def test_use_scope_keeps_bound_values(self):
+        self.env.set_var('a', 7, 'Int')
+        scope = Scope()
+        scope.slot('b')
+        self.env.use_scope(scope)
+        self.assertIs(self.env.scope, scope)
+        self.assertEqual(self.env.get_var('a'), (7, 'Int'))
+        self.assertFalse(self.env.has_var('b'))
+
+    def test_recursive_calls_share_declarations(self):
+        countdown = FnDecl(name='countdown', params=[('n', 'Int')], return_type='Int', body=[
+            IfStmt(condition='n>0', then_body=[
+                LetStmt(name='m', type='Int', value=CallExpr(fn_name='math.subtract', args=['n', '1'])),
+                ReturnStmt(value=CallExpr(fn_name='countdown', args=['m'])),
+            ], else_body=[]),
+            ReturnStmt(value=CallExpr(fn_name='math.add', args=['n', '100'])),
+        ])
+        ast = [countdown, LetStmt(name='r', type='Int', value=CallExpr(fn_name='countdown', args=['5']))]
+        for engine in ENGINES:
+            env = Environment()
+            env.set_fn(countdown)
+            with contextlib.redirect_stdout(io.StringIO()):
+                execute(ast, env, engine)
+            self.assertEqual(env.get_var('r')[0], 100, engine)
+
+    def test_call_frame_does_not_copy_declarations(self):
+        frame = Environment(parent=self.env)
+        self.assertIs(frame.fns, self.env.fns)
+        self.assertIs(frame.stdlib, self.env.stdlib)
+
+    def test_ai_optimize_memoizes_pure_functions(self):
+        code = """
+        @ai.optimize
+        fn double(a: Int) -> Int {
+            return a * 2;
+        }
+        """
+        double = parse(tokenize(code))[0]
+        ast = [double, ForStmt(var='i', start=0, end=10, body=[
+            LetStmt(name='r', type='Int', value=CallExpr(fn_name='double', args=['7'])),
+        ])]
+        for engine in ENGINES:
+            env = Environment()
+            env.set_fn(double)
+            with contextlib.redirect_stdout(io.StringIO()):
+                execute(ast, env, engine)
+            stats = env.memo_stats()['double']
+            self.assertEqual((stats['hits'], stats['misses']), (9, 1), engine)
+            self.assertEqual(env.get_var('r')[0], 14)
+
+    def test_impure_functions_are_not_memoized(self):
+        noisy = FnDecl(name='noisy', params=[('a', 'Int')], return_type='Int', ai_optimized=True, body=[
+            SayStmt(value='side effect'),
+            ReturnStmt(value=CallExpr(fn_name='identity', args=['a'])),
+        ])
+        self.env.set_fn(noisy)
+        self.assertFalse(is_pure(noisy, self.env.fns))
+        self.assertIsNone(self.env.memo_cache(noisy))
+
+    def test_redefining_a_callee_invalidates_memoized_callers(self):
+        g = lambda *body: FnDecl(name='g', params=[('a', 'Int')], return_type='Int', body=list(body))
+        f = FnDecl(name='f', params=[('a', 'Int')], return_type='Int', ai_optimized=True, body=[
+            ReturnStmt(value=CallExpr(fn_name='g', args=['a'])),
+        ])
+        call_f = LetStmt(name='r', type='Int', value=CallExpr(fn_name='f', args=['5']))
+        for engine in ENGINES:
+            env = Environment()
+            env.output = OutputChannel(capture=True)
+            execute([g(ReturnStmt(value=CallExpr(fn_name='math.multiply', args=['a', '2']))), f, call_f], env, engine)
+            self.assertEqual(env.get_value('r'), 10)
+            execute([g(SayStmt(value='tripled'), ReturnStmt(value=CallExpr(fn_name='math.multiply', args=['a', '3']))), call_f, call_f], env, engine)
+            self.assertEqual(env.get_value('r'), 15, engine)
+            self.assertEqual(env.output.lines, ['tripled', 'tripled'], engine)
+            self.assertNotIn('f', env.memo_stats())
+
+    def test_first_declarations_keep_memo_caches(self):
+        env = Environment()
+        env.output = OutputChannel(capture=True)
+        execute(parse(tokenize("@ai.optimize\nfn f(a: Int) -> Int {\n    return a * 2;\n}\nlet r: Int = f(4);")), env)
+        verdict = env.fns['f'].pure
+        env.set_fn(FnDecl(name='h', params=[], return_type='Unit', body=[]))
+        self.assertEqual(env.memo_stats()['f']['misses'], 1)
+        self.assertIs(env.fns['f'].pure, verdict)
+        execute(parse(tokenize("let s: Int = f(4);")), env)
+        self.assertEqual(env.memo_stats()['f']['hits'], 1)
+
+    def test_memo_cache_evicts_least_recently_used(self):
+        cache = MemoCache(maxsize=2)
+        run = lambda fn, args, env: args[0] * 10
+        for key in (1, 2, 1, 3):
+            cache.call(None, [key], None, run)
+        self.assertEqual(list(cache.entries), [(1,), (3,)])
+        self.assertEqual(cache.info()['evictions'], 1)
+        self.assertEqual(cache.info()['hits'], 1)
+
+    def test_say_writes_to_output_channel(self):
+        ast = [LetStmt(name='x', type='Int', value=3), SayStmt(value='x is {x}'), SayStmt(value='done')]
+        for engine in ENGINES:
+            env = Environment()
+            env.output = OutputChannel(capture=True)
+            execute(ast, env, engine)
+            self.assertEqual(env.output.lines, ['x is 3', 'done'], engine)
+
+    def test_buffered_output_is_written_in_blocks(self):
+        stream = io.StringIO()
+        output = OutputChannel(stream, buffer_lines=3)
+        for i in range(4):
+            output.write(str(i))
+        self.assertEqual(stream.getvalue(), "Output: 0\nOutput: 1\nOutput: 2\n")
+        output.flush()
+        self.assertTrue(stream.getvalue().endswith("Output: 3\n"))
+
+    def test_run_nexa_flushes_raw_output(self):
+        stream = io.StringIO()
+        run_nexa('say "hello";', output=OutputChannel(stream, buffer_lines=100, raw=True))
+        self.assertEqual(stream.getvalue(), "hello\n")
+
+    def test_pooled_actors_handle_messages_in_order(self):
+        ast = []
+        for name in ('A', 'B'):
+            ast.append(ActorDecl(name=name, state=[], methods=[
+                FnDecl(name='on_message', params=[('msg', 'Int')], return_type='Unit', body=[SayStmt(value=name + '{msg}')]),
+            ]))
+            ast.append(SpawnStmt(actor_name=name, var_name=name.lower()))
+        ast += [SendStmt(actor_var=var, msg=i) for i in range(200) for var in ('a', 'b')]
+        for engine in ENGINES:
+            env = program_env(OutputChannel(capture=True), actor_runtime='pool', actor_workers=3)
+            execute(ast, env, engine)
+            finish_program(env)
+            for name in ('A', 'B'):
+                lines = [line for line in env.output.lines if line.startswith(name)]
+                self.assertEqual(lines, [f"{name}{i}" for i in range(200)], engine)
+            self.assertEqual(env.scheduler.threads, [])
+
+    def test_pool_runtime_runs_one_actor_at_a_time(self):
+        env = program_env(OutputChannel(capture=True), actor_runtime='pool', actor_workers=4)
+        seen = []
+        active = []
+        def on_messages(msgs):
+            active.append(msgs)
+            self.assertEqual(len(active), 1)
+            seen.extend(msgs)
+            active.pop()
+        env.set_actor(ActorDecl(name='Slow', state=[], methods=[]))
+        interpret([SpawnStmt(actor_name='Slow', var_name='s')], env)
+        instance = env.get_value('s')
+        instance.handle_batch = on_messages
+        for i in range(500):
+            instance.send(i)
+        finish_program(env)
+        self.assertEqual(seen, list(range(500)))
+
+    def test_asyncio_actors_run_on_the_event_loop(self):
+        echo = ActorDecl(name='Echo', state=[], methods=[
+            FnDecl(name='on_message', params=[('msg', 'Int')], return_type='Unit', body=[SayStmt(value='got {msg}')]),
+        ])
+        ast = [echo, SpawnStmt(actor_name='Echo', var_name='e')] + [SendStmt(actor_var='e', msg=i) for i in range(3)]
+        async def main(engine):
+            env = program_env(OutputChannel(capture=True), actor_runtime='asyncio')
+            execute(ast, env, engine)
+            self.assertEqual(env.output.lines, [])
+            await env.scheduler.drain()
+            self.assertEqual(env.scheduler.tasks, {})
+            return env.output.lines
+        for engine in ENGINES:
+            self.assertEqual(asyncio.run(main(engine)), ['got 0', 'got 1', 'got 2'], engine)
+
+    def test_run_nexa_async_uses_the_running_loop(self):
+        output = OutputChannel(capture=True)
+        asyncio.run(run_nexa_async(io.StringIO('let x: Int = 4;\nsay "x={x}";\n'), output=output))
+        self.assertEqual(output.lines, ['x=4'])
+
+    def test_actor_context_keeps_state_and_private_globals(self):
+        counter = ActorDecl(name='Counter', state=[LetStmt(name='count', type='Int', value=100)], methods=[
+            FnDecl(name='on_message', params=[('msg', 'Int')], return_type='Unit', body=[
+                AssignStmt(name='count', op='+=', value='msg'),
+                AssignStmt(name='seen', op='=', value='msg'),
+                SayStmt(value='{base}:{count}'),
+            ]),
+        ])
+        env = program_env(OutputChannel(capture=True), actor_runtime='pool', actor_workers=1)
+        interpret([LetStmt(name='base', type='Int', value=7), LetStmt(name='seen', type='Int', value=0),
+                   counter, SpawnStmt(actor_name='Counter', var_name='c')], env)
+        instance = env.get_value('c')
+        for msg in (1, 2, 3):
+            instance.send(msg)
+        finish_program(env)
+        self.assertEqual(instance.state, {'count': 106})
+        self.assertEqual(env.output.lines, ['7:101', '7:103', '7:106'])
+        self.assertEqual(env.get_value('seen'), 0)
+        self.assertFalse(env.has_var('count'))
+
+    def test_send_many_delivers_in_order(self):
+        echo = ActorDecl(name='Echo', state=[], methods=[
+            FnDecl(name='on_message', params=[('msg', 'Int')], return_type='Unit', body=[SayStmt(value='{msg}')]),
+        ])
+        ast = [echo, LetStmt(name='x', type='Int', value=9), SpawnStmt(actor_name='Echo', var_name='e')]
+        ast += parse(tokenize("e.send_many(1, x, 3);\ne.send(4);"))
+        self.assertEqual(ast[3].msg, [1, 'x', 3])
+        for engine in ENGINES:
+            for runtime in ('thread', 'pool'):
+                env = program_env(OutputChannel(capture=True), actor_runtime=runtime)
+                execute(ast, env, engine)
+                if runtime == 'thread':
+                    deadline = time.time() + 5
+                    while len(env.output.lines) < 4 and time.time() < deadline:
+                        time.sleep(0.01)
+                finish_program(env)
+                self.assertEqual(env.output.lines, ['1', '9', '3', '4'], (engine, runtime))
+
+    def test_mailbox_overflow_policies(self):
+        newest, oldest, strict = Mailbox(2, 'drop_newest'), Mailbox(2, 'drop_oldest'), Mailbox(2, 'raise')
+        newest.put_many([1, 2, 3])
+        oldest.put_many([1, 2, 3])
+        strict.put_many([1, 2])
+        with self.assertRaises(MailboxFull):
+            strict.put(3)
+        self.assertEqual(newest.take(10), [1, 2])
+        self.assertEqual(oldest.take(10), [2, 3])
+        self.assertEqual((newest.stats()['dropped'], oldest.stats()['dropped']), (1, 1))
+        self.assertEqual(strict.stats()['rejected'], 1)
+        self.assertEqual(strict.stats()['max_depth'], 2)
+
+    def test_blocking_mailbox_waits_for_room(self):
+        mailbox = Mailbox(1, 'block')
+        mailbox.put(1)
+        sender = threading.Thread(target=mailbox.put, args=(2,))
+        sender.start()
+        time.sleep(0.05)
+        self.assertTrue(sender.is_alive())
+        self.assertEqual(mailbox.take(1), [1])
+        sender.join(5)
+        self.assertEqual(mailbox.take(1), [2])
+        self.assertEqual(mailbox.stats()['blocked'], 1)
+
+    def test_async_mailbox_cannot_block_the_loop(self):
+        async def main():
+            mailbox = AsyncMailbox(1, 'block')
+            mailbox.offer(1)
+            with self.assertRaises(MailboxFull):
+                mailbox.offer(2)
+            return mailbox.stats()
+        self.assertEqual(asyncio.run(main())['rejected'], 1)
+
+    def test_bounded_actor_mailbox_from_source(self):
+        ast = parse(tokenize("actor Sink(4, drop_oldest) {\n}\nlet s = Sink.spawn(2, block);\nt = Sink.spawn(3);\n"))
+        self.assertEqual((ast[0].capacity, ast[0].overflow), (4, 'drop_oldest'))
+        self.assertEqual((ast[1].capacity, ast[1].overflow), (2, 'block'))
+        self.assertEqual((ast[2].var_name, ast[2].capacity, ast[2].overflow), ('t', 3, None))
+        for engine in ENGINES:
+            env = program_env(OutputChannel(capture=True), actor_runtime='pool', actor_workers=1)
+            execute(ast, env, engine)
+            instance = env.get_value('s')
+            instance.send_many(range(50))
+            finish_program(env)
+            stats = instance.mailbox_stats()
+            self.assertEqual((stats['capacity'], stats['overflow'], stats['dropped']), (2, 'block', 0), engine)
+            self.assertLessEqual(stats['max_depth'], 2)
+
+    def test_process_runtime_hosts_actors_in_workers(self):
+        counter = ActorDecl(name='Counter', state=[LetStmt(name='count', type='Int', value=100)], methods=[
+            FnDecl(name='on_message', params=[('msg', 'Int')], return_type='Unit', body=[
+                AssignStmt(name='count', op='+=', value='msg'),
+                SayStmt(value='{base}:{count}'),
+            ]),
+        ])
+        for placement in ACTOR_PLACEMENTS:
+            env = program_env(OutputChannel(capture=True), actor_runtime='process', actor_workers=2, actor_placement=placement)
+            interpret([LetStmt(name='base', type='Int', value=7), counter,
+                       SpawnStmt(actor_name='Counter', var_name='a'), SpawnStmt(actor_name='Counter', var_name='b')], env)
+            a, b = env.get_value('a'), env.get_value('b')
+            a.send_many([1, 2, 3])
+            b.send(5)
+            finish_program(env)
+            self.assertEqual((a.state, b.state), ({'count': 106}, {'count': 105}), placement)
+            self.assertEqual(sorted(env.output.lines), ['7:101', '7:103', '7:105', '7:106'])
+            self.assertEqual(a.mailbox_stats()['depth'], None)
+            self.assertEqual(a.mailbox_stats()['capacity'], None)
+
+    def test_process_actors_see_array_globals(self):
+        summer = ActorDecl(name='Summer', state=[], methods=[
+            FnDecl(name='on_message', params=[('msg', 'Int')], return_type='Unit', body=[
+                LetStmt(name='total', type='Int', value=CallExpr(fn_name='array.sum', args=['xs'])),
+                SayStmt(value='{msg}:{total}'),
+            ]),
+        ])
+        env = program_env(OutputChannel(capture=True), actor_runtime='process', actor_workers=1)
+        interpret([LetStmt(name='xs', type='Array', value=CallExpr(fn_name='array.range', args=['4'])), summer,
+                   SpawnStmt(actor_name='Summer', var_name='s')], env)
+        env.get_value('s').send(1)
+        finish_program(env)
+        self.assertEqual(env.output.lines, ['1:6'])
+        env = program_env(OutputChannel(capture=True), actor_runtime='process', actor_workers=1)
+        env.set_var('lock', threading.Lock(), 'Int')
+        with self.assertRaisesRegex(ValueError, 'lock'):
+            interpret([summer, SpawnStmt(actor_name='Summer', var_name='s')], env)
+        finish_program(env)
+
+    def test_actor_metrics_count_messages_and_errors(self):
+        adder = ActorDecl(name='Adder', state=[LetStmt(name='total', type='Int', value=0)], methods=[
+            FnDecl(name='on_message', params=[('msg', 'Int')], return_type='Unit', body=[
+                AssignStmt(name='total', op='+=', value='msg'),
+            ]),
+        ])
+        env = program_env(OutputChannel(capture=True), actor_runtime='pool', actor_workers=1)
+        interpret([adder, SpawnStmt(actor_name='Adder', var_name='a')], env)
+        instance = env.get_value('a')
+        with contextlib.redirect_stdout(io.StringIO()):
+            instance.send_many([1, 2, 'oops', 3])
+            finish_program(env)
+        metrics = instance.metrics()
+        self.assertEqual((metrics['received'], metrics['processed'], metrics['errors']), (4, 4, 1))
+        self.assertIn('str', metrics['last_error'])
+        self.assertEqual(sum(metrics['histogram'].values()), 4)
+        self.assertEqual(metrics['max_depth'], 4)
+        self.assertEqual([m['id'] for m in actor_metrics(env)['actors']], [instance.id])
+
+    def test_concurrent_senders_are_all_counted(self):
+        sink = ActorDecl(name='Sink', state=[], methods=[FnDecl(name='on_message', params=[('msg', 'Int')], return_type='Unit', body=[])])
+        env = program_env(OutputChannel(capture=True), actor_runtime='pool', actor_workers=2)
+        interpret([sink, SpawnStmt(actor_name='Sink', var_name='s')], env)
+        instance = env.get_value('s')
+        senders = [threading.Thread(target=lambda: [instance.send(n) for n in range(2000)]) for _ in range(4)]
+        for sender in senders:
+            sender.start()
+        for sender in senders:
+            sender.join()
+        finish_program(env)
+        self.assertEqual((instance.metrics()['received'], instance.metrics()['processed']), (8000, 8000))
+
+    def test_metrics_dumper_writes_json(self):
+        env = program_env(OutputChannel(capture=True), actor_runtime='pool')
+        interpret([ActorDecl(name='Idle', state=[], methods=[]), SpawnStmt(actor_name='Idle', var_name='i')], env)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'metrics.json')
+            dumper = MetricsDumper(env, path, interval=60)
+            dumper.stop()
+            finish_program(env)
+            with open(path) as f:
+                snapshot = json.load(f)
+        self.assertEqual(snapshot['actors'][0]['actor'], 'Idle')
+
+    def test_profiler_counts_lines_and_functions(self):
+        double = parse(tokenize("fn double(a: Int) -> Int {\n    return a * 2;\n}"))[0]
+        ast = [double, ForStmt(var='i', start=0, end=10, line=4, body=[
+            LetStmt(name='r', type='Int', value=CallExpr(fn_name='double', args=['i']), line=5),
+        ])]
+        for engine in ENGINES:
+            profiler = Profiler()
+            configure_profiling(profiler)
+            try:
+                execute(ast, Environment(), engine)
+            finally:
+                configure_profiling(None)
+            stat = profiler.functions['double']
+            self.assertEqual((stat.calls, stat.line), (10, 1), engine)
+            if engine == 'vm':
+                continue
+            loop, body, inner = profiler.lines[4], profiler.lines[5], profiler.lines[2]
+            self.assertEqual((loop.calls, body.calls, inner.calls), (1, 10, 10), engine)
+            self.assertEqual(inner.name, 'double')
+            self.assertGreaterEqual(loop.total, body.total)
+            self.assertLessEqual(loop.own, loop.total)
+
+    def test_profiler_exports(self):
+        code = 'fn add(a: Int, b: Int) -> Int {\n    return a + b;\n}\nsay "Sum: {add(1, 2)}";'
+        profiler = Profiler('demo.nexa')
+        run_nexa(code, output=OutputChannel(capture=True), profiler=profiler)
+        self.assertIsNone(configure_profiling(None))
+        self.assertRegex(profiler.collapsed(), r'^<module>;add \d+$')
+        self.assertIn('say "Sum: {add(1, 2)}";', profiler.report(5, code))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'out.pstats')
+            profiler.dump_stats(path)
+            stats = pstats.Stats(path)
+        self.assertEqual(stats.total_calls, 1)
+        self.assertIn(('demo.nexa', 1, 'add'), stats.stats)
+
+    def test_array_stdlib_across_engines(self):
+        code = """let xs: Array = array.range(1, 6);
+let ys: Array = array.multiply(xs, xs);
+let total: Int = array.sum(ys);
+let top: Int = array.max(ys);
+let dot: Int = array.dot(xs, xs);
+say "{array.get(ys, 4)} {array.len(ys)} {array.mean(xs)}";"""
+        for engine in ENGINES:
+            env = Environment()
+            env.output = OutputChannel(capture=True)
+            execute(parse(tokenize(code)), env, engine)
+            self.assertEqual([env.get_value(name) for name in ('total', 'top', 'dot')], [55, 25, 55], engine)
+            self.assertEqual(env.output.lines, ['25 5 3.0'])
+
+    def test_say_prints_arrays_the_same_on_every_backend(self):
+        backends = {'array': _python_array_stdlib()}
+        if ARRAY_BACKEND == 'numpy':
+            backends['numpy'] = _numpy_array_stdlib()
+        code = 'let xs: Array = array.range(3);\nlet ys: Array = array.divide(xs, 2);\nsay "{xs} {ys}";'
+        for backend, lib in backends.items():
+            for engine in ENGINES:
+                env = Environment()
+                env.stdlib.update(lib)
+                env.output = OutputChannel(capture=True)
+                execute(parse(tokenize(code)), env, engine)
+                self.assertEqual(env.output.lines, ['[0, 1, 2] [0.0, 0.5, 1.0]'], (backend, engine))
+
+    def test_python_array_fallback(self):
+        self.check_array_backend(_python_array_stdlib())
+
+    @unittest.skipIf(ARRAY_BACKEND != 'numpy', 'NumPy is not installed')
+    def test_numpy_array_backend(self):
+        self.check_array_backend(_numpy_array_stdlib())
+
+    def check_array_backend(self, lib):
+        xs = lib['array.range'](4)
+        self.assertEqual(list(lib['array.add'](xs, 1.5)), [1.5, 2.5, 3.5, 4.5])
+        self.assertEqual(list(lib['array.subtract'](10, xs)), [10, 9, 8, 7])
+        self.assertEqual(list(lib['array.divide'](xs, 0)), [float('inf')] * 4)
+        self.assertEqual(list(lib['array.fill'](3, 7)), [7, 7, 7])
+        with self.assertRaises(RuntimeError):
+            lib['array.add'](xs, lib['array.range'](3))
+        with self.assertRaises(RuntimeError):
+            lib['array.min'](lib['array.range'](0))
+        with self.assertRaises(RuntimeError):
+            lib['array.get'](xs, 4)
+        self.assertEqual(set(lib), set(ARRAY_STDLIB))
+
+    def test_ast_cache_reuses_parsed_programs(self):
+        code = 'fn add(a: Int, b: Int) -> Int {\n    return a + b;\n}\nsay "Sum: {add(2, 3)}";'
+        cache = AstCache(maxsize=1)
+        for engine in ENGINES:
+            output = OutputChannel(capture=True)
+            run_nexa(code, engine=engine, output=output, ast_cache=cache)
+            self.assertEqual(output.lines, ['Sum: 5'], engine)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (2, 1, 1))
+        self.assertAlmostEqual(stats['hit_rate'], 2 / 3)
+        run_nexa('say "other";', output=OutputChannel(capture=True), ast_cache=cache)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        configure_profiling(Profiler())
+        try:
+            self.assertIsNone(cache.get('say "other";', False))
+        finally:
+            configure_profiling(None)
+
+    def test_ast_cache_directory(self):
+        code = 'let x: Int = 4;\nsay "x is {x}";'
+        with tempfile.TemporaryDirectory() as tmp:
+            run_nexa(code, output=OutputChannel(capture=True), ast_cache=AstCache(directory=tmp))
+            [name] = os.listdir(tmp)
+            fresh = AstCache(directory=tmp)
+            output = OutputChannel(capture=True)
+            run_nexa(code, output=output, ast_cache=fresh)
+            self.assertEqual(output.lines, ['x is 4'])
+            self.assertEqual((fresh.disk_hits, fresh.misses), (1, 0))
+            self.assertIsNone(fresh.get(code, True))
+            with open(os.path.join(tmp, name), 'wb') as f:
+                f.write(b'garbage')
+            self.assertIsNone(AstCache(directory=tmp).get(code, False))
+            bounded = AstCache(directory=tmp, max_disk_bytes=0)
+            run_nexa(code, output=OutputChannel(capture=True), ast_cache=bounded)
+            self.assertEqual(os.listdir(tmp), [])
+            self.assertEqual(bounded.stats()['disk_evictions'], 1)
+
+    def test_interpreter_runs_loaded_program_with_inputs(self):
+        code = """fn add(a: Int, b: Int) -> Int {
+    return a + b;
+}
+let result: Int = add(n, 2);
+say "result is {result}";
+return result;"""
+        for engine in ENGINES:
+            interpreter = Interpreter(code, inputs={'n': 'Int'}, engine=engine)
+            first, second = interpreter.run({'n': 1}), interpreter.run({'n': 40})
+            self.assertEqual((first.value, first.output), (3, ['result is 3']), engine)
+            self.assertEqual(second.variables, {'n': 40, 'result': 42})
+            self.assertTrue(second.ok)
+        failed = Interpreter('let xs: Array = array.range(n);\nlet x: Int = array.get(xs, 5);', inputs={'n': 'Int'}).run({'n': 2})
+        self.assertFalse(failed.ok)
+        self.assertIn('out of range', failed.error)
+        with self.assertRaises(TypeError):
+            Interpreter('say "{missing}";')
+        with self.assertRaises(ValueError):
+            interpreter.run({'m': 1})
+
+    def test_optimized_interpreter_binds_its_own_declarations(self):
+        code = "@ai.optimize\nfn f(a: Int) -> Int {\n    let k: Int = math.add(2, 3);\n    let m: Int = math.multiply(a, k);\n    return m;\n}\nlet r: Int = f(n);"
+        for engine in ENGINES:
+            interpreter = Interpreter(code, inputs={'n': 'Int'}, engine=engine, optimize=True)
+            fn = interpreter.env.fns['f']
+            self.assertIs(fn, interpreter.ast[0], engine)
+            if engine == 'closure':
+                self.assertIsNotNone(fn.compiled)
+            first, second = interpreter.run({'n': 2}), interpreter.run({'n': 2})
+            self.assertEqual((first.variables['r'], second.variables['r']), (10, 10))
+            self.assertIs(interpreter.env.fns['f'], fn)
+            self.assertEqual(interpreter.env.memo_stats()['f']['hits'], 1, engine)
+
+    def test_checked_stores_do_not_write_shared_types(self):
+        interpreter = Interpreter('let xs: Array = array.range(n);\nlet t: Int = 0;\nt += n;', inputs={'n': 'Int'}, engine='tree')
+        self.assertEqual(dict(zip(interpreter.scope.names, interpreter.scope.types)), {'n': 'Int', 'xs': 'Array', 't': 'Int'})
+        interpreter.scope.types = tuple(interpreter.scope.types)  # any write would now raise
+        results = interpreter.run_batch([{'n': n} for n in range(4)], executor='thread', workers=2)
+        self.assertEqual([result.variables['t'] for result in results], [0, 1, 2, 3])
+
+    def test_interpreter_run_batch(self):
+        interpreter = Interpreter('let doubled: Int = math.multiply(n, 2);', inputs={'n': 'Int'})
+        batch = [{'n': n} for n in range(6)]
+        for executor in ('serial', 'thread', 'process'):
+            results = interpreter.run_batch(batch, executor=executor, workers=2)
+            self.assertEqual([result.variables['doubled'] for result in results], [0, 2, 4, 6, 8, 10], executor)
+
+    def test_type_check_walks_every_body(self):
+        say_missing = [SayStmt(value='{missing}', line=9)]
+        nested = [
+            [FnDecl(name='f', params=[('a', 'Int')], return_type='Int', body=[IfStmt(condition='b>0', then_body=[], else_body=[], line=9)])],
+            [TryStmt(try_body=[], catch_body=say_missing)],
+            [ActorDecl(name='A', state=[], methods=[FnDecl(name='on_message', params=[('msg', 'Int')], return_type='Unit', body=say_missing)]),
+             SpawnStmt(actor_name='A')],
+            [LetStmt(name='x', type='Int', value=CallExpr(fn_name='nope', args=[], line=9))],
+        ]
+        for ast in nested:
+            with self.assertRaisesRegex(TypeError, 'line 9'):
+                type_check(ast, Environment())
+        body_call = "fn f(a: Int) -> Int {\n    let r: Int = %s(a);\n    return r;\n}\n"
+        with self.assertRaisesRegex(TypeError, 'line 2: nothere'):
+            type_check(parse(tokenize(body_call % 'nothere')), Environment())
+        type_check(parse(tokenize(body_call % 'later' + "fn later(a: Int) -> Int {\n    return a * 2;\n}")), Environment())
+        type_check(parse(tokenize(body_call % 'nothere')), Environment(), partial=True)
+        env = Environment()
+        type_check(parse(tokenize("let x: Int = 4;\nsay \"{later(x)}\";")), env, partial=True)
+        with self.assertRaisesRegex(TypeError, 'Undefined function call at line 2: later'):
+            type_check(parse(tokenize("let y: Int = 1;\nsay \"{later(x)}\";")), env)
+        with self.assertRaisesRegex(TypeError, 'takes 1 arguments'):
+            type_check(parse(tokenize("fn f(a: Int) -> Int {\n    return a * 2;\n}\nlet y: Int = f(1, 2);")), Environment())
+
+    def test_actor_methods_are_checked_where_spawned(self):
+        reads_x = ActorDecl(name='A', state=[], methods=[
+            FnDecl(name='on_message', params=[('msg', 'Int')], return_type='Unit', body=[SayStmt(value='{x} {msg}', line=9)]),
+        ])
+        x = LetStmt(name='x', type='Int', value=5)
+        spawn = SpawnStmt(actor_name='A', var_name='a')
+        type_check([reads_x, x, spawn], Environment())
+        with self.assertRaisesRegex(TypeError, 'line 9: x'):
+            type_check([reads_x, spawn, x], Environment())
+        type_check([reads_x, x], Environment())
+
+    def test_type_check_annotates_without_binding(self):
+        ast = parse(tokenize("let x: Int = 3;\nlet y: Int = math.add(x, 1);\nx += y;\nsay \"{y} {math.add(x, y)}\";"))
+        env = Environment()
+        type_check(ast, env)
+        self.assertFalse(env.has_var('x'))
+        x, y = env.scope.slots['x'], env.scope.slots['y']
+        self.assertEqual(ast[2].slot, (env.scope, x))
+        self.assertEqual(ast[2].value_slot, (env.scope, y))
+        self.assertEqual(ast[3].arg_slots, (env.scope, (y, None)))
+        self.assertIs(ast[1].value.builtin, env.stdlib['math.add'])
+        sends = [ActorDecl(name='A', state=[], methods=[]), SpawnStmt(actor_name='A', var_name='a'),
+                 SendStmt(actor_var='a', msg=[1, 'x'])]
+        type_check(sends, env)
+        self.assertEqual(sends[2].arg_slots, (env.scope, (None, x)))
+        copied = pickle.loads(pickle.dumps(ast))
+        self.assertIsNone(copied[2].slot)
+        interpret(ast, env)
+        self.assertEqual(env.get_value('x'), 7)
+        fresh = Environment()
+        interpret(copied, fresh)
+        self.assertEqual(fresh.get_value('x'), 7)
+
+    def test_zero_argument_calls_on_every_engine(self):
+        code = 'fn seven() -> Int {\n    let s: Int = 7;\n    return s;\n}\nlet r: Int = seven();\nsay "{seven()} {r}";'
+        self.assertEqual(parse(tokenize(code))[1].value.operands, ())
+        for engine in ENGINES:
+            output = OutputChannel(capture=True)
+            run_nexa(code, engine=engine, output=output)
+            self.assertEqual(output.lines, ['7 7'], engine)
+
+    def test_call_sites_are_linked_once(self):
+        call = CallExpr(fn_name='f', args=[' x', '2 ', 3])
+        self.assertEqual(call.operands, (('x', None), (None, 2), (None, 3)))
+        ast = parse(tokenize("fn f(a: Int) -> Int {\n    return a * 2;\n}\nlet x: Int = 4;\nlet y: Int = f(x);"))
+        env = Environment()
+        type_check(ast, env)
+        link = ast[2].value.link
+        self.assertIs(link[3], env.fns['f'])
+        self.assertEqual(ast[2].value.arg_slots, (env.scope, (env.scope.slots['x'],)))
+        interpret(ast, env)
+        self.assertIs(ast[2].value.link, link)
+        self.assertIsNone(pickle.loads(pickle.dumps(ast))[2].value.link)
+
+    def test_redefined_functions_invalidate_call_links(self):
+        define_g = "fn g(a: Int) -> Int {{\n    return a * {};\n}}"
+        call_g = "fn f(a: Int) -> Int {\n    let r: Int = g(a);\n    return r;\n}\nlet y: Int = f(5);"
+        for engine in ENGINES:
+            env = Environment()
+            results = []
+            for line in (define_g.format(2), call_g, define_g.format(3), "let y: Int = f(5);"):
+                ast = parse(tokenize(line))
+                type_check(ast, env)
+                execute(ast, env, engine)
+                results.append(env.lookup('y'))
+            self.assertEqual(results[1::2], [10, 15], engine)
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
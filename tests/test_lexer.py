@@ -1,4 +1,5 @@
 from src.nexa_interpreter import tokenize
+import io
 import unittest
 
 class TestLexer(unittest.TestCase):
@@ -46,6 +47,31 @@ fn add(a: Int, b: Int) -> Int {
         tokens = tokenize(code)
         self.assertEqual(tokens[0][0], ['ASSIGN', 'x', '+=', '5'])
 
+    def test_rule_priority(self):
+        code = """x = 5;
+} catch {
+}"""
+        tokens = tokenize(code)
+        self.assertEqual(tokens[0][0], ['ASSIGN', 'x', '=', 5])
+        self.assertEqual(tokens[1][0], ['CATCH_START'])
+        self.assertEqual(tokens[2][0], ['BLOCK_END'])
+
+    def test_line_numbers_skip_blank_lines(self):
+        code = "\n\nlet x: Int = 1;\n\n   say \"hi\";"
+        tokens = tokenize(code)
+        self.assertEqual([line for _, line in tokens], [3, 5])
+
+    def test_stream_input(self):
+        tokens = tokenize(io.StringIO("let x: Int = 5;\n\nx += 1;\n"))
+        self.assertNotIsInstance(tokens, list)
+        self.assertEqual(list(tokens), [(['LET', 'x', 'Int', 5], 1), (['ASSIGN', 'x', '+=', '1'], 3)])
+
+    def test_stream_is_lazy(self):
+        tokens = tokenize(iter(["let x: Int = 5;", "invalid syntax here"]))
+        self.assertEqual(next(tokens), (['LET', 'x', 'Int', 5], 1))
+        with self.assertRaises(SyntaxError):
+            next(tokens)
+
     def test_invalid_syntax(self):
         code = "invalid syntax here"
         with self.assertRaises(SyntaxError):
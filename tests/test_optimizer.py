@@ -0,0 +1,65 @@
+from src.nexa_interpreter import (
+    tokenize, parse, interpret, optimize_ast, format_ast, Environment,
+    AssignStmt, ForStmt, IfStmt, LetStmt, SayStmt, WhileStmt,
+)
+import contextlib
+import io
+import unittest
+
+class TestOptimizer(unittest.TestCase):
+    def test_folds_let_chain_of_stdlib_calls(self):
+        code = """
+        let a: Int = 10;
+        let b: Int = 5;
+        let sum: Int = math.add(a, b);
+        let prod: Int = math.multiply(sum, 2);
+        """
+        ast = optimize_ast(parse(tokenize(code)))
+        self.assertEqual([node.value for node in ast], [10, 5, 15, 30])
+
+    def test_removes_statically_known_branch(self):
+        ast = optimize_ast([
+            LetStmt(name='x', type='Int', value=7),
+            IfStmt(condition='x>5', then_body=[SayStmt(value='big')], else_body=[SayStmt(value='small')]),
+        ])
+        self.assertEqual(ast[1], SayStmt(value='big'))
+
+    def test_unrolls_small_for_range(self):
+        ast = optimize_ast([
+            LetStmt(name='total', type='Int', value=0),
+            ForStmt(var='i', start=0, end=3, body=[AssignStmt(name='total', op='+=', value='i')]),
+        ])
+        self.assertFalse(any(isinstance(node, ForStmt) for node in ast))
+        self.assertEqual(ast[-1], AssignStmt(name='total', op='=', value=3))
+
+    def test_loop_assignments_are_not_propagated(self):
+        ast = optimize_ast([
+            LetStmt(name='n', type='Int', value=3),
+            WhileStmt(condition='n>0', body=[AssignStmt(name='n', op='+=', value=-1)]),
+            IfStmt(condition='n>0', then_body=[SayStmt(value='positive')], else_body=[]),
+        ])
+        self.assertIsInstance(ast[1], WhileStmt)
+        self.assertEqual(ast[1].body[0], AssignStmt(name='n', op='+=', value=-1))
+        self.assertIsInstance(ast[2], IfStmt)
+
+    def test_optimized_program_behaves_the_same(self):
+        ast = [
+            LetStmt(name='x', type='Int', value=2),
+            ForStmt(var='i', start=0, end=20, body=[AssignStmt(name='x', op='+=', value='i')]),
+            IfStmt(condition='x>100', then_body=[AssignStmt(name='x', op='=', value=1)], else_body=[]),
+        ]
+        results = []
+        for program in (ast, optimize_ast(ast)):
+            env = Environment()
+            with contextlib.redirect_stdout(io.StringIO()):
+                interpret(program, env)
+            results.append(env.get_var('x'))
+        self.assertEqual(results[0], results[1])
+
+    def test_format_ast_shows_nested_bodies(self):
+        text = format_ast([IfStmt(condition='x>1', then_body=[SayStmt(value='hi')], else_body=[], line=3)])
+        self.assertTrue(text.startswith("IfStmt(condition='x>1', else_body=[])  # line 3"))
+        self.assertIn("    SayStmt(value='hi')", text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,7 @@
-from src.nexa_interpreter import tokenize, parse, LetStmt, FnDecl, ActorDecl, TryStmt
+from src.nexa_interpreter import (
+    tokenize, parse, iter_parse, LetStmt, FnDecl, ActorDecl, TryStmt, SayStmt, CallExpr, ForStmt, IfStmt, WhileStmt,
+    AssignStmt,
+)
 import unittest
 from typing import cast
 
@@ -58,5 +61,65 @@ fn add(a: Int, b: Int) -> Int {
         self.assertEqual(len(node.try_body), 1)
         self.assertEqual(len(node.catch_body), 1)
 
+    def test_parse_token_stream(self):
+        lines = iter(["fn add(a: Int, b: Int) -> Int {", "    return a + b;", "}", "let x: Int = 5;"])
+        ast = parse(tokenize(lines))
+        self.assertEqual([type(node) for node in ast], [FnDecl, LetStmt])
+
+    def test_iter_parse_yields_before_input_is_exhausted(self):
+        consumed = []
+        def lines():
+            for line in ["let x: Int = 5;", "let y: Int = 6;"]:
+                consumed.append(line)
+                yield line
+        nodes = iter_parse(tokenize(lines()))
+        first = next(nodes)
+        self.assertIsInstance(first, LetStmt)
+        self.assertEqual(len(consumed), 1)
+
+    def test_say_template_is_parsed_once(self):
+        node = cast(SayStmt, parse(tokenize('say "Sum: {add(x, 2)} and {y}!";'))[0])
+        self.assertEqual(node.template.chunks, ['Sum: ', ' and ', '!'])
+        self.assertEqual(node.template.refs, [CallExpr(fn_name='add', args=['x', 2], line=1), 'y'])
+
+    def test_say_call_keeps_interpolation_braces(self):
+        node = cast(SayStmt, parse(tokenize('say "Sum: {add(x, y)}";'))[0])
+        self.assertEqual(node.value, 'Sum: {add(x, y)}')
+        self.assertEqual(node.template.refs, [CallExpr(fn_name='add', args=['x', 'y'], line=1)])
+
+    def test_parse_nested_control_flow(self):
+        code = """for i in range(3) {
+    if i > 1 {
+        say "big";
+    } else {
+        while n > 0 {
+            n = 0;
+        }
+    }
+}"""
+        loop = cast(ForStmt, parse(tokenize(code))[0])
+        self.assertEqual((loop.var, loop.start, loop.end, loop.line), ('i', 0, 3, 1))
+        branch = cast(IfStmt, loop.body[0])
+        self.assertEqual(branch.condition, 'i>1')
+        self.assertIsInstance(branch.then_body[0], SayStmt)
+        inner = cast(WhileStmt, branch.else_body[0])
+        self.assertEqual((inner.condition, inner.line), ('n>0', 5))
+        self.assertIsInstance(inner.body[0], AssignStmt)
+
+    def test_else_on_its_own_line(self):
+        ast = parse(tokenize('if x > 0 {\n    say "a";\n}\nelse {\n    say "b";\n}\nsay "c";'))
+        self.assertEqual(len(ast), 2)
+        self.assertEqual(len(cast(IfStmt, ast[0]).else_body), 1)
+
+    def test_function_bodies_accept_any_statement(self):
+        fn = cast(FnDecl, parse(tokenize('fn f(a: Int) -> Int {\n    say "in f";\n    return a;\n}'))[0])
+        self.assertEqual([type(stmt).__name__ for stmt in fn.body], ['SayStmt', 'ReturnStmt'])
+
+    def test_malformed_blocks_raise(self):
+        for code in ['for i in range(3) {\n    say "x";', '}', 'try {\n}\nsay "x";', 'state n: Int = 0;',
+                     '@ai.optimize\nlet x: Int = 1;']:
+            with self.assertRaises(SyntaxError, msg=code):
+                parse(tokenize(code))
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
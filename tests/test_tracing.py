@@ -0,0 +1,62 @@
+from src.nexa_interpreter import (
+    tokenize, parse, interpret, execute, configure_tracing, Environment,
+    RingBufferSink, StderrSink, TRACE_INFO, TRACE_NODE,
+)
+import contextlib
+import io
+import unittest
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.sink = RingBufferSink()
+        self.ast = parse(tokenize("let x: Int = 5;\nx += 2;\nsay \"x is {x}\";"))
+
+    def tearDown(self):
+        configure_tracing('off', [StderrSink()])
+
+    def run_program(self, engine='tree'):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            execute(self.ast, Environment(), engine)
+        return out.getvalue()
+
+    def test_off_emits_nothing(self):
+        configure_tracing('off', [self.sink])
+        output = self.run_program()
+        self.assertEqual(self.sink.events(), [])
+        self.assertEqual(output, "Output: x is 7\n")
+
+    def test_node_level_records_type_and_line(self):
+        configure_tracing('node', [self.sink])
+        self.run_program()
+        events = [(event.level, event.node_type, event.line) for event in self.sink.events()]
+        self.assertEqual(events, [(TRACE_NODE, 'LetStmt', 1), (TRACE_NODE, 'AssignStmt', 2), (TRACE_NODE, 'SayStmt', 3)])
+
+    def test_trace_level_adds_details(self):
+        configure_tracing('trace', [self.sink])
+        self.run_program()
+        self.assertIn("Assigning: x += 2", [event.message for event in self.sink.events()])
+
+    def test_closure_engine_traces_nodes(self):
+        configure_tracing('node', [self.sink])
+        self.run_program('closure')
+        self.assertEqual([event.node_type for event in self.sink.events()], ['LetStmt', 'AssignStmt', 'SayStmt'])
+
+    def test_caught_exception_is_info(self):
+        configure_tracing('info', [self.sink])
+        ast = parse(tokenize("try {\nx = missing;\n} catch {\nsay \"caught\";\n}"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpret(ast, Environment())
+        events = self.sink.events()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].level, TRACE_INFO)
+        self.assertIn("Undefined variable: missing", events[0].message)
+
+    def test_ring_buffer_is_bounded(self):
+        sink = RingBufferSink(capacity=2)
+        configure_tracing('node', [sink])
+        self.run_program()
+        self.assertEqual([event.node_type for event in sink.events()], ['AssignStmt', 'SayStmt'])
+
+if __name__ == '__main__':
+    unittest.main()
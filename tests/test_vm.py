@@ -0,0 +1,136 @@
+from src.nexa_interpreter import (
+    tokenize, parse, compile_bytecode, run_bytecode, load_bytecode, disassemble, Environment,
+    AssignStmt, ForStmt, IfStmt, LetStmt, SayStmt, TryStmt, WhileStmt, ActorDecl, FnDecl, SpawnStmt,
+    OutputChannel, program_env, finish_program, run_nexa_file, ENGINES, type_check,
+)
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+class TestBytecodeVM(unittest.TestCase):
+    def setUp(self):
+        self.env = Environment()
+
+    def run_vm(self, ast):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            run_bytecode(compile_bytecode(ast), self.env)
+        return out.getvalue()
+
+    def test_function_call_and_math(self):
+        code = """
+        let x: Int = 5;
+        fn add(a: Int, b: Int) -> Int {
+            return a + b;
+        }
+        let sum: Int = add(x, 3);
+        let prod: Int = math.multiply(sum, 2);
+        """
+        self.run_vm(parse(tokenize(code)))
+        self.assertEqual(self.env.get_var('sum'), (8, 'Int'))
+        self.assertEqual(self.env.get_var('prod'), (16, 'Int'))
+
+    def test_loops_and_branches(self):
+        ast = [
+            LetStmt(name='total', type='Int', value=0),
+            ForStmt(var='i', start=0, end=10, body=[AssignStmt(name='total', op='+=', value='i')]),
+            LetStmt(name='n', type='Int', value=3),
+            WhileStmt(condition='n>0', body=[
+                IfStmt(condition='n>1', then_body=[SayStmt(value='big {n}')], else_body=[SayStmt(value='small {n}')]),
+                AssignStmt(name='n', op='+=', value=-1),
+            ]),
+        ]
+        output = self.run_vm(ast)
+        self.assertEqual(self.env.get_var('total')[0], 45)
+        self.assertEqual(output.splitlines(), ['Output: big 3', 'Output: big 2', 'Output: small 1'])
+
+    def test_try_restores_stack(self):
+        ast = [
+            TryStmt(try_body=[AssignStmt(name='x', op='+=', value='missing')], catch_body=[SayStmt(value='caught')]),
+            SayStmt(value='after'),
+        ]
+        output = self.run_vm(ast)
+        self.assertIn('Output: caught', output)
+        self.assertTrue(output.endswith('Output: after\n'))
+
+    def test_send_many_batches(self):
+        echo = ActorDecl(name='Echo', state=[], methods=[
+            FnDecl(name='on_message', params=[('msg', 'Int')], return_type='Unit', body=[SayStmt(value='{msg}')]),
+        ])
+        for sends, expected in (("e.send_many();", []), ("e.send_many(7);", ['7']), ("e.send_many(1, 2);\ne.send(3);", ['1', '2', '3'])):
+            env = program_env(OutputChannel(capture=True), actor_runtime='pool')
+            code = compile_bytecode([echo, SpawnStmt(actor_name='Echo', var_name='e')] + parse(tokenize(sends)))
+            run_bytecode(code, env)
+            finish_program(env)
+            self.assertEqual(env.output.lines, expected, sends)
+
+    def test_nested_declarations_on_every_engine(self):
+        code = "let x: Int = 3;\nif x > 0 {\n    fn g(a: Int) -> Int {\n        return a * 2;\n    }\n}\nlet y: Int = g(x);\nsay \"y={y}\";\n"
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'nested.nexa')
+            with open(path, 'w') as f:
+                f.write(code)
+            for engine in ENGINES:
+                output = OutputChannel(capture=True)
+                run_nexa_file(path, engine=engine, use_cache=False, output=output)
+                self.assertEqual(output.lines, ['y=6'], engine)
+
+    def test_nested_declarations_only_bind_when_run(self):
+        code = "let x: Int = 0;\nif x > 5 {\n    fn g(a: Int) -> Int {\n        return a * 2;\n    }\n}\nlet y: Int = g(3);\nsay \"y={y}\";\n"
+        env = Environment()
+        type_check(parse(tokenize(code)), env)
+        self.assertNotIn('g', env.fns)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'skipped.nexa')
+            with open(path, 'w') as f:
+                f.write(code)
+            for engine in ENGINES:
+                output, printed = OutputChannel(capture=True), io.StringIO()
+                with contextlib.redirect_stdout(printed):
+                    run_nexa_file(path, engine=engine, use_cache=False, output=output)
+                self.assertEqual(output.lines, [], engine)
+                self.assertIn('Undefined function: g', printed.getvalue(), engine)
+
+    def test_use_before_declaration_on_every_engine(self):
+        code = "let x: Int = 4;\nsay \"{f(x)}\";\nfn f(a: Int) -> Int {\n    return a * 2;\n}\n"
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'later.nexa')
+            with open(path, 'w') as f:
+                f.write(code)
+            for engine in ENGINES:
+                output = OutputChannel(capture=True)
+                run_nexa_file(path, engine=engine, use_cache=False, output=output)
+                self.assertEqual(output.lines, ['8'], engine)
+
+    def test_constant_pool(self):
+        code = compile_bytecode(parse(tokenize("let x: Int = 5;\nlet y: Int = 5;\nlet z: Int = 6;\nx += 5;")))
+        self.assertEqual(code.consts.count(5), 1)
+        self.assertIn(6, code.consts)
+        twins = [FnDecl(name='f', params=[], return_type='Unit', body=[]) for _ in range(2)]
+        self.assertEqual(twins[0], twins[1])
+        consts = compile_bytecode(twins).consts
+        self.assertIs(consts[0], twins[0])
+        self.assertIs(consts[1], twins[1])
+
+    def test_disassemble(self):
+        text = disassemble(compile_bytecode(parse(tokenize("let x: Int = 5;\nx += 2;"))))
+        self.assertIn('STORE_VAR', text)
+        self.assertIn('BINARY_ADD', text)
+
+    def test_nexac_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'prog.nexa')
+            with open(path, 'w') as f:
+                f.write("let x: Int = 5;\n")
+            first = load_bytecode(path)
+            self.assertTrue(os.path.exists(path + 'c'))
+            self.assertEqual(load_bytecode(path), first)
+            with open(path, 'w') as f:
+                f.write("let x: Int = 6;\n")
+            run_bytecode(load_bytecode(path), self.env)
+            self.assertEqual(self.env.get_var('x')[0], 6)
+
+if __name__ == '__main__':
+    unittest.main()